@@ -21,6 +21,15 @@ contract HashStorage {
         return hash_record[hash_to_verify];
     }
 
+    // Checks whether each of several input hashes is valid
+    function verify_hashes(bytes32[] calldata hashes_to_verify) public view returns (bool[] memory) {
+        bool[] memory valid_hashes = new bool[](hashes_to_verify.length);
+        for (uint256 i = 0; i < hashes_to_verify.length; i++) {
+            valid_hashes[i] = hash_record[hashes_to_verify[i]];
+        }
+        return valid_hashes;
+    }
+
     // Returns most recent file hash
     function retrieve_hash() public view returns (bytes32) {
         return file_hash;
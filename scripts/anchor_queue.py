@@ -0,0 +1,33 @@
+from scripts.reading_buffer import ReadingBuffer
+
+
+class AnchorQueue:
+    def __init__(self, queue_file=None):
+        # Hashes are forced to disk as they are queued, like buffered readings, so
+        # they survive a restart
+        self.buffer = ReadingBuffer(0, 0, queue_file)
+
+    def __len__(self):
+        return len(self.buffer.readings)
+
+    # Queues a file hash to be stored in the smart contract
+    def add(self, file_hash):
+        self.buffer.add(file_hash)
+
+    # Stores the queued hashes in order, returning whether all of them were stored.
+    # Storing a hash twice is harmless, so the queue is only rewritten once per
+    # drain rather than after every transaction
+    def drain(self, store_hash):
+        stored = 0
+
+        try:
+            for file_hash in self.buffer.readings:
+                store_hash(file_hash)
+                stored += 1
+        except Exception:
+            return False
+        finally:
+            if stored:
+                self.buffer.clear(stored)
+
+        return True
@@ -1,8 +1,13 @@
+import hashlib
+import os
 from brownie import network, config, accounts
-from filehash import FileHash
 
 LOCAL_BLOCKCHAIN_ENVIRONMENTS = ["development", "ganache-local"]
 
+# Size of the chunks read when hashing a file
+HASH_CHUNK_SIZE = 1 << 16
+
+
 # Retrieves the relevant account depending on the network
 def get_account():
     # If working on development chain (eg. Ganache cli)
@@ -14,11 +19,28 @@ def get_account():
         return accounts.add(config["wallets"]["from_key"])
 
 
-# Generates the sha256 hash for a file
+# Generates the sha256 hash for a file, given as its contents (bytes or a buffer),
+# a path, an open binary file or an iterator of chunks of bytes. Contents are
+# hashed in memory, so they do not have to be written to disk first
 def generate_hash(file):
-    hasher = FileHash("sha256")
-    file_hash = hasher.hash_file(file)
-    return file_hash
+    hasher = hashlib.sha256()
+
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        hasher.update(file)
+        return hasher.hexdigest()
+
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            return generate_hash(f)
+
+    chunks = file
+    if hasattr(file, "read"):
+        chunks = iter(lambda: file.read(HASH_CHUNK_SIZE), b"")
+
+    for chunk in chunks:
+        hasher.update(chunk)
+
+    return hasher.hexdigest()
 
 
 def main():
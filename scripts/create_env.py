@@ -21,6 +21,31 @@ AQM_LONGITUDE=-2.328047487717645
 AQM_DESCRIPTION=A WoT AQM.
 AQM_POLLING_TIME=900000
 AQM_CSV_HASH_TIME=23:59:59
+CSV_STORAGE_MODE=full
+CSV_JOURNAL_FOLDER=journal
+FLUSH_READINGS=1
+FLUSH_INTERVAL=0
+SPILL_FOLDER=spill
+UPDATER_ENGINE=scheduler
+QUEUE_DEPTH=10
+TTL_WINDOW=
+TTL_WINDOW_WRITE=put
+ANCHOR_BATCH=1
+ANCHOR_INTERVAL=0
+VERIFY_WORKERS=8
+VERIFY_LOOKUP_SIZE=1000
+VERIFY_REPORT_SIZE=100
+VERIFY_CACHE=verify_cache.db
+VERIFY_SAMPLE=0.05
+VERIFY_FORMAT=table
+VERIFY_REPORT=
+POD_LAYOUT=flat
+POD_MANIFEST=
+MANIFEST_INTERVAL=300
+AQM_ENDPOINTS=
+WOT_CONNECT_TIMEOUT=5
+WOT_READ_TIMEOUT=30
+WOT_MAX_BACKOFF=30
 """
 
 # Creates env file
@@ -0,0 +1,150 @@
+import hashlib
+import os
+from httpx import HTTPStatusError
+
+
+class CSVJournal:
+    def __init__(self, journal_folder):
+        self.journal_folder = journal_folder
+        self.file_name = None
+        # Appended to in place, as copying the whole day on every row would make
+        # journaling a day's readings quadratic
+        self.data = bytearray()
+        self.etag = None
+        # Running hash of the journal, so sealing a day never re-reads the file
+        self.hasher = hashlib.sha256()
+        # Length of the journal found on opening, as rows journaled afterwards
+        # were never uploaded before a restart. None once it is all accounted for
+        self.resumed_size = None
+
+    # Path of the journal for a daily CSV file
+    def journal_path(self, file_name):
+        return os.path.join(self.journal_folder, file_name)
+
+    # Path of the ETag recorded for the last upload of a daily CSV file
+    def etag_path(self, file_name):
+        return self.journal_path(file_name) + ".etag"
+
+    # Opens the journal for a daily CSV file, returning whether it already existed
+    def open_day(self, file_name, csv_header):
+        os.makedirs(self.journal_folder, exist_ok=True)
+
+        self.file_name = file_name
+        self.etag = None
+        self.hasher = hashlib.sha256()
+        path = self.journal_path(file_name)
+
+        if os.path.exists(path):
+            with open(path, "rb") as journal:
+                self.data = bytearray(journal.read())
+            self.hasher.update(self.data)
+            if os.path.exists(self.etag_path(file_name)):
+                with open(self.etag_path(file_name)) as etag:
+                    self.etag = etag.read() or None
+            self.resumed_size = len(self.data)
+            existed = True
+        else:
+            self.data = bytearray()
+            self.resumed_size = None
+            self.write(csv_header.encode())
+            existed = False
+
+        return existed
+
+    # Returns the daily CSV files of journals left unsealed, e.g. by a restart
+    def unsealed_days(self, file_name):
+        if not os.path.isdir(self.journal_folder):
+            return []
+
+        return sorted(
+            journal_file
+            for journal_file in os.listdir(self.journal_folder)
+            if journal_file.endswith(".csv") and journal_file != file_name
+        )
+
+    # Returns the SHA-256 hash of the daily CSV file so far
+    def digest(self):
+        return self.hasher.hexdigest()
+
+    # Removes the journal of a sealed day and starts a fresh hash for the next
+    def close_day(self):
+        for path in [self.journal_path(self.file_name), self.etag_path(self.file_name)]:
+            if os.path.exists(path):
+                os.remove(path)
+
+        self.file_name = None
+        self.data = bytearray()
+        self.etag = None
+        self.hasher = hashlib.sha256()
+        self.resumed_size = None
+
+    # Appends bytes to the journal and forces them to disk before they are uploaded
+    def write(self, data):
+        with open(self.journal_path(self.file_name), "ab") as journal:
+            journal.write(data)
+            journal.flush()
+            os.fsync(journal.fileno())
+        self.data.extend(data)
+        self.hasher.update(data)
+
+    # Appends a new row of AQM data to the journal
+    def append(self, row):
+        self.write(b"\n" + row.encode())
+
+    # Replaces the journal with the contents of the Solid Pod file
+    def replace(self, data):
+        path = self.journal_path(self.file_name)
+        with open(path + ".tmp", "wb") as journal:
+            journal.write(data)
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(path + ".tmp", path)
+        self.data = bytearray(data)
+        self.hasher = hashlib.sha256(data)
+
+    # Returns the full contents of the daily CSV file
+    def content(self):
+        return bytes(self.data)
+
+    # Records the ETag the Solid Pod returned for the last upload
+    def record_upload(self, etag):
+        self.etag = etag
+        # Losing the ETag only costs a Content-Length comparison on restart
+        with open(self.etag_path(self.file_name), "w") as etag_file:
+            etag_file.write(etag or "")
+
+    # Reconciles the journal with the Solid Pod file after a restart. Rows
+    # journaled since the restart are kept whichever copy is adopted
+    def reconcile(self, api, file_url):
+        resumed_size = (
+            len(self.data) if self.resumed_size is None else self.resumed_size
+        )
+        resumed = self.data[:resumed_size]
+
+        try:
+            response = api.head(file_url)
+        except HTTPStatusError as e:
+            if e.response.status_code == 404:
+                # The journal is uploaded in full by the next update
+                return "journal"
+            raise e
+
+        etag = response.headers.get("ETag")
+        content_length = response.headers.get("Content-Length")
+
+        if self.etag is not None and etag is not None:
+            if etag == self.etag:
+                return "journal"
+        elif content_length == str(len(resumed)):
+            return "journal"
+
+        pod_data = api.get(file_url).content
+
+        # Rows journaled but not yet uploaded before the restart
+        if resumed.startswith(pod_data):
+            return "journal"
+
+        # Otherwise the Solid Pod holds rows the journal never saw
+        self.replace(pod_data + self.data[resumed_size:])
+        self.record_upload(etag)
+        return "pod"
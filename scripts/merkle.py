@@ -0,0 +1,66 @@
+import hashlib
+
+# Prefixes that keep leaves and inner nodes apart, so an inner node can never be
+# passed off as a file hash
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+# Suffix of the resource holding the inclusion proof of a file in the Solid Pod
+PROOF_SUFFIX = ".proof.json"
+
+
+# Hashes a file hash (hex) into a leaf of the tree
+def hash_leaf(file_hash):
+    return hashlib.sha256(LEAF_PREFIX + bytes.fromhex(file_hash)).hexdigest()
+
+
+# Hashes two nodes (hex) into their parent
+def hash_node(left, right):
+    return hashlib.sha256(
+        NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)
+    ).hexdigest()
+
+
+# Builds every level of the tree, from the leaves up to the root
+def build_levels(file_hashes):
+    levels = [[hash_leaf(file_hash) for file_hash in file_hashes]]
+
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [
+            hash_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)
+        ]
+
+        # A node without a sibling is carried up to the next level unchanged
+        if len(level) % 2:
+            parents.append(level[-1])
+
+        levels.append(parents)
+
+    return levels
+
+
+# Returns the siblings needed to recompute the root from the file hash at an
+# index, as (hash, side) pairs from the leaf upwards
+def merkle_proof(levels, index):
+    proof = []
+
+    for level in levels[:-1]:
+        sibling = index ^ 1
+
+        if sibling < len(level):
+            proof.append((level[sibling], "left" if sibling < index else "right"))
+
+        index //= 2
+
+    return proof
+
+
+# Recomputes the root of the tree from a file hash and its proof
+def proof_root(file_hash, proof):
+    node = hash_leaf(file_hash)
+
+    for sibling, side in proof:
+        node = hash_node(sibling, node) if side == "left" else hash_node(node, sibling)
+
+    return node
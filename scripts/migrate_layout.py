@@ -0,0 +1,126 @@
+import os
+from scripts.contract_scripts import generate_hash
+from scripts.pod_cache import PodCache
+from scripts.pod_layout import layout_url
+from scripts.time_index import name_time
+import dotenv
+from solid.auth import Auth
+from solid.solid_api import SolidAPI
+
+
+class LayoutMigrator:
+    def __init__(self, api):
+        self.api = api
+        self.pod_cache = PodCache(api)
+        self.moved = 0
+        self.kept = 0
+
+    # Copies a file byte for byte, and deletes the original once the copy is
+    # found to hash the same, so the hash anchored in the smart contract still
+    # verifies it
+    def move_file(self, file_url, new_file_url):
+        try:
+            response = self.api.get(file_url)
+            file_hash = generate_hash(response.content)
+
+            self.pod_cache.put_file(
+                new_file_url,
+                response.content,
+                response.headers.get("Content-Type", "text/plain"),
+            )
+
+            if generate_hash(self.api.get(new_file_url).content) != file_hash:
+                print(f"Copy of '{file_url}' does not match. Kept the original.")
+                self.kept += 1
+                return False
+
+            self.api.delete(file_url)
+        except Exception:
+            # Running the migration again moves whatever was left behind
+            print(f"Unable to move '{file_url}'. Kept the original.")
+            self.kept += 1
+            return False
+
+        print(f"Moved '{file_url}' to '{new_file_url}'.")
+        self.moved += 1
+        return True
+
+    # Moves the files of a folder, e.g. the segments of a day, into a new folder,
+    # deleting the old folder once it is empty
+    def move_folder(self, folder_url, new_folder_url):
+        folder = self.api.read_folder(folder_url)
+
+        moved = [
+            self.move_file(file.url, new_folder_url + file.name)
+            for file in folder.files
+        ]
+
+        if all(moved) and not folder.folders:
+            self.api.delete_folder(folder_url)
+
+    # Moves the files of a flat AQM folder into year/month/day partitions. Files
+    # not named after a date, and folders already partitioned, are left in place
+    def migrate(self, aqm_folder_url):
+        aqm_folder = self.api.read_folder(aqm_folder_url)
+        # The AQM folder is known to exist, so only partitions are created
+        self.pod_cache.containers.add(aqm_folder_url)
+
+        for file in sorted(aqm_folder.files, key=lambda file: file.name):
+            if name_time(file.name) is not None:
+                self.move_file(file.url, layout_url(aqm_folder_url, file.name, "dated"))
+
+        # Day folders of segmented CSV files move into their day's partition
+        for folder in sorted(aqm_folder.folders, key=lambda folder: folder.name):
+            if name_time(folder.name) is not None:
+                self.move_folder(
+                    folder.url, layout_url(aqm_folder_url, f"{folder.name}/", "dated")
+                )
+
+
+def main():
+    path = dotenv.find_dotenv()
+
+    dotenv.load_dotenv(path)
+
+    SOLID_POD_PROVIDER = os.environ.get("SOLID_POD_PROVIDER")
+
+    # WARNING: You must use the .env or other similar method to securely
+    # authenticate to your SOLID POD. Do not enter your details in this file, and
+    # definitely do not commit to version control your details. See the README
+    # before proceeding.
+    USER_NAME = os.environ.get("USER_NAME")
+    PASSWORD = os.environ.get("PASSWORD")
+
+    POD_ENDPOINT = os.environ.get("SOLID_POD_URL")
+
+    if POD_ENDPOINT[-1] != "/":
+        POD_ENDPOINT += "/"
+
+    AQM_NAME = os.environ.get("AQM_NAME")
+
+    if AQM_NAME[-1] != "/":
+        AQM_NAME += "/"
+
+    auth = Auth()
+    api = SolidAPI(auth)
+    auth.login(SOLID_POD_PROVIDER, USER_NAME, PASSWORD)
+
+    migrator = LayoutMigrator(api)
+
+    # Both the CSV and TTL folders of the AQM are migrated
+    for folder_variable in ["CSV_AQM_FOLDER_NAME", "TTL_AQM_FOLDER_NAME"]:
+        AQM_FOLDER_NAME = os.environ.get(folder_variable)
+
+        if AQM_FOLDER_NAME[-1] != "/":
+            AQM_FOLDER_NAME += "/"
+
+        aqm_folder_url = POD_ENDPOINT + AQM_FOLDER_NAME + AQM_NAME
+
+        if not api.item_exists(aqm_folder_url):
+            print(f"No AQM folder at '{aqm_folder_url}'.")
+            continue
+
+        print(f"Migrating '{aqm_folder_url}'...")
+        migrator.migrate(aqm_folder_url)
+
+    print(f"Moved {migrator.moved} files. Kept {migrator.kept} files in place.")
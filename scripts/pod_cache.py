@@ -0,0 +1,79 @@
+from httpx import HTTPStatusError
+
+# Status codes showing that what is known about a resource is out of date
+STALE_STATUS_CODES = [404, 412]
+
+
+class PodCache:
+    def __init__(self, api):
+        self.api = api
+        self.containers = set()
+        # ETags of the resources known to exist, or None if the ETag is unknown
+        self.resources = {}
+
+    # Creates a container, returning whether it was created. Only containers not
+    # already known to exist are checked with HEAD
+    def ensure_container(self, container_url):
+        if container_url in self.containers:
+            return False
+
+        created = False
+        if not self.api.item_exists(container_url):
+            self.api.create_folder(container_url)
+            created = True
+
+        self.containers.add(container_url)
+        return created
+
+    # Creates a container along with any missing parents, returning whether it
+    # was created. Parents are only checked once the container is found missing
+    def ensure_path(self, container_url):
+        if container_url in self.containers:
+            return False
+
+        if self.api.item_exists(container_url):
+            self.containers.add(container_url)
+            return False
+
+        parent_url = container_url[: container_url.rstrip("/").rindex("/") + 1]
+        if not parent_url.endswith("//"):
+            self.ensure_path(parent_url)
+
+        self.api.create_folder(container_url)
+        self.containers.add(container_url)
+        return True
+
+    # Checks whether a resource exists. Only resources not already known to exist
+    # are checked with HEAD
+    def exists(self, url):
+        if url in self.resources:
+            return True
+
+        if self.api.item_exists(url):
+            self.resources[url] = None
+            return True
+
+        return False
+
+    # Uploads a file with a single PUT once its container is known to exist
+    def put_file(self, url, content, content_type):
+        self.ensure_path(url[: url.rindex("/") + 1])
+
+        try:
+            response = self.api.put_file(url, content, content_type)
+        except HTTPStatusError as e:
+            if e.response.status_code in STALE_STATUS_CODES:
+                self.invalidate(url)
+            raise e
+
+        self.resources[url] = response.headers.get("ETag")
+        return response
+
+    # Forgets a resource and its containers, so the next upload checks them again
+    def invalidate(self, url):
+        self.resources.pop(url, None)
+        self.containers = {
+            container_url
+            for container_url in self.containers
+            if not url.startswith(container_url)
+        }
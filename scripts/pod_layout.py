@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+from scripts.time_index import name_time
+
+# Layouts of an AQM folder: "flat" stores every file in the AQM folder, whereas
+# "dated" stores each file in a year/month/day partition, e.g. aqm1/2022/07/08/
+LAYOUTS = ["flat", "dated"]
+
+
+# Returns the URL of the folder a file is stored in. Files not named after a date
+# stay in the AQM folder
+def partition_url(aqm_folder_url, file_name, layout):
+    file_time = name_time(file_name)
+    if layout != "dated" or file_time is None:
+        return aqm_folder_url
+
+    return f"{aqm_folder_url}{file_time:%Y/%m/%d}/"
+
+
+# Returns the URL of a file in the AQM folder
+def layout_url(aqm_folder_url, file_name, layout):
+    return partition_url(aqm_folder_url, file_name, layout) + file_name
+
+
+# Returns when the period after a partition starts, e.g. the next month
+def partition_end(parts):
+    if len(parts) == 1:
+        return datetime(parts[0] + 1, 1, 1)
+    if len(parts) == 2:
+        year, month = parts
+        return datetime(year + month // 12, month % 12 + 1, 1)
+    return datetime(*parts) + timedelta(days=1)
+
+
+# Lists the files of a dated AQM folder by their path within it, e.g.
+# 2022/07/08/2022-07-08.csv. Only the partitions overlapping start up to, but not
+# including, end are read. Files still in the AQM folder itself are listed too
+def list_partitions(api, aqm_folder_url, start=None, end=None):
+    file_names = []
+
+    # Folders are read a level at a time, so a query only reads the years, months
+    # and days it covers
+    folders = [(aqm_folder_url, [])]
+    while folders:
+        folder_url, parts = folders.pop()
+        folder = api.read_folder(folder_url)
+        prefix = "".join(f"{part:02d}/" for part in parts)
+
+        # Only the files of days, or of the AQM folder itself, are listed
+        if len(parts) in (0, 3):
+            file_names += [prefix + file.name for file in folder.files]
+
+        if len(parts) == 3:
+            continue
+
+        for subfolder in folder.folders:
+            if not subfolder.name.isdigit():
+                continue
+
+            subfolder_parts = parts + [int(subfolder.name)]
+            try:
+                subfolder_start = datetime(*(subfolder_parts + [1, 1])[:3])
+            except ValueError:
+                continue
+
+            if end is not None and subfolder_start >= end:
+                continue
+            if start is not None and partition_end(subfolder_parts) <= start:
+                continue
+
+            folders.append((f"{folder_url}{subfolder.name}/", subfolder_parts))
+
+    return file_names
@@ -0,0 +1,173 @@
+import csv
+import io
+import json
+import math
+import random
+import urllib.parse
+from httpx import HTTPStatusError
+from rdflib import Graph, Namespace
+from scripts.merkle import proof_root
+
+# Columns of a manifest: the file, its length in bytes, its hash, the hash stored
+# in the smart contract for it (the file hash itself, or the root of its Merkle
+# batch) and the inclusion proof linking the two
+MANIFEST_FIELDS = ["file", "size", "sha256", "anchor", "proof"]
+
+# Vocabulary Solid servers describe the size of each file in a folder listing with
+STAT = Namespace("http://www.w3.org/ns/posix/stat#")
+
+
+# Splits the URL of a file into the URL of its folder and its (decoded) name
+def split_url(file_url):
+    folder_url, name = file_url.rsplit("/", 1)
+    return folder_url + "/", urllib.parse.unquote(name)
+
+
+# Parses a manifest into its rows by file name
+def parse_manifest(text):
+    return {row["file"]: row for row in csv.DictReader(io.StringIO(text))}
+
+
+# Formats the rows of a manifest, in file name order
+def encode_manifest(rows):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, MANIFEST_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows[name] for name in sorted(rows))
+    return output.getvalue().encode()
+
+
+# Reads the manifest of a folder, which is empty if the folder has none yet
+def read_manifest(api, folder_url, manifest_name):
+    try:
+        response = api.get(folder_url + manifest_name)
+    except HTTPStatusError as e:
+        if e.response.status_code == 404:
+            return {}
+        raise e
+
+    return parse_manifest(response.text)
+
+
+class PodManifest:
+    def __init__(self, api, manifest_name):
+        self.api = api
+        self.manifest_name = manifest_name
+        # Rows of the manifest last written, so the next update needs no download
+        self.manifests = {}
+        # Changes to the rows of each folder's manifest not written yet
+        self.changes = {}
+
+    # Records what is known about a sealed file. Fields left as None keep their
+    # earlier value, e.g. the size of a file whose Merkle batch is anchored later
+    def add(self, file_url, sha256=None, size=None, anchor=None, proof=None):
+        folder_url, name = split_url(file_url)
+        fields = {"sha256": sha256, "size": size, "anchor": anchor}
+        if proof is not None:
+            fields["proof"] = json.dumps(proof) if proof else ""
+
+        row = self.changes.setdefault(folder_url, {}).setdefault(name, {})
+        row.update(
+            {field: value for field, value in fields.items() if value is not None}
+        )
+
+    # Writes the manifests of the folders with changes, returning whether every
+    # one was written. Changes not written are kept for the next attempt
+    def save(self):
+        for folder_url in list(self.changes):
+            try:
+                if folder_url not in self.manifests:
+                    self.manifests[folder_url] = read_manifest(
+                        self.api, folder_url, self.manifest_name
+                    )
+
+                rows = self.manifests[folder_url]
+                for name, fields in self.changes[folder_url].items():
+                    row = rows.setdefault(name, dict.fromkeys(MANIFEST_FIELDS, ""))
+                    row.update(file=name, **fields)
+
+                self.api.put_file(
+                    folder_url + self.manifest_name, encode_manifest(rows), "text/csv"
+                )
+            except Exception:
+                # The manifest is downloaded again, as the upload may have failed
+                # after the rows were changed
+                self.manifests.pop(folder_url, None)
+                return False
+
+            del self.changes[folder_url]
+
+        return True
+
+
+# Returns the sizes of the files in a folder, as described by its listing
+def listed_sizes(api, folder_url):
+    response = api.get(folder_url, {"headers": {"Accept": "text/turtle"}})
+    graph = Graph().parse(data=response.text, publicID=folder_url, format="turtle")
+
+    return {
+        split_url(str(item))[1]: int(size)
+        for item, size in graph.subject_objects(STAT.size)
+        if str(item).startswith(folder_url)
+    }
+
+
+# Returns the hash anchoring a file according to its manifest row, or None if
+# the row is incomplete or does not hold together
+def manifest_anchor(row):
+    if not row["sha256"] or not row["anchor"]:
+        return None
+
+    if row["proof"]:
+        proof = [tuple(step) for step in json.loads(row["proof"])]
+        anchor = proof_root(row["sha256"], proof)
+    else:
+        anchor = row["sha256"]
+
+    return anchor if anchor == row["anchor"] else None
+
+
+# Groups files by the folder they are stored in, keeping their order
+def group_by_folder(aqm_folder_url, files):
+    folders = {}
+    for file in files:
+        folders.setdefault(split_url(aqm_folder_url + file)[0], []).append(file)
+
+    return folders
+
+
+# Splits files into those the manifests of their folders vouch for, with the hash
+# anchoring each, and those to download: files missing from a manifest, files
+# whose listed size disagrees with it, and a sample of the rest
+def plan_audit(api, aqm_folder_url, files, manifest_name, sample):
+    anchors = {}
+    downloads = []
+
+    folders = group_by_folder(aqm_folder_url, files)
+
+    for folder_url, folder_files in folders.items():
+        # Two requests per folder, rather than one per file
+        try:
+            rows = read_manifest(api, folder_url, manifest_name)
+            sizes = listed_sizes(api, folder_url)
+        except Exception:
+            print(f"Unable to read the manifest of '{folder_url}'.")
+            downloads += folder_files
+            continue
+
+        for file in folder_files:
+            name = split_url(aqm_folder_url + file)[1]
+            row = rows.get(name)
+            anchor = manifest_anchor(row) if row is not None else None
+
+            if anchor is None or sizes.get(name) != int(row["size"] or -1):
+                downloads.append(file)
+            else:
+                anchors[file] = anchor
+
+    # Sampled files are downloaded, so a manifest that lies is caught
+    sampled = random.sample(list(anchors), math.ceil(len(anchors) * sample))
+    for file in sampled:
+        del anchors[file]
+
+    return anchors, downloads + sampled
@@ -0,0 +1,48 @@
+import json
+import os
+
+
+class ReadingBuffer:
+    def __init__(self, max_readings, max_age, spill_file=None):
+        self.max_readings = max_readings
+        self.max_age = max_age
+        self.spill_file = spill_file
+        self.readings = []
+
+        # Readings spilled before a crash are flushed with the next batch
+        if spill_file is not None and os.path.exists(spill_file):
+            with open(spill_file) as spill:
+                self.readings = [json.loads(line) for line in spill if line.strip()]
+
+    # Adds a reading, returning whether it started a new batch
+    def add(self, reading):
+        if self.spill_file is not None:
+            spill_folder = os.path.dirname(self.spill_file)
+            if spill_folder:
+                os.makedirs(spill_folder, exist_ok=True)
+            with open(self.spill_file, "a") as spill:
+                spill.write(json.dumps(reading) + "\n")
+                spill.flush()
+                os.fsync(spill.fileno())
+
+        self.readings.append(reading)
+        return len(self.readings) == 1
+
+    # Checks whether enough readings are buffered to flush them
+    def is_full(self):
+        return len(self.readings) >= self.max_readings
+
+    # Discards the buffered readings once they have been written to the Solid Pod
+    def clear(self, count=None):
+        if count is None:
+            count = len(self.readings)
+
+        self.readings = self.readings[count:]
+
+        if self.spill_file is not None and os.path.exists(self.spill_file):
+            with open(self.spill_file + ".tmp", "w") as spill:
+                for reading in self.readings:
+                    spill.write(json.dumps(reading) + "\n")
+                spill.flush()
+                os.fsync(spill.fileno())
+            os.replace(self.spill_file + ".tmp", self.spill_file)
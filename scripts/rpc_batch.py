@@ -0,0 +1,75 @@
+import requests
+import urllib.parse
+from brownie import web3
+
+# Number of calls sent in a single JSON-RPC batch request. Providers limit the
+# size of a batch, and 100 is accepted by the common ones
+RPC_BATCH_SIZE = 100
+
+
+# Returns the URL of the blockchain node if it accepts JSON-RPC over HTTP, or
+# None if calls cannot be batched, e.g. over a WebSocket or IPC
+def rpc_endpoint():
+    endpoint = str(getattr(web3.provider, "endpoint_uri", None) or "")
+
+    if urllib.parse.urlparse(endpoint).scheme not in ["http", "https"]:
+        return None
+
+    return endpoint
+
+
+# Returns the headers and other options the provider sends its requests with,
+# such as an API key or a timeout, so batch requests are sent the same way
+def rpc_request_kwargs():
+    if not hasattr(web3.provider, "get_request_kwargs"):
+        return {}
+
+    return dict(web3.provider.get_request_kwargs())
+
+
+# Calls a view function of a contract once for each set of arguments, packing
+# the calls into JSON-RPC batch requests rather than making a round trip per call.
+# Results are returned in the order of the arguments. Request options, such as
+# the provider's headers, are passed on to each batch request
+def batch_call(
+    endpoint,
+    contract_function,
+    args_list,
+    batch_size=RPC_BATCH_SIZE,
+    timeout=30,
+    request_kwargs=None,
+):
+    request_kwargs = {"timeout": timeout, **(request_kwargs or {})}
+    results = []
+
+    for start in range(0, len(args_list), batch_size):
+        batch = [
+            {
+                "jsonrpc": "2.0",
+                "id": start + i,
+                "method": "eth_call",
+                "params": [
+                    {
+                        "to": contract_function._address,
+                        "data": contract_function.encode_input(*args),
+                    },
+                    "latest",
+                ],
+            }
+            for i, args in enumerate(args_list[start : start + batch_size])
+        ]
+
+        response = requests.post(endpoint, json=batch, **request_kwargs)
+        response.raise_for_status()
+
+        items = response.json()
+        if not isinstance(items, list) or len(items) != len(batch):
+            raise ValueError("The node does not support JSON-RPC batch requests")
+
+        # Nodes may answer the calls of a batch in any order
+        for item in sorted(items, key=lambda item: item["id"]):
+            if "error" in item:
+                raise ValueError(f"eth_call failed: {item['error']}")
+            results.append(contract_function.decode_output(item["result"]))
+
+    return results
@@ -0,0 +1,148 @@
+import heapq
+import itertools
+import time
+import traceback
+from datetime import datetime, timedelta
+
+
+# Returned by a job to stop it from being rescheduled
+class CancelJob:
+    pass
+
+
+class Job:
+    def __init__(self, deadline, interval, func, args):
+        self.deadline = deadline
+        self.interval = interval
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    # Moves a repeating job to its next deadline
+    def advance(self, now):
+        # Deadlines are based on the previous deadline rather than the time the job
+        # finished, so slow jobs do not shift later runs
+        self.deadline += self.interval
+
+        # Skip any runs missed entirely rather than running them back to back
+        if self.deadline <= now:
+            missed = (now - self.deadline) // self.interval + 1
+            self.deadline += missed * self.interval
+
+
+class DeadlineScheduler:
+    def __init__(self):
+        # Intervals and retries are timed with the monotonic clock, so setting the
+        # wall clock back, e.g. when daylight saving time ends, does not hold them
+        # up. Only jobs at a time of day follow the wall clock
+        self.timers = []
+        self.daily_jobs = []
+        self.counter = itertools.count()
+
+    # Returns every scheduled job, with its deadline
+    @property
+    def jobs(self):
+        return self.timers + self.daily_jobs
+
+    # Returns the current time on the clock the jobs of a heap are timed with
+    def now(self, heap):
+        return datetime.now() if heap is self.daily_jobs else time.monotonic()
+
+    # Adds a job to a timer heap
+    def add_job(self, heap, deadline, func, args, interval=None):
+        job = Job(deadline, interval, func, args)
+        # The counter keeps jobs with equal deadlines in the order they were added
+        heapq.heappush(heap, (job.deadline, next(self.counter), job))
+        return job
+
+    # Runs a job every interval (seconds), starting immediately by default or at a
+    # given date and time
+    def every(self, interval, func, *args, start=None):
+        deadline = time.monotonic()
+        if start is not None:
+            deadline += (start - datetime.now()).total_seconds()
+        return self.add_job(self.timers, deadline, func, args, interval)
+
+    # Runs a job every day at a specific time (HH:MM:SS)
+    def daily_at(self, time_of_day, func, *args):
+        now = datetime.now()
+        deadline = datetime.combine(
+            now.date(), datetime.strptime(time_of_day, "%H:%M:%S").time()
+        )
+        if deadline <= now:
+            deadline += timedelta(days=1)
+        return self.add_job(self.daily_jobs, deadline, func, args, timedelta(days=1))
+
+    # Runs a job once after a delay (seconds), e.g. to retry a failed request
+    def after(self, delay, func, *args):
+        return self.add_job(self.timers, time.monotonic() + delay, func, args)
+
+    # Stops a job from running again
+    def cancel(self, job):
+        if job is not None:
+            job.cancelled = True
+
+    # Returns the number of seconds until the next job is due, or None if no jobs
+    # remain
+    def next_delay(self):
+        delays = []
+
+        for heap in [self.timers, self.daily_jobs]:
+            while heap and heap[0][2].cancelled:
+                heapq.heappop(heap)
+
+            if heap:
+                delay = heap[0][0] - self.now(heap)
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                delays.append(delay)
+
+        return min(delays) if delays else None
+
+    # Returns the date and time the next job is due to run
+    def next_deadline(self):
+        delay = self.next_delay()
+
+        if delay is None:
+            return None
+
+        return datetime.now() + timedelta(seconds=delay)
+
+    # Runs all jobs whose deadline has passed
+    def run_pending(self):
+        for heap in [self.timers, self.daily_jobs]:
+            now = self.now(heap)
+
+            while heap and heap[0][0] <= now:
+                _, _, job = heapq.heappop(heap)
+
+                if job.cancelled:
+                    continue
+
+                try:
+                    result = job.func(*job.args)
+                except Exception:
+                    # A failing job, e.g. of one of many AQMs sharing the scheduler,
+                    # is reported without stopping the others. Repeating jobs run again
+                    print(f"Job '{getattr(job.func, '__name__', job.func)}' failed.")
+                    traceback.print_exc()
+                    result = None
+
+                if job.interval is None or result is CancelJob or job.cancelled:
+                    continue
+
+                job.advance(self.now(heap))
+                heapq.heappush(heap, (job.deadline, next(self.counter), job))
+
+    # Sleeps until each deadline and runs the jobs due, until no jobs remain
+    def run(self):
+        while True:
+            delay = self.next_delay()
+
+            if delay is None:
+                break
+
+            if delay > 0:
+                time.sleep(delay)
+
+            self.run_pending()
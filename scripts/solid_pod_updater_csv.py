@@ -3,14 +3,32 @@ from curses.ascii import US
 import os
 import time
 from datetime import datetime, timedelta
+import hashlib
 from pathlib import Path
-from scripts.contract_scripts import get_account, generate_hash
+from scripts.anchor_queue import AnchorQueue
+from scripts.contract_scripts import get_account
+from scripts.csv_journal import CSVJournal
+from scripts.pod_cache import PodCache
+from scripts.pod_layout import LAYOUTS, layout_url
+from scripts.pod_manifest import PodManifest
+from scripts.reading_buffer import ReadingBuffer
+from scripts.scheduler import DeadlineScheduler
+from scripts.thing_schema import SchemaChanged, ThingSchema, encode_csv_row
+from scripts.wot_client import WoTClient, WoTUnavailable
 import dotenv
-import requests
-import schedule
 from solid.auth import Auth
 from solid.solid_api import SolidAPI
 
+# Storage modes: "full" re-uploads the whole daily CSV file on every poll, whereas
+# "segmented" uploads only the new rows as a segment within a per-day folder
+STORAGE_MODES = ["full", "segmented"]
+
+# Time at which the next day's folder or CSV file is created in the Solid Pod
+PREPARE_TIME = "23:55:00"
+
+# Name of the per-day manifest listing the segments making up the daily CSV file
+SEGMENT_MANIFEST = "manifest.csv"
+
 
 class SolidPodUpdaterCSV:
     def __init__(
@@ -26,7 +44,26 @@ class SolidPodUpdaterCSV:
         wot_port,
         retry_time,
         hash_time,
+        storage_mode="full",
+        journal_folder="journal",
+        flush_readings=1,
+        flush_interval=0,
+        spill_folder="spill",
+        wot_client=None,
+        thing_path="",
+        api=None,
+        scheduler=None,
+        layout="flat",
+        manifest_name=None,
     ):
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(
+                f"Storage mode must be one of {STORAGE_MODES}, not '{storage_mode}'"
+            )
+
+        if layout not in LAYOUTS:
+            raise ValueError(f"Layout must be one of {LAYOUTS}, not '{layout}'")
+
         self.pod_provider = pod_provider
         self.pod_endpoint = pod_endpoint
         self.aqm_folder = aqm_folder
@@ -34,193 +71,667 @@ class SolidPodUpdaterCSV:
         self.polling_frequency = polling_frequency
         self.wot_url = wot_url
         self.wot_port = wot_port
+        self.thing_path = thing_path
         self.retry_time = retry_time
+        self.wot_client = wot_client if wot_client is not None else WoTClient()
         self.hash_time = hash_time
-
-        auth = Auth()
-        self.api = SolidAPI(auth)
-        auth.login(pod_provider, pod_username, pod_password)
+        self.storage_mode = storage_mode
+        self.layout = layout
+        self.journal = CSVJournal(journal_folder)
+        # Updaters run in one process share the scheduler and Solid session
+        self.scheduler = scheduler if scheduler is not None else DeadlineScheduler()
+        self.pending_uploads = {}
+        self.jobs = []
+        self.schema = None
+        self.revision_file = os.path.join(journal_folder, "revision")
+        self.revision_date, self.revision = self.load_revision()
+        # Days whose segments are not sealed yet, so a day missed by a restart is
+        # still sealed
+        self.segment_days_file = os.path.join(journal_folder, "segment_days")
+        self.segment_days = self.load_segment_days()
+        # Retries of sealing a day, by day for segments and by file name for
+        # journaled days
+        self.pending_seals = {}
+        self.flush_job = None
+        self.drain_job = None
+        # Retry of reconciling the journal resumed after a restart with the Solid
+        # Pod file, which is due before the journal is uploaded again
+        self.reconcile_job = None
+        # File hashes waiting to be stored in the smart contract, so sealing never
+        # waits for the blockchain
+        self.pending_anchors = AnchorQueue(
+            os.path.join(spill_folder, f"{aqm_name.strip('/')}-csv-anchors.jsonl")
+        )
+
+        if storage_mode == "segmented":
+            spill_file = os.path.join(spill_folder, f"{aqm_name.strip('/')}-csv.jsonl")
+        else:
+            # Readings are already journaled, so they need no spill file
+            spill_file = None
+
+        self.buffer = ReadingBuffer(flush_readings, flush_interval, spill_file)
+
+        if api is not None:
+            self.api = api
+        else:
+            auth = Auth()
+            self.api = SolidAPI(auth)
+            auth.login(pod_provider, pod_username, pod_password)
+
+        self.pod_cache = PodCache(self.api)
+        # Sealed files are listed with their sizes and hashes in a manifest in
+        # each folder, so they can be audited without downloading them all
+        self.manifest = PodManifest(self.api, manifest_name) if manifest_name else None
+        self.manifest_job = None
+
+        # A flat AQM folder has a single manifest, written out whole each time a
+        # file is sealed, so it gets slower to update with every file
+        if manifest_name and layout == "flat":
+            print(
+                "Warning - The manifest of a flat AQM folder is rewritten with every "
+                "file sealed. Set POD_LAYOUT=dated to keep a manifest per day."
+            )
+
+    # Retrieves the AQM's Thing Description and caches the schema of its properties
+    def load_schema(self):
+        req = self.wot_client.get(
+            f"{self.wot_url}:{self.wot_port}{self.thing_path or '/'}",
+            "Thing Description",
+        )
+        self.schema = ThingSchema.from_thing_description(req.json())
 
     # Retrieves AQM properties
     def request_header_from_wot_interface(self):
-        headers = {"Content-Type": "application/json; charset=utf-8"}
-
-        while True:
-            try:
-                req = requests.get(
-                    f"{self.wot_url}:{self.wot_port}/properties",
-                    headers=headers,
-                    timeout=None,
-                )
-                break
-            except Exception:
-                print(
-                    f"Unable to get header from WoT interface. Will retry in {self.retry_time}s."
-                )
-                time.sleep(self.retry_time)
-
-        results = req.json()
-
-        # Get a header based on the keys of the response. E.g., the
-        # header may look something like date, time, o3, no2, etc.
-        weather_station_header = ["date", "time"] + [result for result in results]
-
-        header_as_string = ""
-        for item in weather_station_header:
-            header_as_string += f"{item},"
+        self.load_schema()
 
-        # Strip the trailing comma
-        header_as_string = header_as_string[:-1]
-
-        return header_as_string
+        # The header is the date and time followed by the properties of the
+        # Thing Description, e.g. date, time, o3, no2, etc.
+        return encode_csv_row(["date", "time"] + self.schema.names)
 
     # Retrieves AQM data
     def request_data_from_wot_interface(self):
-        headers = {"Content-Type": "application/json; charset=utf-8"}
-
-        while True:
-            try:
-                req = requests.get(
-                    f"{self.wot_url}:{self.wot_port}/properties",
-                    headers=headers,
-                    timeout=None,
-                )
-                break
-            except Exception:
-                print(
-                    f"Unable to get data from WoT interface. Will retry in {self.retry_time}s."
-                )
-                time.sleep(self.retry_time)
+        if self.schema is None:
+            self.load_schema()
 
-        results = req.json()
+        req = self.wot_client.get(
+            f"{self.wot_url}:{self.wot_port}{self.thing_path}/properties", "data"
+        )
 
-        # Get the values of the AQM properties. E.g., the data may look something like
+        # The response is decoded straight into a row in header order. E.g., the
+        # data may look something like
         # '2022-03-09', '13:02:37', 7.21602550234155, 0.3994960553201695...
+        now = datetime.now()
         weather_station_data = [
-            datetime.now().strftime("%Y-%m-%d"),
-            datetime.now().strftime("%H:%M:%S"),
-        ] + [results[result] for result in results]
+            now.strftime("%Y-%m-%d"),
+            now.strftime("%H:%M:%S"),
+        ] + self.schema.decode(req.json())
+
+        return encode_csv_row(weather_station_data)
+
+    # Returns the name of a day's CSV file, without its extension
+    def day_stem(self, day=None):
+        if day is None:
+            day = datetime.now().strftime("%Y-%m-%d")
+
+        # Files started on the day the AQM's properties changed are numbered,
+        # e.g. 2022-03-21_1.csv
+        if self.revision and day == self.revision_date:
+            return f"{day}_{self.revision}"
+
+        return day
+
+    # Loads the numbering of files started after a change of the AQM's properties
+    def load_revision(self):
+        if not os.path.exists(self.revision_file):
+            return None, 0
+
+        with open(self.revision_file) as revision_file:
+            revision_date, revision = revision_file.read().split(",")
+
+        return revision_date, int(revision)
+
+    # Loads the days whose segments are not sealed yet
+    def load_segment_days(self):
+        if not os.path.exists(self.segment_days_file):
+            return set()
+
+        with open(self.segment_days_file) as segment_days_file:
+            return set(segment_days_file.read().split())
+
+    # Records the days whose segments are not sealed yet
+    def save_segment_days(self):
+        os.makedirs(os.path.dirname(self.segment_days_file), exist_ok=True)
+        with open(self.segment_days_file, "w") as segment_days_file:
+            segment_days_file.write("\n".join(sorted(self.segment_days)))
+
+    # Seals the current file and starts a new one when the AQM's properties change,
+    # so rows with different columns never share a file
+    def change_schema(self, aqm_folder_url, csv_header):
+        # The new header is fetched before anything is sealed or cancelled, so an
+        # AQM that stops responding keeps polling, and the change is retried when
+        # its next poll finds it
+        try:
+            new_csv_header = self.request_header_from_wot_interface()
+        except WoTUnavailable:
+            print(f"Unable to reach AQM. Will retry in {self.polling_frequency}s.")
+            return
+
+        print("AQM properties have changed. Starting a new file.")
+
+        if self.storage_mode == "segmented":
+            self.seal_segments(aqm_folder_url, csv_header, self.day_stem())
+        elif self.journal.file_name is not None:
+            # Readings already polled are uploaded before the file is sealed
+            self.flush(aqm_folder_url, csv_header)
+            self.seal_day(aqm_folder_url)
+
+        today = datetime.now().strftime("%Y-%m-%d")
+        self.revision = self.revision + 1 if self.revision_date == today else 1
+        self.revision_date = today
+
+        os.makedirs(os.path.dirname(self.revision_file), exist_ok=True)
+        with open(self.revision_file, "w") as revision_file:
+            revision_file.write(f"{self.revision_date},{self.revision}")
+
+        # The jobs polling with the old header are replaced
+        for job in self.jobs:
+            self.scheduler.cancel(job)
+        self.schedule_polling(aqm_folder_url, new_csv_header)
+
+    # Queues a file hash to be stored in the smart contract
+    def anchor_hash(self, file_hash):
+        self.pending_anchors.add(file_hash)
+        self.drain_anchors()
+
+    # Stores the queued file hashes in the smart contract, catching up on any
+    # queued while the blockchain was unreachable
+    def drain_anchors(self):
+        self.scheduler.cancel(self.drain_job)
+        self.drain_job = None
 
-        data_as_string = ""
-        for datum in weather_station_data:
-            data_as_string += f"{datum},"
+        print("File hashing started...")
+        if not self.pending_anchors.drain(self.store_hash):
+            print(
+                f"Unable to store hash in contract. Will retry in {self.retry_time}s."
+            )
+            self.drain_job = self.scheduler.after(self.retry_time, self.drain_anchors)
+            return
+        print("File hashing complete")
 
-        # Strip the trailing comma
-        data_as_string = data_as_string[:-1]
+    # Lists a sealed file in the manifest of its folder
+    def record_file(self, file_url, file_hash, size):
+        if self.manifest is None:
+            return
 
-        return data_as_string
+        self.manifest.add(file_url, file_hash, size, anchor=file_hash, proof=[])
+        self.save_manifests()
 
-    # Sets the hash function schedule
-    def set_schedule(self, schedule_set, local_file):
-        # Set hash function to execute once at specific time
-        schedule.every().day.at(self.hash_time).do(self.hash_file, local_file)
-        schedule_set = True
-        return schedule_set
+    # Writes the manifests of the folders whose files were sealed
+    def save_manifests(self):
+        self.scheduler.cancel(self.manifest_job)
+        self.manifest_job = None
 
-    # Generates and stores file hashes
-    def hash_file(self, file):
-        print("File hashing started...")
+        if not self.manifest.save():
+            print(f"Unable to update manifest. Will retry in {self.retry_time}s.")
+            self.manifest_job = self.scheduler.after(
+                self.retry_time, self.save_manifests
+            )
+
+    # Stores a file hash in the smart contract
+    def store_hash(self, file_hash):
         account = get_account()
-        file_hash = generate_hash(file)
         hash_storage = Contract(config["contract"]["address"])
         hash_storage.store_hash(file_hash, {"from": account})
-        print("File hashing complete")
-        return schedule.CancelJob
 
-    # Executes the Solid Pod updater
-    def start(self):
-        # https://www.geeksforgeeks.org/http-headers-content-type/
+    # Uploads only the new AQM data as a segment within the day's folder
+    def write_segment(self, aqm_folder_url, new_aqm_data):
+        FILE_CONTENT_TYPE = "text/csv"
+
+        # The date and time of the reading are the first two columns
+        segment_date, segment_time = new_aqm_data.split(",")[:2]
+        day = self.day_stem(segment_date)
+        day_folder_url = layout_url(aqm_folder_url, f"{day}/", self.layout)
+        segment_url = f"{day_folder_url}{segment_time.replace(':', '-')}.csv"
+
+        try:
+            # Only the first segment of each day checks for the day's folder
+            if self.pod_cache.ensure_path(day_folder_url):
+                print(f"Created AQM segment folder at '{day_folder_url}'.")
+            self.pod_cache.put_file(
+                segment_url, new_aqm_data.encode(), FILE_CONTENT_TYPE
+            )
+            print(f"Added segment at '{segment_url}'.")
+        except Exception:
+            print(f"Unable to add segment to Pod. Will retry in {self.retry_time}s.")
+            return None
+
+        if day not in self.segment_days:
+            self.segment_days.add(day)
+            self.save_segment_days()
+
+        return segment_url
+
+    # Uploads buffered AQM data as one segment per day
+    def write_segments(self, aqm_folder_url, rows):
+        rows_by_date = {}
+        for row in rows:
+            rows_by_date.setdefault(row.split(",")[0], []).append(row)
+
+        # A segment is named after its first row, so retrying rewrites the same one
+        segment_urls = [
+            self.write_segment(aqm_folder_url, "\n".join(date_rows))
+            for date_rows in rows_by_date.values()
+        ]
+
+        return None not in segment_urls
+
+    # Reassembles the day's segments into the canonical daily CSV file and hashes it
+    def seal_segments(self, aqm_folder_url, csv_header, segment_date=None):
         FILE_CONTENT_TYPE = "text/csv"
 
-        csv_header = self.request_header_from_wot_interface()
+        if segment_date is None:
+            segment_date = self.day_stem()
+
+        # Any earlier seal of the day still waiting to be retried is superseded
+        self.scheduler.cancel(self.pending_seals.pop(segment_date, None))
+
+        day_folder_url = layout_url(aqm_folder_url, f"{segment_date}/", self.layout)
+        FILE_NAME = f"{segment_date}.csv"
+        file_url = layout_url(aqm_folder_url, FILE_NAME, self.layout)
+
+        print(f"Sealing segments in '{day_folder_url}'...")
+
+        try:
+            # Readings still buffered belong in the sealed file
+            self.flush(aqm_folder_url, csv_header)
+            if self.buffer.readings:
+                raise Exception("Buffered readings could not be written")
+
+            day_folder = self.api.read_folder(day_folder_url)
+            # Segment names are times (HH-MM-SS), so sorting restores their order
+            segment_names = sorted(
+                file.name for file in day_folder.files if file.name != SEGMENT_MANIFEST
+            )
+            segments = [
+                self.api.get(day_folder_url + segment_name).text
+                for segment_name in segment_names
+            ]
+
+            # The daily CSV file is identical to the one written in "full" storage mode
+            daily_csv_data = "\n".join([csv_header] + segments).encode()
+
+            manifest_rows = ["segment,rows"] + [
+                f"{segment_name},{len(segment.splitlines())}"
+                for segment_name, segment in zip(segment_names, segments)
+            ]
+            manifest_data = "\n".join(manifest_rows).encode()
+
+            self.pod_cache.put_file(file_url, daily_csv_data, FILE_CONTENT_TYPE)
+            self.pod_cache.put_file(
+                day_folder_url + SEGMENT_MANIFEST, manifest_data, FILE_CONTENT_TYPE
+            )
+            print(f"Sealed {len(segments)} segments into '{file_url}'.")
+        except Exception:
+            print(f"Unable to seal segments in Pod. Will retry in {self.retry_time}s.")
+            self.pending_seals[segment_date] = self.scheduler.after(
+                self.retry_time,
+                self.seal_segments,
+                aqm_folder_url,
+                csv_header,
+                segment_date,
+            )
+            return file_url
+
+        file_hash = hashlib.sha256(daily_csv_data).hexdigest()
+        self.anchor_hash(file_hash)
+        self.record_file(file_url, file_hash, len(daily_csv_data))
+
+        self.segment_days.discard(segment_date)
+        self.save_segment_days()
+
+        return file_url
+
+    # Seals the segments of every day before today, once the day is over, so
+    # segments written up to midnight are included. Days missed by a restart are
+    # sealed when the updater starts
+    def seal_past_days(self, aqm_folder_url, csv_header):
+        today = self.day_stem()
+
+        for day in sorted(self.segment_days - {today}):
+            self.seal_segments(aqm_folder_url, csv_header, day)
+
+    # Opens the local journal of a day's CSV file
+    def resume_journal(self, file_name, file_url, csv_header):
+        if self.journal.open_day(file_name, csv_header):
+            # Only a restart finds an existing journal
+            self.reconcile_journal(file_url)
+
+    # Reconciles the journal resumed after a restart with the Solid Pod file,
+    # returning whether it was. Polling carries on into the journal while the
+    # Solid Pod is unreachable, and the reconcile is retried until it succeeds
+    def reconcile_journal(self, file_url):
+        self.scheduler.cancel(self.reconcile_job)
+        self.reconcile_job = None
+
+        try:
+            source = self.journal.reconcile(self.api, file_url)
+        except Exception:
+            print(
+                f"Unable to reconcile journal with Pod. Will retry in {self.retry_time}s."
+            )
+            self.reconcile_job = self.scheduler.after(
+                self.retry_time, self.reconcile_journal, file_url
+            )
+            return False
+
+        print(f"Reconciled journal with '{file_url}' ({source}).")
+        return True
+
+    # Seals the journaled day's CSV file by anchoring its running hash. A day
+    # whose last upload failed is handed over to be uploaded again first
+    def seal_day(self, aqm_folder_url):
+        file_url = layout_url(aqm_folder_url, self.journal.file_name, self.layout)
+        journal = self.journal
+        self.journal = CSVJournal(journal.journal_folder)
+
+        # A journal not reconciled yet is reconciled by the seal instead
+        reconciled = self.reconcile_job is None
+        self.scheduler.cancel(self.reconcile_job)
+        self.reconcile_job = None
+
+        retry = self.pending_uploads.pop(file_url, None)
+        if retry is not None or not reconciled:
+            self.scheduler.cancel(retry)
+            self.seal_journal(aqm_folder_url, journal, reconciled)
+            return
+
+        self.close_journal(file_url, journal)
+
+    # Uploads the journal of a past day in full, then seals it. The journal is
+    # kept until the upload succeeds, so a restart uploads it again rather than
+    # anchoring a file the Solid Pod does not hold. A journal left by a restart is
+    # reconciled with the Solid Pod file first
+    def seal_journal(self, aqm_folder_url, journal, reconciled=True):
+        FILE_CONTENT_TYPE = "text/csv"
 
-        base_url = self.pod_endpoint
-        aqms_folder_url = base_url + self.aqm_folder
-        aqm_folder_url = aqms_folder_url + self.aqm_name
+        self.pending_seals.pop(journal.file_name, None)
+        file_url = layout_url(aqm_folder_url, journal.file_name, self.layout)
+
+        try:
+            if not reconciled:
+                source = journal.reconcile(self.api, file_url)
+                print(f"Reconciled journal with '{file_url}' ({source}).")
+                reconciled = True
+
+            self.pod_cache.put_file(file_url, journal.content(), FILE_CONTENT_TYPE)
+            print(f"Added entry at '{file_url}'.")
+        except Exception:
+            print(f"Unable to seal '{file_url}'. Will retry in {self.retry_time}s.")
+            self.pending_seals[journal.file_name] = self.scheduler.after(
+                self.retry_time, self.seal_journal, aqm_folder_url, journal, reconciled
+            )
+            return False
+
+        self.close_journal(file_url, journal)
+        return True
+
+    # Removes the journal of an uploaded day and anchors its running hash, which
+    # was updated as each row was journaled, so sealing never re-reads the file
+    def close_journal(self, file_url, journal):
+        file_hash = journal.digest()
+        file_size = len(journal.content())
+        journal.close_day()
+        print(f"Sealed '{file_url}'.")
+        self.anchor_hash(file_hash)
+        self.record_file(file_url, file_hash, file_size)
+
+    # Seals the previous day, if any, and opens the journal of a new day
+    def open_journal(self, aqm_folder_url, file_name, csv_header):
+        if self.journal.file_name is not None:
+            # Readings still buffered are uploaded before the day is sealed
+            self.flush(aqm_folder_url, csv_header)
+            self.seal_day(aqm_folder_url)
+
+        # Days left unsealed by a restart are uploaded in full, then sealed. Days
+        # already waiting for a retry are left to it
+        for unsealed_file_name in self.journal.unsealed_days(file_name):
+            if unsealed_file_name in self.pending_seals:
+                continue
+
+            journal = CSVJournal(self.journal.journal_folder)
+            journal.open_day(unsealed_file_name, csv_header)
+            self.seal_journal(aqm_folder_url, journal, reconciled=False)
+
+        self.resume_journal(
+            file_name, layout_url(aqm_folder_url, file_name, self.layout), csv_header
+        )
+
+    # Seals the day's CSV file and starts the next one at midnight
+    def roll_over_day(self, aqm_folder_url, csv_header):
+        FILE_NAME = f"{self.day_stem()}.csv"
+
+        if FILE_NAME != self.journal.file_name:
+            self.open_journal(aqm_folder_url, FILE_NAME, csv_header)
+            print(f"Started new AQM data file '{FILE_NAME}'.")
+
+    # Creates the next day's folder or CSV file shortly before midnight, so the
+    # first upload of the day needs no checks
+    def prepare_next_day(self, aqm_folder_url, csv_header):
+        FILE_CONTENT_TYPE = "text/csv"
 
-        print(f"Base Pod URL is '{base_url}'.")
-        print(f"AQM data folder in Pod is '{aqms_folder_url}'.")
-        print(f"Folder for this AQM in the Pod is '{aqm_folder_url}'.")
+        next_day = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        file_url = layout_url(aqm_folder_url, f"{next_day}.csv", self.layout)
 
-        schedule_set = False
-
-        while True:
-            try:
-                if not self.api.item_exists(aqms_folder_url):
-                    self.api.create_folder(aqms_folder_url)
-                    print(f"Created AQM parent folder at '{aqms_folder_url}'.")
-                break
-            except Exception:
-                print(
-                    f"Unable to check if AQM parent folder exists. Will retry in {self.retry_time}s."
+        try:
+            if self.storage_mode == "segmented":
+                self.pod_cache.ensure_path(
+                    layout_url(aqm_folder_url, f"{next_day}/", self.layout)
                 )
-                time.sleep(self.retry_time)
-
-        while True:
-            try:
-                if not self.api.item_exists(aqm_folder_url):
-                    self.api.create_folder(aqm_folder_url)
-                    print(f"Created AQM folder at '{aqm_folder_url}'.")
-                break
-            except Exception:
-                print(
-                    f"Unable to check if AQM folder exists. Will retry in {self.retry_time}s."
+            elif not self.pod_cache.exists(file_url):
+                self.pod_cache.put_file(
+                    file_url, csv_header.encode(), FILE_CONTENT_TYPE
                 )
-                time.sleep(self.retry_time)
-
-        while True:
-            # Creates a new CSV file for each day
-            FILE_NAME = f"{datetime.now().strftime('%Y-%m-%d')}.csv"
-            file_url = aqm_folder_url + FILE_NAME
-
-            while True:
-                try:
-                    if not self.api.item_exists(file_url):
-                        self.api.put_file(file_url, csv_header, FILE_CONTENT_TYPE)
-                        print(
-                            f"Created AQM data file at '{file_url}', with header\
-    '{csv_header}'."
-                        )
-                    break
-                except Exception:
-                    print(
-                        f"Unable to check if CSV file exists. Will retry in {self.retry_time}s."
-                    )
-                    time.sleep(self.retry_time)
-
-            # Get the current data from CSV file stored in the Solid Pod
-            current_csv_data = self.api.get(file_url).text
-
-            # Retrieve new data from AQM
-            new_aqm_data = self.request_data_from_wot_interface()
+            print(f"Prepared the Pod for {next_day}.")
+        except Exception:
+            # The first upload of the day creates anything missing
+            print(f"Unable to prepare the Pod for {next_day}.")
+
+    # Uploads the journal of the day's CSV file to the Solid Pod
+    def upload_file(self, file_url, new_csv_data):
+        FILE_CONTENT_TYPE = "text/csv"
 
-            # Combine data and convert to bytes via encoding
-            new_csv_data = (current_csv_data + "\n" + new_aqm_data).encode()
+        # Any earlier upload still waiting to be retried is superseded by this one
+        self.scheduler.cancel(self.pending_uploads.pop(file_url, None))
+
+        try:
+            # The journal holds the whole file, so a single PUT creates or updates it
+            response = self.pod_cache.put_file(
+                file_url, new_csv_data, FILE_CONTENT_TYPE
+            )
+            print(f"Added entry at '{file_url}'.")
+        except Exception:
+            print(f"Unable to add data to Pod. Will retry in {self.retry_time}s.")
+            self.pending_uploads[file_url] = self.scheduler.after(
+                self.retry_time, self.upload_file, file_url, new_csv_data
+            )
+            return False
+
+        if self.journal.file_name and file_url.endswith(self.journal.file_name):
+            self.journal.record_upload(response.headers.get("ETag"))
+
+        return True
+
+    # Buffers a reading and flushes the buffer once it is full
+    def buffer_reading(self, aqm_folder_url, csv_header, reading):
+        self.buffer.add(reading)
+
+        if self.flush_job is None and self.buffer.max_age > 0:
+            # The first reading of a batch starts the timer for flushing it. So do
+            # readings spilled before a restart, once polling resumes
+            self.flush_job = self.scheduler.after(
+                self.buffer.max_age, self.flush, aqm_folder_url, csv_header
+            )
+
+        if self.buffer.is_full():
+            self.flush(aqm_folder_url, csv_header)
+
+    # Writes the buffered readings to the Solid Pod
+    def flush(self, aqm_folder_url, csv_header):
+        self.scheduler.cancel(self.flush_job)
+        self.flush_job = None
+
+        readings = list(self.buffer.readings)
+
+        if not readings:
+            return
+
+        if self.storage_mode == "segmented":
+            flushed = self.write_segments(aqm_folder_url, readings)
+        else:
+            # The journal already holds the readings and the upload retries itself.
+            # A journal resumed after a restart is reconciled before its first
+            # upload, or uploaded by a later flush once it is
+            file_url = layout_url(aqm_folder_url, self.journal.file_name, self.layout)
+            if self.reconcile_job is None or self.reconcile_journal(file_url):
+                self.upload_file(file_url, self.journal.content())
+            flushed = True
+
+        if flushed:
+            self.buffer.clear(len(readings))
+        else:
+            # The readings stay buffered (and spilled) until they are written
+            self.flush_job = self.scheduler.after(
+                self.retry_time, self.flush, aqm_folder_url, csv_header
+            )
+
+    # Polls the AQM and adds the new data to the day's CSV file
+    def poll(self, aqm_folder_url, csv_header):
+        # Creates a new CSV file for each day
+        FILE_NAME = f"{self.day_stem()}.csv"
+
+        # Normally the midnight rollover has already opened the day's journal
+        if FILE_NAME != self.journal.file_name:
+            self.open_journal(aqm_folder_url, FILE_NAME, csv_header)
+
+        # Retrieve new data from AQM
+        try:
+            new_aqm_data = self.request_data_from_wot_interface()
+        except SchemaChanged:
+            self.change_schema(aqm_folder_url, csv_header)
+            return
+        except WoTUnavailable:
+            # The tick is skipped, and the AQM polled again at the next one
+            return
+
+        # Journal the new data before uploading, so it survives a crash
+        self.journal.append(new_aqm_data)
+
+        self.buffer_reading(aqm_folder_url, csv_header, new_aqm_data)
+
+    # Polls the AQM and uploads the new data as part of a segment
+    def poll_segment(self, aqm_folder_url, csv_header):
+        # Retrieve new data from AQM
+        try:
+            new_aqm_data = self.request_data_from_wot_interface()
+        except SchemaChanged:
+            self.change_schema(aqm_folder_url, csv_header)
+            return
+        except WoTUnavailable:
+            # The tick is skipped, and the AQM polled again at the next one
+            return
 
-            while True:
-                try:
-                    self.api.put_file(file_url, new_csv_data, FILE_CONTENT_TYPE)
-                    print(f"Added entry at '{file_url}'.")
-                    self.api.get(file_url)
-                    local_file = FILE_NAME
-                    open(local_file, "wb").write(new_csv_data)
-                    break
-                except Exception:
-                    print(
-                        f"Unable to add data to Pod. Will retry in {self.retry_time}s."
-                    )
-                    time.sleep(self.retry_time)
+        self.buffer_reading(aqm_folder_url, csv_header, new_aqm_data)
 
-            end_time = datetime.now() + timedelta(seconds=self.polling_frequency)
+    # Prepares the Solid Pod folders and schedules the updater's jobs
+    def schedule_jobs(self):
+        base_url = self.pod_endpoint
+        aqms_folder_url = base_url + self.aqm_folder
+        aqm_folder_url = aqms_folder_url + self.aqm_name
 
-            if schedule_set == False:
-                schedule_set = self.set_schedule(schedule_set, local_file)
+        print(f"Base Pod URL is '{base_url}'.")
+        print(f"AQM data folder in Pod is '{aqms_folder_url}'.")
+        print(f"Folder for this AQM in the Pod is '{aqm_folder_url}'.")
 
-            while datetime.now() < end_time:
-                schedule.run_pending()
+        # Polling starts even if the Solid Pod is unreachable, as the readings are
+        # journaled until the folders can be created
+        self.create_folders(aqms_folder_url, aqm_folder_url)
+
+        # Hashes queued before a restart are stored straight away
+        if len(self.pending_anchors):
+            self.drain_job = self.scheduler.after(0, self.drain_anchors)
+
+        self.start_polling(aqm_folder_url)
+
+    # Schedules polling once the AQM's header is known. An AQM that does not
+    # respond is tried again later, so it does not hold up the others
+    def start_polling(self, aqm_folder_url):
+        try:
+            csv_header = self.request_header_from_wot_interface()
+        except WoTUnavailable:
+            print(f"Unable to reach AQM. Will retry in {self.retry_time}s.")
+            self.scheduler.after(self.retry_time, self.start_polling, aqm_folder_url)
+            return
+
+        self.schedule_polling(aqm_folder_url, csv_header)
+
+    # Creates the AQM parent folder and the AQM folder, returning whether they
+    # exist
+    def create_folders(self, aqms_folder_url, aqm_folder_url):
+        try:
+            if self.pod_cache.ensure_container(aqms_folder_url):
+                print(f"Created AQM parent folder at '{aqms_folder_url}'.")
+
+            if self.pod_cache.ensure_container(aqm_folder_url):
+                print(f"Created AQM folder at '{aqm_folder_url}'.")
+        except Exception:
+            print(f"Unable to create AQM folders. Will retry in {self.retry_time}s.")
+            self.scheduler.after(
+                self.retry_time, self.create_folders, aqms_folder_url, aqm_folder_url
+            )
+            return False
+
+        return True
+
+    # Schedules polling, and sealing or the midnight rollover, for a CSV header
+    def schedule_polling(self, aqm_folder_url, csv_header):
+        # The polling tick, sealing, midnight rollover and retries all share the
+        # scheduler, which sleeps until the next of them is due
+        if self.storage_mode == "segmented":
+            self.jobs = [
+                self.scheduler.every(
+                    self.polling_frequency,
+                    self.poll_segment,
+                    aqm_folder_url,
+                    csv_header,
+                ),
+                # Segments are sealed into the daily CSV file once the day is over
+                self.scheduler.after(
+                    0, self.seal_past_days, aqm_folder_url, csv_header
+                ),
+                self.scheduler.daily_at(
+                    "00:00:00", self.seal_past_days, aqm_folder_url, csv_header
+                ),
+                self.scheduler.daily_at(
+                    PREPARE_TIME, self.prepare_next_day, aqm_folder_url, csv_header
+                ),
+            ]
+        else:
+            self.jobs = [
+                self.scheduler.every(
+                    self.polling_frequency, self.poll, aqm_folder_url, csv_header
+                ),
+                self.scheduler.daily_at(
+                    "00:00:00", self.roll_over_day, aqm_folder_url, csv_header
+                ),
+                self.scheduler.daily_at(
+                    PREPARE_TIME, self.prepare_next_day, aqm_folder_url, csv_header
+                ),
+            ]
 
-            # Delete the file locally
-            os.remove(local_file)
+    # Executes the Solid Pod updater
+    def start(self):
+        self.schedule_jobs()
+        self.scheduler.run()
 
 
 def main():
@@ -260,6 +771,16 @@ def main():
     POLLING_TIME = int(os.environ.get("POLLING_TIME"))
     SOLID_RETRY_TIME = int(os.environ.get("SOLID_RETRY_TIME"))
     HASH_TIME = os.environ.get("AQM_CSV_HASH_TIME")
+    STORAGE_MODE = os.environ.get("CSV_STORAGE_MODE", "full")
+    JOURNAL_FOLDER = os.environ.get("CSV_JOURNAL_FOLDER", "journal")
+    FLUSH_READINGS = int(os.environ.get("FLUSH_READINGS", 1))
+    FLUSH_INTERVAL = int(os.environ.get("FLUSH_INTERVAL", 0))
+    SPILL_FOLDER = os.environ.get("SPILL_FOLDER", "spill")
+    WOT_CONNECT_TIMEOUT = float(os.environ.get("WOT_CONNECT_TIMEOUT", 5))
+    WOT_READ_TIMEOUT = float(os.environ.get("WOT_READ_TIMEOUT", 30))
+    WOT_MAX_BACKOFF = float(os.environ.get("WOT_MAX_BACKOFF", 30))
+    POD_LAYOUT = os.environ.get("POD_LAYOUT", "flat")
+    POD_MANIFEST = os.environ.get("POD_MANIFEST") or None
 
     updater = SolidPodUpdaterCSV(
         pod_provider=SOLID_POD_PROVIDER,
@@ -273,6 +794,14 @@ def main():
         wot_port=WOT_PORT,
         retry_time=SOLID_RETRY_TIME,
         hash_time=HASH_TIME,
+        storage_mode=STORAGE_MODE,
+        journal_folder=JOURNAL_FOLDER,
+        flush_readings=FLUSH_READINGS,
+        flush_interval=FLUSH_INTERVAL,
+        spill_folder=SPILL_FOLDER,
+        wot_client=WoTClient(WOT_CONNECT_TIMEOUT, WOT_READ_TIMEOUT, WOT_MAX_BACKOFF),
+        layout=POD_LAYOUT,
+        manifest_name=POD_MANIFEST,
     )
 
     # Run the updater
@@ -0,0 +1,168 @@
+import os
+from scripts.scheduler import DeadlineScheduler
+from scripts.solid_pod_updater_csv import SolidPodUpdaterCSV
+from scripts.wot_client import WoTClient
+import dotenv
+from solid.auth import Auth
+from solid.solid_api import SolidAPI
+
+
+class SolidPodUpdaterMulti:
+    def __init__(
+        self, pod_provider, pod_username, pod_password, retry_time, wot_client=None
+    ):
+        self.pod_provider = pod_provider
+        self.pod_username = pod_username
+        self.pod_password = pod_password
+        self.retry_time = retry_time
+        self.updaters = []
+        # All AQMs share one pool of keep-alive connections. Requests to an AQM
+        # that does not respond are given up on rather than retried, as every
+        # AQM is polled from the same thread
+        self.wot_client = (
+            wot_client if wot_client is not None else WoTClient(blocking=False)
+        )
+        # All AQMs share one scheduler, so a single loop drives every updater
+        self.scheduler = DeadlineScheduler()
+
+        # All AQMs share one authenticated Solid session
+        auth = Auth()
+        self.api = SolidAPI(auth)
+        auth.login(pod_provider, pod_username, pod_password)
+
+    # Retrieves the AQMs listed by a WebThings Gateway
+    def request_things_from_wot_interface(self, wot_url, wot_port):
+        # The updater cannot start without the list of AQMs, so it waits for it
+        req = self.wot_client.get(
+            f"{wot_url}:{wot_port}/things", "things", blocking=True
+        )
+
+        # Each thing is listed with a path such as /things/aqm1, which is used as
+        # the AQM name
+        return [
+            (thing["href"].rstrip("/").split("/")[-1], wot_url, wot_port, thing["href"])
+            for thing in req.json()
+        ]
+
+    # Adds an AQM driven through the shared Solid session and scheduler
+    def add_aqm(self, **kwargs):
+        updater = SolidPodUpdaterCSV(
+            pod_provider=self.pod_provider,
+            pod_username=self.pod_username,
+            pod_password=self.pod_password,
+            retry_time=self.retry_time,
+            api=self.api,
+            scheduler=self.scheduler,
+            wot_client=self.wot_client,
+            **kwargs,
+        )
+        self.updaters.append(updater)
+        return updater
+
+    # Executes the Solid Pod updater for every AQM
+    def start(self):
+        for updater in self.updaters:
+            updater.schedule_jobs()
+
+        self.scheduler.run()
+
+
+# Parses AQM endpoints given as name=url:port, separated by commas
+def parse_aqm_endpoints(endpoints):
+    aqms = []
+
+    for endpoint in endpoints.split(","):
+        if not endpoint.strip():
+            continue
+
+        name, address = endpoint.strip().split("=", 1)
+        wot_url, wot_port = address.rsplit(":", 1)
+        aqms.append((name, wot_url, wot_port, ""))
+
+    return aqms
+
+
+def main():
+    path = dotenv.find_dotenv()
+
+    dotenv.load_dotenv(path)
+
+    # Set the timezone according to the TZ environment variable - Unix only
+    # time.tzset()
+
+    SOLID_POD_PROVIDER = os.environ.get("SOLID_POD_PROVIDER")
+
+    # WARNING: You must use the .env or other similar method to securely
+    # authenticate to your SOLID POD. Do not enter your details in this file, and
+    # definitely do not commit to version control your details. See the README
+    # before proceeding.
+    USER_NAME = os.environ.get("USER_NAME")
+    PASSWORD = os.environ.get("PASSWORD")
+
+    POD_ENDPOINT = os.environ.get("SOLID_POD_URL")
+
+    if POD_ENDPOINT[-1] != "/":
+        POD_ENDPOINT += "/"
+
+    AQM_FOLDER_NAME = os.environ.get("CSV_AQM_FOLDER_NAME")
+
+    if AQM_FOLDER_NAME[-1] != "/":
+        AQM_FOLDER_NAME += "/"
+
+    WOT_URL = os.environ.get("WOT_URL")
+    WOT_PORT = os.environ.get("WOT_PORT")
+    AQM_ENDPOINTS = os.environ.get("AQM_ENDPOINTS", "")
+    POLLING_TIME = int(os.environ.get("POLLING_TIME"))
+    SOLID_RETRY_TIME = int(os.environ.get("SOLID_RETRY_TIME"))
+    HASH_TIME = os.environ.get("AQM_CSV_HASH_TIME")
+    STORAGE_MODE = os.environ.get("CSV_STORAGE_MODE", "full")
+    JOURNAL_FOLDER = os.environ.get("CSV_JOURNAL_FOLDER", "journal")
+    FLUSH_READINGS = int(os.environ.get("FLUSH_READINGS", 1))
+    FLUSH_INTERVAL = int(os.environ.get("FLUSH_INTERVAL", 0))
+    SPILL_FOLDER = os.environ.get("SPILL_FOLDER", "spill")
+    WOT_CONNECT_TIMEOUT = float(os.environ.get("WOT_CONNECT_TIMEOUT", 5))
+    WOT_READ_TIMEOUT = float(os.environ.get("WOT_READ_TIMEOUT", 30))
+    WOT_MAX_BACKOFF = float(os.environ.get("WOT_MAX_BACKOFF", 30))
+    POD_LAYOUT = os.environ.get("POD_LAYOUT", "flat")
+    POD_MANIFEST = os.environ.get("POD_MANIFEST") or None
+
+    updater = SolidPodUpdaterMulti(
+        pod_provider=SOLID_POD_PROVIDER,
+        pod_username=USER_NAME,
+        pod_password=PASSWORD,
+        retry_time=SOLID_RETRY_TIME,
+        wot_client=WoTClient(
+            WOT_CONNECT_TIMEOUT, WOT_READ_TIMEOUT, WOT_MAX_BACKOFF, blocking=False
+        ),
+    )
+
+    # Without a list of AQMs, every thing on the WebThings Gateway is updated
+    if AQM_ENDPOINTS:
+        aqms = parse_aqm_endpoints(AQM_ENDPOINTS)
+    else:
+        aqms = updater.request_things_from_wot_interface(WOT_URL, WOT_PORT)
+
+    for aqm_name, wot_url, wot_port, thing_path in aqms:
+        updater.add_aqm(
+            pod_endpoint=POD_ENDPOINT,
+            aqm_folder=AQM_FOLDER_NAME,
+            aqm_name=aqm_name + "/",
+            polling_frequency=POLLING_TIME,
+            wot_url=wot_url,
+            wot_port=wot_port,
+            hash_time=HASH_TIME,
+            storage_mode=STORAGE_MODE,
+            # Each AQM keeps its own journal, as daily CSV files share names
+            journal_folder=os.path.join(JOURNAL_FOLDER, aqm_name),
+            flush_readings=FLUSH_READINGS,
+            flush_interval=FLUSH_INTERVAL,
+            spill_folder=SPILL_FOLDER,
+            thing_path=thing_path,
+            layout=POD_LAYOUT,
+            manifest_name=POD_MANIFEST,
+        )
+
+    print(f"Updating {len(updater.updaters)} AQMs.")
+
+    # Run the updater
+    updater.start()
@@ -1,16 +1,34 @@
 from brownie import config, Contract
+import asyncio
+import itertools
+import json
 import os
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
+from scripts.anchor_queue import AnchorQueue
 from scripts.contract_scripts import get_account, generate_hash
+from scripts.merkle import PROOF_SUFFIX, build_levels, merkle_proof
+from scripts.pod_cache import PodCache
+from scripts.pod_layout import LAYOUTS, layout_url
+from scripts.pod_manifest import PodManifest
+from scripts.reading_buffer import ReadingBuffer
+from scripts.scheduler import DeadlineScheduler
+from scripts.thing_schema import SchemaChanged, ThingSchema
+from scripts.turtle_serializer import PREFIXES, TurtleTemplate, canonical_hash
+from scripts.wot_client import WoTClient
 import dotenv
-import requests
-import urllib
-from rdflib import BNode, Graph, Literal, URIRef
-from rdflib.namespace import SOSA
 from solid.auth import Auth
 from solid.solid_api import SolidAPI
 
+ENGINES = ["scheduler", "pipeline"]
+
+# Name format and length in seconds of each window of readings stored in one file
+WINDOWS = {"hour": ("%Y-%m-%dT%H", 3600), "day": ("%Y-%m-%d", 86400)}
+
+# How readings are written to the TTL file of a window: rewriting the whole file,
+# or appending each batch with a SPARQL update
+WINDOW_WRITES = ["put", "patch"]
+
 
 class SolidPodUpdaterTTL:
     def __init__(
@@ -25,7 +43,37 @@ class SolidPodUpdaterTTL:
         wot_url,
         wot_port,
         retry_time,
+        flush_readings=1,
+        flush_interval=0,
+        spill_folder="spill",
+        wot_client=None,
+        engine="scheduler",
+        queue_depth=10,
+        window=None,
+        window_write="put",
+        anchor_batch=1,
+        anchor_interval=0,
+        layout="flat",
+        manifest_name=None,
+        manifest_interval=300,
     ):
+        if engine not in ENGINES:
+            raise ValueError(f"Engine must be one of {ENGINES}, not '{engine}'")
+
+        if window is not None and window not in WINDOWS:
+            raise ValueError(f"Window must be one of {list(WINDOWS)}, not '{window}'")
+
+        if window_write not in WINDOW_WRITES:
+            raise ValueError(
+                f"Window write must be one of {WINDOW_WRITES}, not '{window_write}'"
+            )
+
+        if window is not None and engine == "pipeline":
+            raise ValueError("Windows are only supported by the scheduler engine")
+
+        if layout not in LAYOUTS:
+            raise ValueError(f"Layout must be one of {LAYOUTS}, not '{layout}'")
+
         self.pod_provider = pod_provider
         self.pod_endpoint = pod_endpoint
         self.aqm_folder = aqm_folder
@@ -34,92 +82,167 @@ class SolidPodUpdaterTTL:
         self.wot_url = wot_url
         self.wot_port = wot_port
         self.retry_time = retry_time
+        self.wot_client = wot_client if wot_client is not None else WoTClient()
+        self.engine = engine
+        self.queue_depth = queue_depth
+        self.scheduler = DeadlineScheduler()
+        self.flush_job = None
+        self.poll_job = None
+        self.schema = None
+        self.buffer = ReadingBuffer(
+            flush_readings,
+            flush_interval,
+            os.path.join(spill_folder, f"{aqm_name.strip('/')}-ttl.jsonl"),
+        )
+        self.anchor_job = None
+        self.drain_job = None
+        # File hashes waiting to be stored in the smart contract, so uploads carry
+        # on while the blockchain is unreachable
+        self.pending_anchors = AnchorQueue(
+            os.path.join(spill_folder, f"{aqm_name.strip('/')}-ttl-anchors.jsonl")
+        )
+        # File hashes waiting to be anchored together by the root of a Merkle
+        # tree, unless every hash is stored on its own
+        if anchor_batch > 1 or anchor_interval > 0:
+            self.hash_batch = ReadingBuffer(
+                anchor_batch,
+                anchor_interval,
+                os.path.join(spill_folder, f"{aqm_name.strip('/')}-anchor.jsonl"),
+            )
+        else:
+            self.hash_batch = None
+        self.window = window
+        self.window_write = window_write
+        self.layout = layout
+        self.window_job = None
+        # Readings already stored in the file of the current window, kept so the
+        # whole file can be rewritten and finally hashed
+        self.window_buffer = ReadingBuffer(
+            0,
+            0,
+            os.path.join(spill_folder, f"{aqm_name.strip('/')}-window.jsonl"),
+        )
 
         auth = Auth()
         self.api = SolidAPI(auth)
         auth.login(pod_provider, pod_username, pod_password)
+        self.pod_cache = PodCache(self.api)
+
+        # Sealed files are listed with their sizes and hashes in a manifest in
+        # each folder, so they can be audited without downloading them all
+        self.manifest = PodManifest(self.api, manifest_name) if manifest_name else None
+        self.manifest_job = None
+        # Files sealed within an interval are written to the manifests together,
+        # as each write uploads a folder's whole manifest
+        self.manifest_interval = manifest_interval
+        self.manifest_since = None
+
+        # A flat AQM folder has a single manifest, written out whole each time a
+        # file is sealed, so it gets slower to update with every file
+        if manifest_name and layout == "flat":
+            print(
+                "Warning - The manifest of a flat AQM folder is rewritten with every "
+                "file sealed. Set POD_LAYOUT=dated to keep a manifest per day."
+            )
+
+    # Retrieves the AQM's Thing Description and caches the schema of its properties
+    def load_schema(self):
+        req = self.wot_client.get(
+            f"{self.wot_url}:{self.wot_port}/", "Thing Description"
+        )
+        self.schema = ThingSchema.from_thing_description(req.json())
 
     # Retrieves AQM properties
     def request_header_from_wot_interface(self):
+        self.load_schema()
 
-        headers = {"Content-Type": "application/json; charset=utf-8"}
-
-        while True:
-            try:
-                req = requests.get(
-                    f"{self.wot_url}:{self.wot_port}/properties",
-                    headers=headers,
-                    timeout=None,
-                )
-                break
-            except Exception:
-                print(
-                    f"Unable to get header from WoT interface. Will retry in {self.retry_time}s."
-                )
-                time.sleep(self.retry_time)
-
-        results = req.json()
-
-        # Get a header based on the keys of the response. E.g., the
-        # header may look something like o3, no2, ...
-        weather_station_header = [result for result in results]
-
-        header_as_string = ""
-        for item in weather_station_header:
-            header_as_string += f"{item},"
-
-        # Strip the trailing comma
-        header_as_string = header_as_string[:-1]
-
-        return header_as_string
+        # The header is the properties of the Thing Description, e.g. o3, no2, ...
+        return ",".join(self.schema.names)
 
     # Retrieves AQM data
     def request_data_from_wot_interface(self):
-        headers = {"Content-Type": "application/json; charset=utf-8"}
+        if self.schema is None:
+            self.load_schema()
 
-        while True:
-            try:
-                req = requests.get(
-                    f"{self.wot_url}:{self.wot_port}/properties",
-                    headers=headers,
-                    timeout=None,
-                )
-                break
-            except Exception:
-                print(
-                    f"Unable to get data from WoT interface. Will retry in {self.retry_time}s."
-                )
-                time.sleep(self.retry_time)
+        req = self.wot_client.get(f"{self.wot_url}:{self.wot_port}/properties", "data")
 
-        results = req.json()
+        # The response is decoded straight into a typed row in header order. E.g.,
+        # the data may look something like 7.21602550234155, 0.3994960553201695, ...
+        return self.schema.decode(req.json())
 
-        # Get the values of the AQM properties. E.g., the data may look something like
-        # 7.21602550234155, 0.3994960553201695, ...
-        weather_station_data = [results[result] for result in results]
+    # Generates and stores file hashes
+    def anchor_hash(self, file_hash):
+        self.pending_anchors.add(file_hash)
+        self.drain_anchors()
 
-        data_as_string = ""
-        for datum in weather_station_data:
-            data_as_string += f"{datum},"
+    # Stores the queued file hashes in the smart contract, catching up on any
+    # queued while the blockchain was unreachable
+    def drain_anchors(self):
+        self.scheduler.cancel(self.drain_job)
+        self.drain_job = None
 
-        # Strip the trailing comma
-        data_as_string = data_as_string[:-1]
+        print("File hashing started...")
+        if not self.pending_anchors.drain(self.store_hash):
+            print(f"Unable to store file hash. Will retry in {self.retry_time}s.")
+            # The pipeline retries from its anchoring stage
+            if self.engine == "scheduler":
+                self.drain_job = self.scheduler.after(
+                    self.retry_time, self.drain_anchors
+                )
+            return False
 
-        return data_as_string
+        print("File hashing complete")
+        return True
+
+    # Lists a sealed file in the manifest of its folder. Files anchored in a
+    # Merkle batch are given their root and proof once the batch is anchored
+    def record_file(self, file_url, file_hash, size):
+        if self.manifest is None:
+            return
+
+        if self.hash_batch is None:
+            self.manifest.add(file_url, file_hash, size, anchor=file_hash, proof=[])
+        else:
+            self.manifest.add(file_url, file_hash, size)
+
+        if self.manifest_since is None:
+            self.manifest_since = time.monotonic()
+
+        if self.manifest_interval <= 0:
+            self.save_manifests()
+        elif self.engine == "scheduler":
+            # The first file sealed since the manifests were written starts the
+            # timer for writing them
+            if self.manifest_job is None:
+                self.manifest_job = self.scheduler.after(
+                    self.manifest_interval, self.save_manifests
+                )
+        elif time.monotonic() - self.manifest_since >= self.manifest_interval:
+            # Without a timer, the age of the changes is checked as files are sealed
+            self.save_manifests()
+
+    # Writes the manifests of the folders whose files were sealed
+    def save_manifests(self):
+        self.scheduler.cancel(self.manifest_job)
+        self.manifest_job = None
+        self.manifest_since = None
+
+        if not self.manifest.save():
+            print(f"Unable to update manifest. Will retry in {self.retry_time}s.")
+            # The pipeline retries from its anchoring stage
+            if self.engine == "scheduler":
+                self.manifest_job = self.scheduler.after(
+                    self.retry_time, self.save_manifests
+                )
 
-    # Generates and stores file hashes
-    def hash_file(self, file):
-        print("File hashing started...")
+    # Stores a hash in the smart contract
+    def store_hash(self, file_hash):
         account = get_account()
-        file_hash = generate_hash(file)
         hash_storage = Contract(config["contract"]["address"])
         hash_storage.store_hash(file_hash, {"from": account})
-        print("File hashing complete")
 
     # Executes the Solid Pod updater
     def start(self):
-        # https://www.geeksforgeeks.org/http-headers-content-type/
-        FILE_CONTENT_TYPE = "text/rdf"
-
         header = self.request_header_from_wot_interface().split(",")
 
         base_url = self.pod_endpoint
@@ -130,76 +253,568 @@ class SolidPodUpdaterTTL:
         print(f"AQM data folder in Pod is '{aqms_folder_url}'.")
         print(f"Folder for this AQM in the Pod is '{aqm_folder_url}'.")
 
-        while True:
-            try:
-                if not self.api.item_exists(aqms_folder_url):
-                    self.api.create_folder(aqms_folder_url)
-                    print(f"Created AQM parent folder at '{aqms_folder_url}'.")
-                break
-            except Exception:
-                print(
-                    f"Unable to check if AQM parent folder exists. Will retry in {self.retry_time}s."
+        # Polling starts even if the Solid Pod is unreachable, and the readings are
+        # kept until the folders can be created
+        if self.engine == "pipeline":
+            # The pipeline creates the folders from its own loop
+            asyncio.run(self.run_pipeline(aqm_folder_url, header, aqms_folder_url))
+            return
+
+        self.create_folders(aqms_folder_url, aqm_folder_url)
+
+        # The polling tick, flushes and retries share the scheduler, which sleeps
+        # until the next of them is due
+        self.poll_job = self.scheduler.every(
+            self.polling_frequency, self.poll, aqm_folder_url, header
+        )
+
+        # Hashes queued before a restart are stored straight away
+        if len(self.pending_anchors):
+            self.drain_job = self.scheduler.after(0, self.drain_anchors)
+
+        # A batch of hashes spilled before a restart is anchored once it is due,
+        # even if no more files are stored
+        if self.hash_batch is not None and self.hash_batch.readings:
+            batch_age = (
+                datetime.now() - datetime.fromisoformat(self.hash_batch.readings[0][2])
+            ).total_seconds()
+            self.anchor_job = self.scheduler.after(
+                max(0, self.hash_batch.max_age - batch_age), self.anchor_batch
+            )
+
+        if self.window is not None:
+            # A window left open by a restart is sealed straight away
+            self.scheduler.after(0, self.close_window, aqm_folder_url)
+            self.window_job = self.scheduler.every(
+                WINDOWS[self.window][1],
+                self.close_window,
+                aqm_folder_url,
+                start=self.window_end(datetime.now()),
+            )
+
+        self.scheduler.run()
+
+    # Creates the AQM parent folder and the AQM folder, returning whether they
+    # exist
+    def create_folders(self, aqms_folder_url, aqm_folder_url):
+        try:
+            if self.pod_cache.ensure_container(aqms_folder_url):
+                print(f"Created AQM parent folder at '{aqms_folder_url}'.")
+
+            if self.pod_cache.ensure_container(aqm_folder_url):
+                print(f"Created AQM folder at '{aqm_folder_url}'.")
+        except Exception:
+            print(f"Unable to create AQM folders. Will retry in {self.retry_time}s.")
+            # The pipeline retries from its folder stage
+            if self.engine == "scheduler":
+                self.scheduler.after(
+                    self.retry_time,
+                    self.create_folders,
+                    aqms_folder_url,
+                    aqm_folder_url,
                 )
-                time.sleep(self.retry_time)
+            return False
 
-        while True:
-            try:
-                if not self.api.item_exists(aqm_folder_url):
-                    self.api.create_folder(aqm_folder_url)
-                    print(f"Created AQM folder at '{aqm_folder_url}'.")
-                break
-            except Exception:
-                print(
-                    f"Unable to check if AQM folder exists. Will retry in {self.retry_time}s."
+        return True
+
+    # Polls the AQM and buffers the new data
+    def poll(self, aqm_folder_url, header):
+        current_datetime = datetime.now()
+
+        # Retrieve new data from AQM
+        try:
+            new_aqm_data = self.request_data_from_wot_interface()
+        except SchemaChanged:
+            self.change_schema(aqm_folder_url, header)
+            return
+
+        reading = [current_datetime.isoformat(), new_aqm_data]
+        self.buffer_reading(aqm_folder_url, header, reading)
+
+    # Starts polling with a new header when the AQM's properties change, so each
+    # TTL file describes a single set of properties
+    def change_schema(self, aqm_folder_url, header):
+        print("AQM properties have changed. Starting a new file.")
+
+        # Readings already polled are stored with the old header
+        self.flush(aqm_folder_url, header)
+
+        header = self.request_header_from_wot_interface().split(",")
+        self.scheduler.cancel(self.poll_job)
+        self.poll_job = self.scheduler.every(
+            self.polling_frequency, self.poll, aqm_folder_url, header
+        )
+
+    # Buffers a reading and flushes the buffer once it is full
+    def buffer_reading(self, aqm_folder_url, header, reading):
+        self.buffer.add(reading)
+
+        if self.flush_job is None and self.buffer.max_age > 0:
+            # The first reading of a batch starts the timer for flushing it. So do
+            # readings spilled before a restart, once polling resumes
+            self.flush_job = self.scheduler.after(
+                self.buffer.max_age, self.flush, aqm_folder_url, header
+            )
+
+        if self.buffer.is_full():
+            self.flush(aqm_folder_url, header)
+
+    # Stores the buffered readings in a single TTL file
+    def flush(self, aqm_folder_url, header):
+        self.scheduler.cancel(self.flush_job)
+        self.flush_job = None
+
+        readings = list(self.buffer.readings)
+
+        if not readings:
+            return
+
+        if self.window is None:
+            flushed = self.flush_file(aqm_folder_url, header, readings)
+        else:
+            flushed = self.flush_window(aqm_folder_url, header, readings)
+
+        if not flushed:
+            # The readings stay buffered (and spilled) until they are written
+            self.flush_job = self.scheduler.after(
+                self.retry_time, self.flush, aqm_folder_url, header
+            )
+
+    # Stores readings in a new TTL file
+    def flush_file(self, aqm_folder_url, header, readings):
+        file_url, turtle_data = self.build_file(aqm_folder_url, header, readings)
+
+        if not self.upload_file(file_url, turtle_data):
+            return False
+
+        self.buffer.clear(len(readings))
+        return True
+
+    # Returns the name of the window a reading belongs to, e.g. 2022-07-08T11
+    def window_of(self, reading_datetime):
+        return reading_datetime.strftime(WINDOWS[self.window][0])
+
+    # Returns the time the window of a reading ends
+    def window_end(self, reading_datetime):
+        window_format, window_length = WINDOWS[self.window]
+        window_start = datetime.strptime(
+            self.window_of(reading_datetime), window_format
+        )
+        return window_start + timedelta(seconds=window_length)
+
+    # Adds readings to the TTL files of their windows, sealing each window that
+    # has ended
+    def flush_window(self, aqm_folder_url, header, readings):
+        for window, window_readings in itertools.groupby(
+            readings, lambda reading: self.window_of(datetime.fromisoformat(reading[0]))
+        ):
+            window_readings = [
+                [reading_datetime, header, data]
+                for reading_datetime, data in window_readings
+            ]
+
+            stored_readings = self.window_buffer.readings
+            if (
+                stored_readings
+                and self.window_of(datetime.fromisoformat(stored_readings[0][0]))
+                != window
+            ):
+                if not self.seal_window(aqm_folder_url):
+                    return False
+
+            # The readings are only stored as part of the window once the upload
+            # succeeds
+            if self.window_write == "patch":
+                file_url = layout_url(aqm_folder_url, f"{window}.ttl", self.layout)
+                template = TurtleTemplate.for_names(tuple(header))
+                update = template.insert_data(
+                    (datetime.fromisoformat(reading_datetime), data)
+                    for reading_datetime, _, data in window_readings
                 )
-                time.sleep(self.retry_time)
 
-        while True:
-            # Creates a new TTL file for the current date and time
-            current_datetime = datetime.now()
-            FILE_NAME = f"{current_datetime}.ttl"
-            file_url = aqm_folder_url + FILE_NAME
+                if not self.patch_file(file_url, update):
+                    return False
+            else:
+                file_url, turtle_data = self.build_window_file(
+                    aqm_folder_url, self.window_buffer.readings + window_readings
+                )
+
+                if not self.put_file(file_url, turtle_data):
+                    return False
+
+            for reading in window_readings:
+                self.window_buffer.add(reading)
+            self.buffer.clear(len(window_readings))
+
+        return True
+
+    # Formats the readings of a window into a single TTL file
+    def build_window_file(self, aqm_folder_url, readings):
+        window = self.window_of(datetime.fromisoformat(readings[0][0]))
+        FILE_NAME = f"{window}.ttl"
+        file_url = layout_url(aqm_folder_url, FILE_NAME, self.layout)
+
+        parts = [PREFIXES]
+
+        # Readings with different properties share the file, each described by
+        # the properties it was polled with
+        for header, header_readings in itertools.groupby(
+            readings, lambda reading: reading[1]
+        ):
+            template = TurtleTemplate.for_names(tuple(header))
+            parts.append(
+                template.observations(
+                    (datetime.fromisoformat(reading_datetime), data)
+                    for reading_datetime, _, data in header_readings
+                )
+            )
 
-            # Retrieve new data from AQM
-            new_aqm_data = self.request_data_from_wot_interface().split(",")
+        return file_url, "".join(parts).encode()
 
-            # Format the data into Turtle format
+    # Hashes the TTL file of the stored window and starts the next one
+    def seal_window(self, aqm_folder_url):
+        if not self.window_buffer.readings:
+            return True
+
+        file_url, turtle_data = self.build_window_file(
+            aqm_folder_url, self.window_buffer.readings
+        )
+
+        if self.window_write == "patch":
+            sealed = self.anchor_canonical_file(file_url, turtle_data)
+        else:
+            sealed = self.anchor_file(file_url, turtle_data)
+
+        if not sealed:
+            return False
+
+        print(f"Sealed window '{file_url}'.")
+        self.window_buffer.clear()
+        return True
+
+    # Seals the stored window once it has ended
+    def close_window(self, aqm_folder_url):
+        # Readings still buffered are written to the window before it is sealed
+        self.flush(aqm_folder_url, self.poll_job.args[1])
+
+        # If they could not be written, the window is sealed once they are
+        if self.buffer.readings or not self.window_buffer.readings:
+            return
+
+        stored_window = self.window_of(
+            datetime.fromisoformat(self.window_buffer.readings[0][0])
+        )
+
+        if stored_window != self.window_of(datetime.now()):
+            if not self.seal_window(aqm_folder_url):
+                self.scheduler.after(self.retry_time, self.close_window, aqm_folder_url)
+
+    # Formats buffered readings into a TTL file
+    def build_file(self, aqm_folder_url, header, readings):
+        readings = [
+            (datetime.fromisoformat(reading_datetime), data)
+            for reading_datetime, data in readings
+        ]
+
+        # Creates a new TTL file named after the date and time of the first reading
+        FILE_NAME = f"{readings[0][0]}.ttl"
+        file_url = layout_url(aqm_folder_url, FILE_NAME, self.layout)
+
+        # Format the data into Turtle format
+        if len(readings) == 1:
             turtle_data = self.generate_turtle_rdf(
-                current_datetime, header, new_aqm_data
+                readings[0][0], header, readings[0][1]
+            )
+        else:
+            turtle_data = self.generate_turtle_rdf_batch(readings, header)
+
+        return file_url, turtle_data
+
+    # Uploads a TTL file to the Solid Pod and hashes it
+    def upload_file(self, file_url, turtle_data):
+        return self.put_file(file_url, turtle_data) and self.anchor_file(
+            file_url, turtle_data
+        )
+
+    # Uploads a TTL file to the Solid Pod
+    def put_file(self, file_url, turtle_data):
+        # https://www.geeksforgeeks.org/http-headers-content-type/
+        FILE_CONTENT_TYPE = "text/rdf"
+
+        try:
+            self.pod_cache.put_file(file_url, turtle_data, FILE_CONTENT_TYPE)
+            print(f"Added entry at '{file_url}'.")
+        except Exception:
+            print(f"Unable to add data to Pod. Will retry in {self.retry_time}s.")
+            return False
+
+        return True
+
+    # Appends readings to a TTL file in the Solid Pod with a SPARQL update, which
+    # creates the file if it does not exist yet
+    def patch_file(self, file_url, update):
+        PATCH_CONTENT_TYPE = "application/sparql-update"
+
+        try:
+            # The dated layout partitions files into folders that may not exist yet
+            self.pod_cache.ensure_path(file_url[: file_url.rindex("/") + 1])
+            self.api.patch_file(file_url, update, PATCH_CONTENT_TYPE)
+            print(f"Appended entry at '{file_url}'.")
+        except Exception:
+            print(f"Unable to add data to Pod. Will retry in {self.retry_time}s.")
+            return False
+
+        return True
+
+    # Stores the canonical hash of a TTL file built by SPARQL updates, as the
+    # Solid server decides how the file itself is serialized
+    def anchor_canonical_file(self, file_url, turtle_data):
+        # Text/turtle keeps a replaced file open to SPARQL updates
+        FILE_CONTENT_TYPE = "text/turtle"
+
+        file_hash = canonical_hash(turtle_data, file_url)
+
+        try:
+            response = self.api.get(file_url)
+
+            # A retried update may have been applied twice, duplicating its blank
+            # nodes, so the file is replaced with the readings it should hold
+            if canonical_hash(response.content, file_url) != file_hash:
+                print(f"Replacing '{file_url}', which does not match its readings.")
+                self.pod_cache.put_file(file_url, turtle_data, FILE_CONTENT_TYPE)
+
+            if self.hash_batch is None:
+                self.anchor_hash(file_hash)
+            else:
+                self.batch_hash(file_url, file_hash)
+        except Exception:
+            print(f"Unable to store file hash. Will retry in {self.retry_time}s.")
+            return False
+
+        # The Solid server serializes the file, so its size is not known
+        self.record_file(file_url, file_hash, None)
+        return True
+
+    # Hashes a TTL file and stores the hash in the smart contract
+    def anchor_file(self, file_url, turtle_data):
+        file_hash = generate_hash(turtle_data)
+
+        try:
+            if self.hash_batch is None:
+                self.anchor_hash(file_hash)
+            else:
+                self.batch_hash(file_url, file_hash)
+        except Exception:
+            print(f"Unable to store file hash. Will retry in {self.retry_time}s.")
+            return False
+
+        self.record_file(file_url, file_hash, len(turtle_data))
+        return True
+
+    # Adds a file hash to the next Merkle batch, anchoring the batch once it is full
+    def batch_hash(self, file_url, file_hash):
+        self.hash_batch.add([file_url, file_hash, datetime.now().isoformat()])
+
+        if (
+            self.anchor_job is None
+            and self.hash_batch.max_age > 0
+            and self.engine == "scheduler"
+        ):
+            # The first hash of a batch starts the timer for anchoring it
+            self.anchor_job = self.scheduler.after(
+                self.hash_batch.max_age, self.anchor_batch
             )
 
-            while True:
-                try:
-                    self.api.put_file(file_url, turtle_data, FILE_CONTENT_TYPE)
-                    print(f"Added entry at '{file_url}'.")
-                    self.api.get(file_url)
-                    # Encode file name
-                    local_file = urllib.parse.quote(FILE_NAME)
-                    open(local_file, "wb").write(turtle_data)
-                    self.hash_file(local_file)
-                    # Delete the file locally
-                    os.remove(local_file)
-                    break
-                except Exception:
-                    print(
-                        f"Unable to add data to Pod. Will retry in {self.retry_time}s."
-                    )
-                    time.sleep(self.retry_time)
-
-            time.sleep(self.polling_frequency)
+        # Without a timer, the age of a batch is checked as each hash is added
+        batch_age = (
+            datetime.now() - datetime.fromisoformat(self.hash_batch.readings[0][2])
+        ).total_seconds()
+
+        if self.hash_batch.is_full() or (
+            self.engine == "pipeline"
+            and self.hash_batch.max_age > 0
+            and batch_age >= self.hash_batch.max_age
+        ):
+            self.anchor_batch()
+
+    # Stores the root of a Merkle tree of the batched file hashes in the smart
+    # contract, with an inclusion proof next to each file in the Solid Pod
+    def anchor_batch(self):
+        PROOF_CONTENT_TYPE = "application/json"
+
+        self.scheduler.cancel(self.anchor_job)
+        self.anchor_job = None
+
+        entries = list(self.hash_batch.readings)
+
+        if not entries:
+            return True
+
+        levels = build_levels([file_hash for _, file_hash, _ in entries])
+        root = levels[-1][0]
+
+        try:
+            # The proofs are stored before the root, so a failed batch is retried
+            # without storing its root twice
+            for index, (file_url, file_hash, _) in enumerate(entries):
+                proof = {
+                    "file_hash": file_hash,
+                    "root": root,
+                    "proof": merkle_proof(levels, index),
+                }
+                self.pod_cache.put_file(
+                    file_url + PROOF_SUFFIX,
+                    json.dumps(proof).encode(),
+                    PROOF_CONTENT_TYPE,
+                )
+
+            self.store_hash(root)
+        except Exception:
+            print(f"Unable to anchor file hashes. Will retry in {self.retry_time}s.")
+            # The pipeline retries once the next hash is added
+            if self.engine == "scheduler":
+                self.anchor_job = self.scheduler.after(
+                    self.retry_time, self.anchor_batch
+                )
+            return False
+
+        print(f"Anchored {len(entries)} file hashes with root '{root}'.")
+        self.hash_batch.clear(len(entries))
+
+        if self.manifest is not None:
+            for index, (file_url, _, _) in enumerate(entries):
+                self.manifest.add(
+                    file_url, anchor=root, proof=merkle_proof(levels, index)
+                )
+            self.save_manifests()
+
+        return True
+
+    # Runs sampling, uploads and anchoring as separate stages of a pipeline, with
+    # the folders created alongside them if their parent folder is given
+    async def run_pipeline(self, aqm_folder_url, header, aqms_folder_url=None):
+        # Bounded queues apply backpressure: once queue_depth items are waiting for
+        # a stage, the stage feeding it waits rather than buffering without limit
+        self.upload_queue = asyncio.Queue(self.queue_depth)
+        self.anchor_queue = asyncio.Queue(self.queue_depth)
+        self.queued_readings = 0
+
+        stages = [
+            self.sample_stage(aqm_folder_url, header),
+            self.upload_stage(aqm_folder_url),
+            self.anchor_stage(),
+        ]
+        if aqms_folder_url is not None:
+            stages.append(self.folder_stage(aqms_folder_url, aqm_folder_url))
+
+        await asyncio.gather(*stages)
+
+    # Creates the Solid Pod folders, retrying while the Solid Pod is unreachable
+    # without holding up the other stages
+    async def folder_stage(self, aqms_folder_url, aqm_folder_url):
+        while not await asyncio.to_thread(
+            self.create_folders, aqms_folder_url, aqm_folder_url
+        ):
+            await asyncio.sleep(self.retry_time)
+
+    # Polls the AQM on schedule and queues batches of readings for upload
+    async def sample_stage(self, aqm_folder_url, header):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+
+        while True:
+            current_datetime = datetime.now()
+
+            try:
+                new_aqm_data = await asyncio.to_thread(
+                    self.request_data_from_wot_interface
+                )
+                self.buffer.add([current_datetime.isoformat(), new_aqm_data])
+                changed = False
+            except SchemaChanged:
+                print("AQM properties have changed. Starting a new file.")
+                changed = True
+
+            # Readings spilled before a restart are queued with the first batch
+            batch = self.buffer.readings[self.queued_readings :]
+
+            if batch:
+                batch_age = (
+                    datetime.now() - datetime.fromisoformat(batch[0][0])
+                ).total_seconds()
+
+                # Without a timer, the age of a batch is checked at each poll.
+                # Readings polled before a change of properties keep the old header
+                if (
+                    changed
+                    or len(batch) >= self.buffer.max_readings
+                    or (self.buffer.max_age > 0 and batch_age >= self.buffer.max_age)
+                ):
+                    # While uploads are held up, e.g. by an outage, sampling carries
+                    # on and the readings are queued later as a larger batch. Only
+                    # a change of properties waits, so batches keep one header
+                    if changed or not self.upload_queue.full():
+                        self.queued_readings += len(batch)
+                        await self.upload_queue.put((header, batch))
+
+            if changed:
+                header = (
+                    await asyncio.to_thread(self.request_header_from_wot_interface)
+                ).split(",")
+
+            # Deadlines are based on the previous deadline, so slow polls and
+            # backpressure do not shift later readings, and missed polls are skipped
+            deadline += self.polling_frequency
+            now = loop.time()
+            if deadline <= now:
+                missed = (now - deadline) // self.polling_frequency + 1
+                deadline += missed * self.polling_frequency
+
+            await asyncio.sleep(deadline - now)
+
+    # Uploads queued batches of readings to the Solid Pod
+    async def upload_stage(self, aqm_folder_url):
+        while True:
+            header, batch = await self.upload_queue.get()
+            file_url, turtle_data = self.build_file(aqm_folder_url, header, batch)
+
+            while not await asyncio.to_thread(self.put_file, file_url, turtle_data):
+                await asyncio.sleep(self.retry_time)
+
+            # Batches are uploaded in order, so they are always at the front
+            self.buffer.clear(len(batch))
+            self.queued_readings -= len(batch)
+
+            await self.anchor_queue.put((file_url, turtle_data))
+
+    # Stores the hashes of uploaded files in the smart contract
+    async def anchor_stage(self):
+        while True:
+            try:
+                file_url, turtle_data = await asyncio.wait_for(
+                    self.anchor_queue.get(), self.retry_time
+                )
+            except asyncio.TimeoutError:
+                # Hashes and manifests left by a failure are retried once no file
+                # has arrived for a while
+                if len(self.pending_anchors):
+                    await asyncio.to_thread(self.drain_anchors)
+                if self.manifest is not None and self.manifest.changes:
+                    await asyncio.to_thread(self.save_manifests)
+                continue
+
+            while not await asyncio.to_thread(self.anchor_file, file_url, turtle_data):
+                await asyncio.sleep(self.retry_time)
 
     @staticmethod
     def generate_turtle_rdf(datetime, list_of_headers, list_of_data):
-        g = Graph()
-        aqm = URIRef("")
-        nodes = [BNode() for _ in list_of_headers]
-        g.add((aqm, SOSA.resultTime, Literal(datetime)))
-
-        for node, sensor_name, sensor_data in zip(nodes, list_of_headers, list_of_data):
-            g.add((node, SOSA.Sensor, Literal(sensor_name)))
-            g.add((node, SOSA.hasSimpleResult, Literal(sensor_data)))
+        template = TurtleTemplate.for_names(tuple(list_of_headers))
+        return template.reading(datetime, list_of_data)
 
-        return g.serialize(format="turtle")
+    @staticmethod
+    def generate_turtle_rdf_batch(readings, list_of_headers):
+        template = TurtleTemplate.for_names(tuple(list_of_headers))
+        return template.batch(readings)
 
 
 def main():
@@ -238,6 +853,21 @@ def main():
     WOT_PORT = os.environ.get("WOT_PORT")
     POLLING_TIME = int(os.environ.get("POLLING_TIME"))
     SOLID_RETRY_TIME = int(os.environ.get("SOLID_RETRY_TIME"))
+    FLUSH_READINGS = int(os.environ.get("FLUSH_READINGS", 1))
+    FLUSH_INTERVAL = int(os.environ.get("FLUSH_INTERVAL", 0))
+    SPILL_FOLDER = os.environ.get("SPILL_FOLDER", "spill")
+    WOT_CONNECT_TIMEOUT = float(os.environ.get("WOT_CONNECT_TIMEOUT", 5))
+    WOT_READ_TIMEOUT = float(os.environ.get("WOT_READ_TIMEOUT", 30))
+    WOT_MAX_BACKOFF = float(os.environ.get("WOT_MAX_BACKOFF", 30))
+    UPDATER_ENGINE = os.environ.get("UPDATER_ENGINE", "scheduler")
+    QUEUE_DEPTH = int(os.environ.get("QUEUE_DEPTH", 10))
+    TTL_WINDOW = os.environ.get("TTL_WINDOW") or None
+    TTL_WINDOW_WRITE = os.environ.get("TTL_WINDOW_WRITE", "put")
+    ANCHOR_BATCH = int(os.environ.get("ANCHOR_BATCH", 1))
+    ANCHOR_INTERVAL = int(os.environ.get("ANCHOR_INTERVAL", 0))
+    POD_LAYOUT = os.environ.get("POD_LAYOUT", "flat")
+    POD_MANIFEST = os.environ.get("POD_MANIFEST") or None
+    MANIFEST_INTERVAL = int(os.environ.get("MANIFEST_INTERVAL", 300))
 
     updater = SolidPodUpdaterTTL(
         pod_provider=SOLID_POD_PROVIDER,
@@ -250,6 +880,19 @@ def main():
         wot_url=WOT_URL,
         wot_port=WOT_PORT,
         retry_time=SOLID_RETRY_TIME,
+        flush_readings=FLUSH_READINGS,
+        flush_interval=FLUSH_INTERVAL,
+        spill_folder=SPILL_FOLDER,
+        wot_client=WoTClient(WOT_CONNECT_TIMEOUT, WOT_READ_TIMEOUT, WOT_MAX_BACKOFF),
+        engine=UPDATER_ENGINE,
+        queue_depth=QUEUE_DEPTH,
+        window=TTL_WINDOW,
+        window_write=TTL_WINDOW_WRITE,
+        anchor_batch=ANCHOR_BATCH,
+        anchor_interval=ANCHOR_INTERVAL,
+        layout=POD_LAYOUT,
+        manifest_name=POD_MANIFEST,
+        manifest_interval=MANIFEST_INTERVAL,
     )
 
     # Run the updater
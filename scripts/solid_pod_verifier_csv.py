@@ -1,7 +1,19 @@
 from brownie import config, Contract
 import os
-from scripts.contract_scripts import get_account, generate_hash
-from prettytable import PrettyTable
+from scripts.contract_scripts import get_account
+from scripts.pod_layout import LAYOUTS, list_partitions
+from scripts.pod_manifest import group_by_folder, plan_audit
+from scripts.time_index import TimeIndex, parse_bound, parse_range
+from scripts.verify_cache import VerifyCache
+from scripts.verify_pool import (
+    DEFAULT_WORKERS,
+    LOOKUP_SIZE,
+    REPORT_SIZE,
+    download_hash,
+    lookup_hashes,
+    verify_concurrently,
+)
+from scripts.verify_report import VerifyReport, open_report
 import dotenv
 from solid.auth import Auth
 from solid.solid_api import SolidAPI
@@ -9,9 +21,6 @@ import sys
 import argparse
 from datetime import datetime
 
-aqm_verification_table = PrettyTable()
-aqm_verification_table.field_names = ["File Name", "Valid Hash"]
-
 
 class SolidPodVerifierCSV:
     def __init__(
@@ -22,31 +31,147 @@ class SolidPodVerifierCSV:
         pod_endpoint,
         aqm_folder,
         aqm_name,
+        workers=DEFAULT_WORKERS,
+        lookup_size=LOOKUP_SIZE,
+        report_size=REPORT_SIZE,
+        cache_file=None,
+        force=False,
+        layout="flat",
+        manifest_name=None,
+        sample=None,
+        report_format="table",
+        report_output=None,
     ):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Layout must be one of {LAYOUTS}, not '{layout}'")
 
         self.pod_provider = pod_provider
         self.pod_endpoint = pod_endpoint
         self.aqm_folder = aqm_folder
         self.aqm_name = aqm_name
+        self.workers = workers
+        self.lookup_size = lookup_size
+        self.report_size = report_size
+        # One contract handle is shared by every file, and created on first use
+        self.hash_storage = None
+        # Files found to be anchored are only checked again once they change,
+        # unless every file is forced to be checked
+        self.cache = VerifyCache(cache_file) if cache_file else None
+        self.force = force
+        self.layout = layout
+        # Given a sample rate, files are audited with the manifests of their
+        # folders, and only a sample of them, or those the manifests do not
+        # vouch for, are downloaded
+        self.manifest_name = manifest_name
+        self.sample = sample
+        # Results are reported per run, written to the output as they come
+        # unless they are shown as a table
+        self.report_format = report_format
+        self.report_output = report_output
+        self.report = VerifyReport(report_format, report_output)
 
         auth = Auth()
         self.api = SolidAPI(auth)
         auth.login(pod_provider, pod_username, pod_password)
 
+    # Downloads and hashes a file, unless it has not changed since it was found
+    # to be anchored
+    def hash_file(self, aqm_folder_url, file):
+        file_url = aqm_folder_url + file
+        hash, headers = download_hash(self.api, file_url, self.validators(file_url))
+        return file_url, hash, headers
+
+    # Checks whether the hashes of downloaded files are stored in the smart
+    # contract, looking them up together
+    def check_hashes(self, downloads):
+        hashes = [hash for _, hash, _ in downloads if hash is not None]
+        found = iter(lookup_hashes(self.hash_storage, hashes, self.lookup_size))
+        results = []
+
+        for file_url, hash, headers in downloads:
+            # A file found to be anchored is still anchored if it has not changed
+            if hash is None:
+                self.cache.refresh(file_url)
+                results.append(True)
+                continue
+
+            is_valid_hash = next(found)
+            if self.cache is not None:
+                self.cache.store(file_url, headers, hash, is_valid_hash)
+            results.append(is_valid_hash)
+
+        return results
+
+    # Returns the headers of a conditional request for a file, or None if it has
+    # to be downloaded
+    def validators(self, file_url):
+        if self.cache is None or self.force:
+            return None
+
+        return self.cache.validators(file_url)
+
     # Verify
     def verify_file(self, aqm_folder_url, file):
-        file_url = aqm_folder_url + file
-        response = self.api.get(file_url)
-        open(file, "wb").write(response.content)
-        hash = generate_hash(file)
-        hash_storage = Contract(config["contract"]["address"])
-        is_valid_hash = hash_storage.verify_hash(hash)
-        aqm_verification_table.add_row([file, is_valid_hash])
-        # Delete the file locally
-        os.remove(file)
-
-    # Run the file verifier
-    def start(self, verification_type, date_to_verify):
+        self.verify_files(aqm_folder_url, [file])
+
+    # Verifies files concurrently a chunk at a time, reporting each chunk in order
+    # once it is verified, so only a chunk of results is held at once
+    def verify_files(self, aqm_folder_url, files):
+        if self.hash_storage is None:
+            self.hash_storage = Contract(config["contract"]["address"])
+
+        if self.sample is None:
+            self.verify_chunks(aqm_folder_url, files, {})
+            return
+
+        # Each folder's manifest and listing are read once, however many chunks
+        # its files are verified in
+        for folder_files in group_by_folder(aqm_folder_url, files).values():
+            anchors, downloads = plan_audit(
+                self.api, aqm_folder_url, folder_files, self.manifest_name, self.sample
+            )
+            print(
+                f"Audited {len(anchors)} files with their manifests. "
+                f"Downloading {len(downloads)} files."
+            )
+            self.verify_chunks(aqm_folder_url, folder_files, anchors)
+
+    # Verifies files a chunk at a time, so results are reported as each chunk is
+    # verified. Files with an anchor from their manifest are only looked up
+    def verify_chunks(self, aqm_folder_url, files, anchors):
+        for i in range(0, len(files), self.report_size):
+            self.verify_chunk(aqm_folder_url, files[i : i + self.report_size], anchors)
+
+    # Verifies a chunk of files, adding them to the report in order
+    def verify_chunk(self, aqm_folder_url, files, anchors):
+        vouched = [file for file in files if file in anchors]
+        downloads = [file for file in files if file not in anchors]
+
+        # Files vouched for by their manifests are only looked up
+        checked = dict(
+            zip(
+                vouched,
+                lookup_hashes(
+                    self.hash_storage,
+                    [anchors[file] for file in vouched],
+                    self.lookup_size,
+                ),
+            )
+        )
+        downloaded = verify_concurrently(
+            lambda file: self.hash_file(aqm_folder_url, file),
+            self.check_hashes,
+            downloads,
+            self.workers,
+        )
+        checked.update(zip(downloads, downloaded))
+        results = [checked[file] for file in files]
+
+        for file, is_valid_hash in zip(files, results):
+            self.report.add(file, is_valid_hash)
+
+    # Run the file verifier. For a range, the date to verify is its start
+    def start(self, verification_type, date_to_verify, end_to_verify=None):
         base_url = self.pod_endpoint
         aqms_folder_url = base_url + self.aqm_folder
         aqm_folder_url = aqms_folder_url + self.aqm_name
@@ -55,47 +180,70 @@ class SolidPodVerifierCSV:
         print(f"AQM data folder in Pod is '{aqms_folder_url}'.")
         print(f"Folder for this AQM in the Pod is '{aqm_folder_url}'.")
 
-        aqm_folder = self.api.read_folder(aqm_folder_url)
-        # print(aqm_folder.files)
-        all_files = list(map(lambda x: x.name, aqm_folder.files))
+        # Each run reports only the files it verifies
+        self.report = VerifyReport(self.report_format, self.report_output)
+
+        # Every file is verified unless a date or range narrows them down
+        start = end = None
+
+        # The files to verify are found from the dates they are named after, so
+        # the input is checked once before the folder is read
+        if verification_type == "single":
+
+            if date_to_verify is None:
+                print(
+                    "Error - Please enter a date (YYYY-MM-DD) to verify a single file."
+                )
+                sys.exit(1)
+
+            try:
+                datetime.strptime(date_to_verify, "%Y-%m-%d")
+            except ValueError:
+                print("Error - Date is not in the format YYYY-MM-DD")
+                sys.exit(1)
+
+            start, end = parse_bound(date_to_verify)
+
+        elif verification_type == "range":
+            start, end = parse_range(date_to_verify, end_to_verify)
+
+        if self.layout == "dated":
+            # Only the partitions holding the files to verify are read
+            all_files = list_partitions(self.api, aqm_folder_url, start, end)
+        else:
+            aqm_folder = self.api.read_folder(aqm_folder_url)
+            # print(aqm_folder.files)
+            all_files = list(map(lambda x: x.name, aqm_folder.files))
+
+        # Manifests describe the files rather than being verified themselves
+        all_files = [
+            file for file in all_files if file.rsplit("/", 1)[-1] != self.manifest_name
+        ]
         all_files.sort()
         print(f"Files in the folder: {all_files}")
 
-        table_empty = True
         table_result = None
+        files_to_verify = []
 
-        # If CSV files exist in the Solid Pod AQM folder
-        if len(all_files) > 0:
-            for file in all_files:
-                if verification_type == "single":
-
-                    if date_to_verify is None:
-                        print(
-                            "Error - Please enter a date (YYYY-MM-DD) to verify a single file."
-                        )
-                        sys.exit(1)
+        if verification_type == "all":
+            files_to_verify = all_files
+        elif verification_type in ["single", "range"]:
+            files_to_verify = TimeIndex(all_files).between(start, end)
 
-                    if date_to_verify is not None:
-                        try:
-                            datetime.strptime(date_to_verify, "%Y-%m-%d")
-                        except ValueError:
-                            print("Error - Date is not in the format YYYY-MM-DD")
-                            sys.exit(1)
+        if len(files_to_verify) > 0:
+            self.verify_files(aqm_folder_url, files_to_verify)
 
-                    if date_to_verify in file:
-                        self.verify_file(aqm_folder_url, file)
-                        table_empty = False
+        self.report.finish()
 
-                elif verification_type == "all":
-                    self.verify_file(aqm_folder_url, file)
-                    table_empty = False
-
-        print(aqm_verification_table)
-
-        if table_empty == True:
+        if len(files_to_verify) == 0:
             if verification_type == "single":
                 table_result = f"No CSV file exists for: {date_to_verify}"
                 print(table_result)
+            elif verification_type == "range":
+                table_result = (
+                    f"No CSV files exist between: {date_to_verify} and {end_to_verify}"
+                )
+                print(table_result)
             elif verification_type == "all":
                 table_result = "No CSV files exist in this AQM folder"
                 print(table_result)
@@ -103,7 +251,13 @@ class SolidPodVerifierCSV:
         return table_result
 
 
-def verify(verification_type, date_to_verify=None, time_to_verify=None):
+def verify(
+    verification_type,
+    date_to_verify=None,
+    time_to_verify=None,
+    force=False,
+    audit=False,
+):
     path = dotenv.find_dotenv()
 
     dotenv.load_dotenv(path)
@@ -135,17 +289,55 @@ def verify(verification_type, date_to_verify=None, time_to_verify=None):
     if AQM_NAME[-1] != "/":
         AQM_NAME += "/"
 
-    verifier = SolidPodVerifierCSV(
-        pod_provider=SOLID_POD_PROVIDER,
-        pod_username=USER_NAME,
-        pod_password=PASSWORD,
-        pod_endpoint=POD_ENDPOINT,
-        aqm_folder=AQM_FOLDER_NAME,
-        aqm_name=AQM_NAME,
-    )
-
-    # Run the verifier
-    verifier.start(verification_type, date_to_verify)
+    VERIFY_WORKERS = int(os.environ.get("VERIFY_WORKERS", DEFAULT_WORKERS))
+    VERIFY_LOOKUP_SIZE = int(os.environ.get("VERIFY_LOOKUP_SIZE", LOOKUP_SIZE))
+    VERIFY_REPORT_SIZE = int(os.environ.get("VERIFY_REPORT_SIZE", REPORT_SIZE))
+    VERIFY_CACHE = os.environ.get("VERIFY_CACHE", "verify_cache.db")
+    POD_LAYOUT = os.environ.get("POD_LAYOUT", "flat")
+    POD_MANIFEST = os.environ.get("POD_MANIFEST") or None
+    VERIFY_SAMPLE = float(os.environ.get("VERIFY_SAMPLE", 0.05))
+    VERIFY_FORMAT = os.environ.get("VERIFY_FORMAT", "table")
+    VERIFY_REPORT = os.environ.get("VERIFY_REPORT") or None
+
+    if audit and POD_MANIFEST is None:
+        print("Error - Please set POD_MANIFEST to audit files with their manifests.")
+        sys.exit(1)
+
+    # Results are appended to a file, or written to a named pipe, if one is given.
+    # Otherwise JSON Lines or CSV results alone go to standard output
+    with open_report(VERIFY_FORMAT, VERIFY_REPORT) as report_output:
+        verifier = SolidPodVerifierCSV(
+            pod_provider=SOLID_POD_PROVIDER,
+            pod_username=USER_NAME,
+            pod_password=PASSWORD,
+            pod_endpoint=POD_ENDPOINT,
+            aqm_folder=AQM_FOLDER_NAME,
+            aqm_name=AQM_NAME,
+            workers=VERIFY_WORKERS,
+            lookup_size=VERIFY_LOOKUP_SIZE,
+            report_size=VERIFY_REPORT_SIZE,
+            cache_file=VERIFY_CACHE,
+            force=force,
+            layout=POD_LAYOUT,
+            manifest_name=POD_MANIFEST,
+            sample=VERIFY_SAMPLE if audit else None,
+            report_format=VERIFY_FORMAT,
+            report_output=report_output,
+        )
+
+        # Run the verifier, with the end of a range given in place of a time
+        verifier.start(verification_type, date_to_verify, time_to_verify)
+
+
+# Runs the verifier, checking every file again rather than trusting the cache
+def reverify(verification_type, date_to_verify=None, time_to_verify=None):
+    verify(verification_type, date_to_verify, time_to_verify, force=True)
+
+
+# Runs the verifier, checking files with the manifests of their folders and
+# downloading only a sample of them
+def audit(verification_type, date_to_verify=None, time_to_verify=None):
+    verify(verification_type, date_to_verify, time_to_verify, audit=True)
 
 
 def main():
@@ -1,7 +1,22 @@
 from brownie import config, Contract
 import os
-from scripts.contract_scripts import get_account, generate_hash
-from prettytable import PrettyTable
+from scripts.contract_scripts import get_account
+from scripts.merkle import PROOF_SUFFIX, proof_root
+from scripts.pod_layout import LAYOUTS, list_partitions
+from scripts.pod_manifest import group_by_folder, plan_audit
+from scripts.time_index import TimeIndex, parse_bound, parse_range
+from scripts.turtle_serializer import canonical_hash
+from scripts.verify_cache import VerifyCache
+from scripts.verify_pool import (
+    DEFAULT_WORKERS,
+    LOOKUP_SIZE,
+    REPORT_SIZE,
+    download_hash,
+    lookup_hashes,
+    map_concurrently,
+    verify_concurrently,
+)
+from scripts.verify_report import VerifyReport, open_report
 import dotenv
 from solid.auth import Auth
 from solid.solid_api import SolidAPI
@@ -10,9 +25,6 @@ import urllib
 import argparse
 from datetime import datetime
 
-aqm_verification_table = PrettyTable()
-aqm_verification_table.field_names = ["File Name", "Valid Hash"]
-
 
 class SolidPodVerifierTTL:
     def __init__(
@@ -23,31 +35,243 @@ class SolidPodVerifierTTL:
         pod_endpoint,
         aqm_folder,
         aqm_name,
+        workers=DEFAULT_WORKERS,
+        lookup_size=LOOKUP_SIZE,
+        report_size=REPORT_SIZE,
+        cache_file=None,
+        force=False,
+        layout="flat",
+        manifest_name=None,
+        sample=None,
+        report_format="table",
+        report_output=None,
     ):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Layout must be one of {LAYOUTS}, not '{layout}'")
 
         self.pod_provider = pod_provider
         self.pod_endpoint = pod_endpoint
         self.aqm_folder = aqm_folder
         self.aqm_name = aqm_name
+        self.workers = workers
+        self.lookup_size = lookup_size
+        self.report_size = report_size
+        # One contract handle is shared by every file, and created on first use
+        self.hash_storage = None
+        # Files found to be anchored are only checked again once they change,
+        # unless every file is forced to be checked
+        self.cache = VerifyCache(cache_file) if cache_file else None
+        self.force = force
+        self.layout = layout
+        # Given a sample rate, files are audited with the manifests of their
+        # folders, and only a sample of them, or those the manifests do not
+        # vouch for, are downloaded
+        self.manifest_name = manifest_name
+        self.sample = sample
+        # Results are reported per run, written to the output as they come
+        # unless they are shown as a table
+        self.report_format = report_format
+        self.report_output = report_output
+        self.report = VerifyReport(report_format, report_output)
 
         auth = Auth()
         self.api = SolidAPI(auth)
         auth.login(pod_provider, pod_username, pod_password)
 
-    def verify_file(self, aqm_folder_url, file):
+    # Downloads and hashes a file, unless it has not changed since it was found
+    # to be anchored
+    def hash_file(self, aqm_folder_url, file):
         file_url = aqm_folder_url + file
-        response = self.api.get(file_url)
-        open(file, "wb").write(response.content)
-        hash = generate_hash(file)
-        hash_storage = Contract(config["contract"]["address"])
-        is_valid_hash = hash_storage.verify_hash(hash)
-        # Decode URL
-        formatted_file_name = urllib.parse.unquote(
-            file, encoding="utf-8", errors="replace"
+        hash, headers = download_hash(self.api, file_url, self.validators(file_url))
+        return file_url, hash, headers
+
+    # Checks whether the hashes of downloaded files are stored in the smart
+    # contract, looking them up together
+    def check_hashes(self, downloads):
+        hashes = [hash for _, hash, _ in downloads if hash is not None]
+        found = iter(lookup_hashes(self.hash_storage, hashes, self.lookup_size))
+        checked = [
+            (hash, True if hash is None else next(found)) for _, hash, _ in downloads
+        ]
+
+        # Files whose own hash is not stored may still be anchored another way
+        retries = [
+            i for i, (_, is_valid_hash) in enumerate(checked) if not is_valid_hash
+        ]
+        rechecked = self.check_anchors([downloads[i][:2] for i in retries])
+        for i, result in zip(retries, rechecked):
+            checked[i] = result
+
+        results = []
+        for (file_url, _, headers), (hash, is_valid_hash) in zip(downloads, checked):
+            # A file found to be anchored is still anchored if it has not changed
+            if hash is None:
+                self.cache.refresh(file_url)
+            elif self.cache is not None:
+                self.cache.store(file_url, headers, hash, is_valid_hash)
+            results.append(is_valid_hash)
+
+        return results
+
+    # Checks files whose hashes are not stored in the smart contract, returning
+    # the hash each was checked by and whether it is anchored. Proofs and files
+    # are read concurrently, and the hashes they give are looked up together
+    def check_anchors(self, files):
+        # Files anchored in a batch are checked against the root of its Merkle tree
+        proofs = map_concurrently(
+            lambda file: self.read_proof(file[0]), files, self.workers
+        )
+        proven = self.verify_proofs(
+            [(proof, hash) for proof, (_, hash) in zip(proofs, files)]
+        )
+        results = [
+            (hash, is_valid_hash) for (_, hash), is_valid_hash in zip(files, proven)
+        ]
+
+        # Windows appended with SPARQL updates are anchored by the hash of their
+        # canonical form, as the Solid server decides how they are serialized.
+        # Parsing it needs the whole file, so only these files are downloaded
+        # into memory
+        retries = [i for i, is_valid_hash in enumerate(proven) if not is_valid_hash]
+        canonicals = map_concurrently(
+            lambda i: self.read_canonical_hash(files[i][0]), retries, self.workers
+        )
+        found = self.lookup_distinct(
+            [canonical for canonical in canonicals if canonical is not None]
         )
-        aqm_verification_table.add_row([formatted_file_name, is_valid_hash])
-        # Delete file locally
-        os.remove(file)
+
+        # A window may also be part of a Merkle batch
+        batched = [
+            (i, canonical)
+            for i, canonical in zip(retries, canonicals)
+            if canonical is not None and not found[canonical]
+        ]
+        batched_proven = self.verify_proofs(
+            [(proofs[i], canonical) for i, canonical in batched]
+        )
+        found_by_proof = {
+            i: is_valid_hash for (i, _), is_valid_hash in zip(batched, batched_proven)
+        }
+
+        for i, canonical in zip(retries, canonicals):
+            if canonical is not None:
+                results[i] = (canonical, found[canonical] or found_by_proof[i])
+
+        return results
+
+    # Returns the hash of the canonical form of a TTL file, or None if it cannot
+    # be read
+    def read_canonical_hash(self, file_url):
+        try:
+            response = self.api.get(file_url)
+            return canonical_hash(response.content, file_url)
+        except Exception:
+            return None
+
+    # Looks up distinct hashes together, returning whether each is stored in the
+    # smart contract
+    def lookup_distinct(self, hashes):
+        distinct = list(dict.fromkeys(hashes))
+        if not distinct:
+            return {}
+
+        return dict(
+            zip(distinct, lookup_hashes(self.hash_storage, distinct, self.lookup_size))
+        )
+
+    # Returns the headers of a conditional request for a file, or None if it has
+    # to be downloaded
+    def validators(self, file_url):
+        if self.cache is None or self.force:
+            return None
+
+        return self.cache.validators(file_url)
+
+    def verify_file(self, aqm_folder_url, file):
+        self.verify_files(aqm_folder_url, [file])
+
+    # Verifies files concurrently a chunk at a time, reporting each chunk in order
+    # once it is verified, so only a chunk of results is held at once
+    def verify_files(self, aqm_folder_url, files):
+        if self.hash_storage is None:
+            self.hash_storage = Contract(config["contract"]["address"])
+
+        if self.sample is None:
+            self.verify_chunks(aqm_folder_url, files, {})
+            return
+
+        # Each folder's manifest and listing are read once, however many chunks
+        # its files are verified in
+        for folder_files in group_by_folder(aqm_folder_url, files).values():
+            anchors, downloads = plan_audit(
+                self.api, aqm_folder_url, folder_files, self.manifest_name, self.sample
+            )
+            print(
+                f"Audited {len(anchors)} files with their manifests. "
+                f"Downloading {len(downloads)} files."
+            )
+            self.verify_chunks(aqm_folder_url, folder_files, anchors)
+
+    # Verifies files a chunk at a time, so results are reported as each chunk is
+    # verified. Files with an anchor from their manifest are only looked up
+    def verify_chunks(self, aqm_folder_url, files, anchors):
+        for i in range(0, len(files), self.report_size):
+            self.verify_chunk(aqm_folder_url, files[i : i + self.report_size], anchors)
+
+    # Verifies a chunk of files, adding them to the report in order
+    def verify_chunk(self, aqm_folder_url, files, anchors):
+        vouched = [file for file in files if file in anchors]
+        downloads = [file for file in files if file not in anchors]
+
+        # Files vouched for by their manifests are only looked up
+        checked = dict(
+            zip(
+                vouched,
+                lookup_hashes(
+                    self.hash_storage,
+                    [anchors[file] for file in vouched],
+                    self.lookup_size,
+                ),
+            )
+        )
+        downloaded = verify_concurrently(
+            lambda file: self.hash_file(aqm_folder_url, file),
+            self.check_hashes,
+            downloads,
+            self.workers,
+        )
+        checked.update(zip(downloads, downloaded))
+        results = [checked[file] for file in files]
+
+        for file, is_valid_hash in zip(files, results):
+            # Decode URL
+            formatted_file_name = urllib.parse.unquote(
+                file, encoding="utf-8", errors="replace"
+            )
+            self.report.add(formatted_file_name, is_valid_hash)
+
+    # Reads the inclusion proof stored next to a file, or None if it has none
+    def read_proof(self, file_url):
+        try:
+            return self.api.get(file_url + PROOF_SUFFIX).json()
+        except Exception:
+            return None
+
+    # Checks file hashes against the Merkle roots anchored for their batches,
+    # using their inclusion proofs. Files of a batch share its root, which is only
+    # looked up once
+    def verify_proofs(self, proofs):
+        roots = [
+            (
+                None
+                if proof is None or proof["file_hash"] != file_hash
+                else proof_root(proof["file_hash"], proof["proof"])
+            )
+            for proof, file_hash in proofs
+        ]
+        found = self.lookup_distinct([root for root in roots if root is not None])
+
+        return [root is not None and found[root] for root in roots]
 
     # Run the verifier
     def start(self, verification_type, date_to_verify, time_to_verify):
@@ -59,76 +283,93 @@ class SolidPodVerifierTTL:
         print(f"AQM data folder in Pod is '{aqms_folder_url}'.")
         print(f"Folder for this AQM in the Pod is '{aqm_folder_url}'.")
 
-        aqm_folder = self.api.read_folder(aqm_folder_url)
-        # print(aqm_folder.files)
-        all_files = list(map(lambda x: x.name, aqm_folder.files))
+        # Each run reports only the files it verifies
+        self.report = VerifyReport(self.report_format, self.report_output)
+
+        # Every file is verified unless a date or range narrows them down
+        start = end = None
+
+        # The files to verify are found from the dates and times they are named
+        # after, so the input is checked once before the folder is read
+        if verification_type == "single":
+
+            if date_to_verify is None and time_to_verify is None:
+                print(
+                    "Error - Please enter a date (YYYY-MM-DD) and time (HH:MM:SS) to verify a single file."
+                )
+                sys.exit(1)
+
+            if date_to_verify is None:
+                print(
+                    "Error - Please enter a date (YYYY-MM-DD) to verify a single file."
+                )
+                sys.exit(1)
+
+            if time_to_verify is None:
+                print("Error - Please enter a time (HH:MM:SS) to verify a single file.")
+                sys.exit(1)
+
+            try:
+                datetime.strptime(date_to_verify, "%Y-%m-%d")
+            except ValueError:
+                print("Error - Date is not in the format YYYY-MM-DD")
+                sys.exit(1)
+
+            try:
+                datetime.strptime(time_to_verify, "%H:%M:%S")
+            except ValueError:
+                print("Error - Time is not in the format HH:MM:SS")
+                sys.exit(1)
+
+            start, end = parse_bound(f"{date_to_verify} {time_to_verify}")
+
+        # For a range, the date and time to verify are its start and end
+        elif verification_type == "range":
+            start, end = parse_range(date_to_verify, time_to_verify)
+
+        if self.layout == "dated":
+            # Only the partitions holding the files to verify are read
+            file_names = list_partitions(self.api, aqm_folder_url, start, end)
+        else:
+            aqm_folder = self.api.read_folder(aqm_folder_url)
+            # print(aqm_folder.files)
+            file_names = [file.name for file in aqm_folder.files]
+
+        # Inclusion proofs are checked along with the files they belong to, and
+        # manifests describe the files rather than being verified themselves
+        all_files = [
+            file_name
+            for file_name in file_names
+            if not file_name.endswith(PROOF_SUFFIX)
+            and file_name.rsplit("/", 1)[-1] != self.manifest_name
+        ]
         all_files.sort()
         print(f"Files in the folder: {all_files}")
 
-        table_empty = True
         table_result = None
+        files_to_verify = []
 
-        # If files exist in the Solid Pod
-        if len(all_files) > 0:
-            for file in all_files:
-                # Decode file name
-                formatted_file = urllib.parse.unquote(
-                    file, encoding="utf-8", errors="replace"
-                )
+        if verification_type == "all":
+            files_to_verify = all_files
+        elif verification_type in ["single", "range"]:
+            files_to_verify = TimeIndex(all_files).between(start, end)
 
-                if verification_type == "single":
-
-                    if date_to_verify is None and time_to_verify is None:
-                        print(
-                            "Error - Please enter a date (YYYY-MM-DD) and time (HH:MM:SS) to verify a single file."
-                        )
-                        sys.exit(1)
-
-                    if date_to_verify is None:
-                        print(
-                            "Error - Please enter a date (YYYY-MM-DD) to verify a single file."
-                        )
-                        sys.exit(1)
-
-                    if time_to_verify is None:
-                        print(
-                            "Error - Please enter a time (HH:MM:SS) to verify a single file."
-                        )
-                        sys.exit(1)
-
-                    if date_to_verify is not None:
-                        try:
-                            datetime.strptime(date_to_verify, "%Y-%m-%d")
-                        except ValueError:
-                            print("Error - Date is not in the format YYYY-MM-DD")
-                            sys.exit(1)
-
-                    if time_to_verify is not None:
-                        try:
-                            datetime.strptime(time_to_verify, "%H:%M:%S")
-                        except ValueError:
-                            print("Error - Time is not in the format HH:MM:SS")
-                            sys.exit(1)
-
-                    # Encode time
-                    formatted_time_to_verify = urllib.parse.quote(time_to_verify)
-
-                    if date_to_verify in file and formatted_time_to_verify in file:
-                        self.verify_file(aqm_folder_url, file)
-                        table_empty = False
-
-                elif verification_type == "all":
-                    self.verify_file(aqm_folder_url, file)
-                    table_empty = False
-
-        print(aqm_verification_table)
-
-        if table_empty == True:
+        if len(files_to_verify) > 0:
+            self.verify_files(aqm_folder_url, files_to_verify)
+
+        self.report.finish()
+
+        if len(files_to_verify) == 0:
             if verification_type == "single":
                 table_result = (
                     f"No TTL files exist for: {date_to_verify} {time_to_verify}"
                 )
                 print(table_result)
+            elif verification_type == "range":
+                table_result = (
+                    f"No TTL files exist between: {date_to_verify} and {time_to_verify}"
+                )
+                print(table_result)
             elif verification_type == "all":
                 table_result = "No TTL files exist in this AQM folder"
                 print(table_result)
@@ -136,7 +377,13 @@ class SolidPodVerifierTTL:
         return table_result
 
 
-def verify(verification_type, date_to_verify=None, time_to_verify=None):
+def verify(
+    verification_type,
+    date_to_verify=None,
+    time_to_verify=None,
+    force=False,
+    audit=False,
+):
     path = dotenv.find_dotenv()
 
     dotenv.load_dotenv(path)
@@ -168,17 +415,55 @@ def verify(verification_type, date_to_verify=None, time_to_verify=None):
     if AQM_NAME[-1] != "/":
         AQM_NAME += "/"
 
-    verifier = SolidPodVerifierTTL(
-        pod_provider=SOLID_POD_PROVIDER,
-        pod_username=USER_NAME,
-        pod_password=PASSWORD,
-        pod_endpoint=POD_ENDPOINT,
-        aqm_folder=AQM_FOLDER_NAME,
-        aqm_name=AQM_NAME,
-    )
+    VERIFY_WORKERS = int(os.environ.get("VERIFY_WORKERS", DEFAULT_WORKERS))
+    VERIFY_LOOKUP_SIZE = int(os.environ.get("VERIFY_LOOKUP_SIZE", LOOKUP_SIZE))
+    VERIFY_REPORT_SIZE = int(os.environ.get("VERIFY_REPORT_SIZE", REPORT_SIZE))
+    VERIFY_CACHE = os.environ.get("VERIFY_CACHE", "verify_cache.db")
+    POD_LAYOUT = os.environ.get("POD_LAYOUT", "flat")
+    POD_MANIFEST = os.environ.get("POD_MANIFEST") or None
+    VERIFY_SAMPLE = float(os.environ.get("VERIFY_SAMPLE", 0.05))
+    VERIFY_FORMAT = os.environ.get("VERIFY_FORMAT", "table")
+    VERIFY_REPORT = os.environ.get("VERIFY_REPORT") or None
+
+    if audit and POD_MANIFEST is None:
+        print("Error - Please set POD_MANIFEST to audit files with their manifests.")
+        sys.exit(1)
+
+    # Results are appended to a file, or written to a named pipe, if one is given.
+    # Otherwise JSON Lines or CSV results alone go to standard output
+    with open_report(VERIFY_FORMAT, VERIFY_REPORT) as report_output:
+        verifier = SolidPodVerifierTTL(
+            pod_provider=SOLID_POD_PROVIDER,
+            pod_username=USER_NAME,
+            pod_password=PASSWORD,
+            pod_endpoint=POD_ENDPOINT,
+            aqm_folder=AQM_FOLDER_NAME,
+            aqm_name=AQM_NAME,
+            workers=VERIFY_WORKERS,
+            lookup_size=VERIFY_LOOKUP_SIZE,
+            report_size=VERIFY_REPORT_SIZE,
+            cache_file=VERIFY_CACHE,
+            force=force,
+            layout=POD_LAYOUT,
+            manifest_name=POD_MANIFEST,
+            sample=VERIFY_SAMPLE if audit else None,
+            report_format=VERIFY_FORMAT,
+            report_output=report_output,
+        )
 
-    # Run the verifier
-    verifier.start(verification_type, date_to_verify, time_to_verify)
+        # Run the verifier
+        verifier.start(verification_type, date_to_verify, time_to_verify)
+
+
+# Runs the verifier, checking every file again rather than trusting the cache
+def reverify(verification_type, date_to_verify=None, time_to_verify=None):
+    verify(verification_type, date_to_verify, time_to_verify, force=True)
+
+
+# Runs the verifier, checking files with the manifests of their folders and
+# downloading only a sample of them
+def audit(verification_type, date_to_verify=None, time_to_verify=None):
+    verify(verification_type, date_to_verify, time_to_verify, audit=True)
 
 
 def main():
@@ -0,0 +1,56 @@
+# Python types that the JSON types of Thing properties are decoded to
+PROPERTY_TYPES = {"number": float, "integer": int, "boolean": bool, "string": str}
+
+# Characters that must be quoted in a CSV field
+CSV_SPECIAL_CHARACTERS = set(',"\r\n')
+
+
+# Raised when a reading's properties no longer match the Thing Description
+class SchemaChanged(Exception):
+    pass
+
+
+class ThingSchema:
+    def __init__(self, properties):
+        # Properties keep the order of the Thing Description, which fixes the
+        # column order of every row
+        self.names = list(properties)
+        self.name_set = set(self.names)
+        self.types = [
+            PROPERTY_TYPES.get(properties[name].get("type"), str) for name in self.names
+        ]
+
+    # Builds the schema from a Thing Description
+    @classmethod
+    def from_thing_description(cls, thing_description):
+        return cls(thing_description.get("properties", {}))
+
+    # Decodes a /properties response into a typed row in schema order
+    def decode(self, properties):
+        if properties.keys() != self.name_set:
+            raise SchemaChanged(
+                f"Expected properties {self.names}, got {list(properties)}"
+            )
+
+        return [
+            None if properties[name] is None else cast(properties[name])
+            for name, cast in zip(self.names, self.types)
+        ]
+
+
+# Encodes a single CSV field, quoting it only if needed
+def encode_csv_field(value):
+    if value is None:
+        return ""
+
+    field = str(value)
+
+    if CSV_SPECIAL_CHARACTERS.intersection(field):
+        return '"' + field.replace('"', '""') + '"'
+
+    return field
+
+
+# Encodes a row of values as a line of CSV
+def encode_csv_row(row):
+    return ",".join(encode_csv_field(value) for value in row)
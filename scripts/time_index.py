@@ -0,0 +1,90 @@
+import bisect
+import re
+import sys
+import urllib
+from datetime import datetime, timedelta
+
+# Date and time a file is named after, e.g. 2022-07-08.csv, 2022-07-08T11.ttl or
+# 2022-07-08 11:19:47.ttl
+NAME_TIME = re.compile(r"(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2})(?::(\d{2}):(\d{2}))?)?")
+
+# Formats accepted for the start and end of a range, with the time each covers
+BOUND_FORMATS = [
+    ("%Y-%m-%d", timedelta(days=1)),
+    ("%Y-%m-%dT%H", timedelta(hours=1)),
+    ("%Y-%m-%d %H:%M:%S", timedelta(seconds=1)),
+    ("%Y-%m-%dT%H:%M:%S", timedelta(seconds=1)),
+]
+
+
+# Returns the date and time a file is named after, or None if it is not named
+# after one. Only the last part of a path, e.g. 2022/07/08/2022-07-08.csv, is
+# the file name
+def name_time(name):
+    match = NAME_TIME.match(urllib.parse.unquote(name.rstrip("/").rsplit("/", 1)[-1]))
+    if match is None:
+        return None
+
+    try:
+        return datetime(*(int(part or 0) for part in match.groups()))
+    except ValueError:
+        return None
+
+
+# Parses a date (YYYY-MM-DD), hour (YYYY-MM-DDTHH) or time (YYYY-MM-DD HH:MM:SS),
+# returning when it starts and when the next one starts
+def parse_bound(text):
+    for bound_format, span in BOUND_FORMATS:
+        try:
+            start = datetime.strptime(text, bound_format)
+        except ValueError:
+            continue
+
+        return start, start + span
+
+    raise ValueError(f"'{text}' is not a date or time")
+
+
+# Parses the start and end of a range given on the command line, returning when
+# it starts and when it ends. The range includes the whole of its end, so
+# 2022-07-01 to 2022-07-31 covers all of July. Exits if either is missing or
+# not a date or time
+def parse_range(start_text, end_text):
+    if start_text is None or end_text is None:
+        print(
+            "Error - Please enter a start and end (YYYY-MM-DD, YYYY-MM-DDTHH or YYYY-MM-DDTHH:MM:SS) to verify a range of files."
+        )
+        sys.exit(1)
+
+    try:
+        start, _ = parse_bound(start_text)
+        _, end = parse_bound(end_text)
+    except ValueError:
+        print(
+            "Error - Range is not in the format YYYY-MM-DD, YYYY-MM-DDTHH or YYYY-MM-DDTHH:MM:SS"
+        )
+        sys.exit(1)
+
+    return start, end
+
+
+class TimeIndex:
+    def __init__(self, names):
+        # The folder listing is parsed once, so each search is a binary search
+        # rather than a scan of every file name
+        entries = []
+        for name in names:
+            time = name_time(name)
+            if time is not None:
+                entries.append((time, name))
+
+        entries.sort()
+        self.times = [time for time, _ in entries]
+        self.names = [name for _, name in entries]
+
+    # Returns the files named after a time from start up to, but not including,
+    # end
+    def between(self, start, end):
+        return self.names[
+            bisect.bisect_left(self.times, start) : bisect.bisect_left(self.times, end)
+        ]
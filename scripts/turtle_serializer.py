@@ -0,0 +1,139 @@
+import hashlib
+import math
+from datetime import datetime
+from functools import lru_cache
+from rdflib import Graph, URIRef
+from rdflib.compare import to_canonical_graph
+from rdflib.namespace import SOSA
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+
+# Characters escaped in a Turtle string literal
+STRING_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r"})
+
+# Prefixes declared at the start of every TTL file
+PREFIXES = f"@prefix sosa: <{SOSA}> .\n@prefix xsd: <{XSD}> .\n\n"
+
+# The same prefixes, declared in a SPARQL update
+SPARQL_PREFIXES = f"PREFIX sosa: <{SOSA}>\nPREFIX xsd: <{XSD}>\n"
+
+# Doubles without a Turtle shorthand
+SPECIAL_DOUBLES = {math.inf: "INF", -math.inf: "-INF"}
+
+
+# Encodes a value as a Turtle literal with the same datatype rdflib would give it
+def encode_literal(value):
+    # Booleans are checked first, as they are also integers
+    if isinstance(value, bool):
+        return "true" if value else "false"
+
+    if isinstance(value, int):
+        return str(value)
+
+    if isinstance(value, float):
+        if math.isnan(value):
+            return '"NaN"^^xsd:double'
+
+        if value in SPECIAL_DOUBLES:
+            return f'"{SPECIAL_DOUBLES[value]}"^^xsd:double'
+
+        # repr keeps every digit of the reading, and a Turtle double needs an
+        # exponent
+        number = repr(value)
+        return number if "e" in number else f"{number}e0"
+
+    if isinstance(value, datetime):
+        return f'"{value.isoformat()}"^^xsd:dateTime'
+
+    return '"' + str(value).translate(STRING_ESCAPES) + '"'
+
+
+class TurtleTemplate:
+    def __init__(self, names):
+        self.names = list(names)
+
+        # Everything but the results is fixed by the properties, so it is encoded
+        # once rather than for every reading
+        self.sensors = [
+            f"[] sosa:Sensor {encode_literal(name)} ;\n    sosa:hasSimpleResult "
+            for name in self.names
+        ]
+        self.results = [
+            f"[ sosa:Sensor {encode_literal(name)} ; sosa:hasSimpleResult "
+            for name in self.names
+        ]
+
+    # Returns the template for a list of properties, compiling it only once
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def for_names(names):
+        return TurtleTemplate(names)
+
+    # Formats a single reading, describing the file itself
+    def reading(self, reading_datetime, data):
+        parts = [
+            PREFIXES,
+            f"<> sosa:resultTime {encode_literal(reading_datetime)} .\n\n",
+        ]
+
+        for sensor, value in zip(self.sensors, data):
+            parts.append(f"{sensor}{encode_literal(value)} .\n\n")
+
+        return "".join(parts).encode()
+
+    # Formats several readings, each as an observation identified by its date and
+    # time
+    def batch(self, readings):
+        return (PREFIXES + self.observations(readings)).encode()
+
+    # Formats several readings as a SPARQL update appending them to a file
+    def insert_data(self, readings):
+        return (
+            f"{SPARQL_PREFIXES}INSERT DATA {{\n{self.observations(readings)}}}\n"
+        ).encode()
+
+    # Formats several readings as observations, without the prefixes, so readings
+    # with different properties can share a file
+    def observations(self, readings):
+        parts = []
+
+        for reading_datetime, data in readings:
+            parts.append(
+                f"<#{reading_datetime.isoformat()}> a sosa:Observation ;\n"
+                f"    sosa:resultTime {encode_literal(reading_datetime)}"
+            )
+
+            results = [
+                f"{result}{encode_literal(value)} ]"
+                for result, value in zip(self.results, data)
+            ]
+            if results:
+                parts.append(" ;\n    sosa:hasResult " + ",\n        ".join(results))
+
+            parts.append(" .\n\n")
+
+        return "".join(parts)
+
+
+# Returns the SHA-256 hash of the canonical form of a TTL file's triples, which
+# does not depend on how the Solid server serializes them, nor on where the file
+# is stored
+def canonical_hash(turtle_data, file_url):
+    graph = Graph().parse(data=turtle_data, format="turtle", publicID=file_url)
+
+    # IRIs within the file are hashed relative to it, e.g. <#2022-07-08T11:19:47>,
+    # so the hash still holds once the file is moved. rdflib leaves fragments
+    # containing a colon unresolved, so they are relative already
+    def relative(term):
+        if isinstance(term, URIRef) and (
+            term == file_url or term.startswith(file_url + "#")
+        ):
+            return URIRef(term[len(file_url) :])
+        return term
+
+    lines = sorted(
+        " ".join(relative(term).n3() for term in triple) + " .\n"
+        for triple in to_canonical_graph(graph)
+    )
+
+    return hashlib.sha256("".join(lines).encode()).hexdigest()
@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+from datetime import datetime
+
+
+class VerifyCache:
+    def __init__(self, cache_file):
+        # Every worker shares the connection, so it is used by one at a time
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_file, check_same_thread=False)
+
+        # A lost result only means the file is checked again, so results are not
+        # forced to disk one by one
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS files (url TEXT PRIMARY KEY, "
+                "etag TEXT, last_modified TEXT, file_hash TEXT, valid INTEGER, "
+                "verified_at TEXT)"
+            )
+
+    # Returns the headers of a conditional request for a file found to be anchored,
+    # or None if the file has to be checked again
+    def validators(self, url):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT etag, last_modified FROM files WHERE url = ? AND valid = 1",
+                (url,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        etag, last_modified = row
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        return headers or None
+
+    # Records the result of checking a file, with the validators of the response
+    # it was hashed from
+    def store(self, url, response_headers, file_hash, valid):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    response_headers.get("ETag"),
+                    response_headers.get("Last-Modified"),
+                    file_hash,
+                    int(valid),
+                    datetime.now().isoformat(),
+                ),
+            )
+
+    # Records that a file was found unchanged since it was last checked
+    def refresh(self, url):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE files SET verified_at = ? WHERE url = ?",
+                (datetime.now().isoformat(), url),
+            )
+
+    # Closes the cache file
+    def close(self):
+        self.connection.close()
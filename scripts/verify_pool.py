@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from scripts.contract_scripts import HASH_CHUNK_SIZE, generate_hash
+from scripts.rpc_batch import batch_call, rpc_endpoint, rpc_request_kwargs
+
+# Number of files verified at once by default. Workers spend most of their time
+# waiting for the Solid Pod or the blockchain, so there can be more than CPUs
+DEFAULT_WORKERS = 8
+
+# Status code of a conditional request for a file that has not changed
+NOT_MODIFIED = 304
+
+
+# Number of hashes looked up in a single call to the smart contract. Each hash
+# costs a storage read, so this keeps calls well within the gas limit nodes put
+# on eth_call
+LOOKUP_SIZE = 1000
+
+# Number of files verified and reported at a time. Results are written out as
+# each of these chunks is verified, so they keep coming well before a whole
+# lookup's worth of files has been verified
+REPORT_SIZE = 100
+
+
+# Runs a function on each item with a bounded pool of workers. Results are
+# returned in the order of the items, whatever order they finish in
+def map_concurrently(func, items, workers=DEFAULT_WORKERS):
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(func, items))
+
+
+# Verifies files by downloading and hashing them with a pool of workers, then
+# checking all of their hashes at once, and reports the throughput
+def verify_concurrently(hash_file, check_hashes, files, workers=DEFAULT_WORKERS):
+    start = time.perf_counter()
+
+    results = check_hashes(map_concurrently(hash_file, files, workers))
+
+    elapsed = time.perf_counter() - start
+    if files:
+        print(
+            f"Verified {len(files)} files in {elapsed:.2f}s "
+            f"({len(files) / max(elapsed, 1e-6):.1f} files/s)."
+        )
+
+    return results
+
+
+# Checks whether hashes are stored in the smart contract, looking up a chunk of
+# them per call. Contracts deployed before verify_hashes was added are checked a
+# hash at a time, with the calls sent together in JSON-RPC batch requests where
+# the node allows
+def lookup_hashes(hash_storage, hashes, lookup_size=LOOKUP_SIZE):
+    if not hasattr(hash_storage, "verify_hashes"):
+        endpoint = rpc_endpoint()
+
+        if endpoint is not None:
+            try:
+                return batch_call(
+                    endpoint,
+                    hash_storage.verify_hash,
+                    [(hash,) for hash in hashes],
+                    request_kwargs=rpc_request_kwargs(),
+                )
+            except Exception:
+                print("Unable to batch calls to the smart contract.")
+
+        return [hash_storage.verify_hash(hash) for hash in hashes]
+
+    results = []
+    for i in range(0, len(hashes), lookup_size):
+        results.extend(hash_storage.verify_hashes(hashes[i : i + lookup_size]))
+
+    return results
+
+
+# Hashes a file in the Solid Pod as it is downloaded, so each download only holds
+# a single chunk in memory whatever the size of the file. Returns the hash and the
+# response headers, or no hash if a conditional request found the file unchanged
+def download_hash(api, file_url, headers=None):
+    with api.auth.client.stream("GET", file_url, headers=headers) as response:
+        if response.status_code == NOT_MODIFIED:
+            return None, response.headers
+
+        response.raise_for_status()
+        return generate_hash(response.iter_bytes(HASH_CHUNK_SIZE)), response.headers
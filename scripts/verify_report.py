@@ -0,0 +1,106 @@
+import contextlib
+import csv
+import json
+import sys
+import time
+from prettytable import PrettyTable
+
+# Formats of the verifier results: a table printed once every file is verified,
+# or a line per file written as soon as it is verified, as JSON or CSV
+REPORT_FORMATS = ["table", "jsonl", "csv"]
+
+
+class VerifyReport:
+    def __init__(self, report_format="table", output=None):
+        if report_format not in REPORT_FORMATS:
+            raise ValueError(
+                f"Report format must be one of {REPORT_FORMATS}, not '{report_format}'"
+            )
+
+        self.report_format = report_format
+        self.output = output if output is not None else sys.stdout
+        self.files = 0
+        self.valid = 0
+        self.start = time.perf_counter()
+
+        # Only a table holds the results, as it is printed once they are all in
+        if report_format == "table":
+            self.table = PrettyTable()
+            self.table.field_names = ["File Name", "Valid Hash"]
+        elif report_format == "csv":
+            self.writer = csv.writer(self.output, lineterminator="\n")
+            self.writer.writerow(["file", "valid"])
+            self.output.flush()
+
+    # Adds the result of a file, writing it out straight away unless results are
+    # shown as a table
+    def add(self, file, is_valid_hash):
+        self.files += 1
+        self.valid += bool(is_valid_hash)
+
+        if self.report_format == "table":
+            self.table.add_row([file, is_valid_hash])
+            return
+
+        if self.report_format == "jsonl":
+            self.output.write(json.dumps({"file": file, "valid": is_valid_hash}) + "\n")
+        else:
+            self.writer.writerow([file, is_valid_hash])
+
+        # Results are flushed as they come, so they can be followed while the
+        # verifier runs
+        self.output.flush()
+
+    # Returns the counts of the files verified so far, and how fast they were
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+
+        return {
+            "files": self.files,
+            "valid": self.valid,
+            "invalid": self.files - self.valid,
+            "elapsed": round(elapsed, 3),
+            "files_per_second": round(self.files / max(elapsed, 1e-6), 1),
+        }
+
+    # Writes out the table, if any, and the summary of the verification
+    def finish(self):
+        summary = self.summary()
+
+        if self.report_format == "table":
+            print(self.table, file=self.output)
+        elif self.report_format == "jsonl":
+            self.output.write(json.dumps({"summary": summary}) + "\n")
+            self.output.flush()
+        else:
+            # The summary follows the results as a row of its own, its fields
+            # given as name=value so it cannot be mistaken for a file
+            self.writer.writerow(
+                ["summary"] + [f"{name}={value}" for name, value in summary.items()]
+            )
+            self.output.flush()
+
+        print(
+            f"Verified {summary['files']} files: {summary['valid']} valid, "
+            f"{summary['invalid']} invalid in {summary['elapsed']:.2f}s "
+            f"({summary['files_per_second']:.1f} files/s)."
+        )
+
+        return summary
+
+
+# Opens where the results of a run are written: a file they are appended to, or
+# standard output. Results written to standard output in JSON Lines or CSV are
+# kept apart from the verifier's messages, which go to standard error instead, so
+# they can be piped straight into other tools
+@contextlib.contextmanager
+def open_report(report_format, report_file=None):
+    if report_file:
+        with open(report_file, "a") as output:
+            yield output
+    elif report_format == "table":
+        yield sys.stdout
+    else:
+        output = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            yield output
@@ -0,0 +1,114 @@
+import random
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Raised when a device does not respond and the client does not wait for it
+class WoTUnavailable(Exception):
+    pass
+
+
+class LatencyStats:
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.total = 0.0
+        self.max = 0.0
+        # Consecutive requests given up on, and when the device is next tried
+        self.skips = 0
+        self.retry_at = 0.0
+
+    # Records the latency (seconds) of a successful request
+    def record(self, latency):
+        self.requests += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    # Returns the mean latency (seconds) of successful requests
+    def mean(self):
+        return self.total / self.requests if self.requests else 0.0
+
+
+class WoTClient:
+    def __init__(
+        self,
+        connect_timeout=5,
+        read_timeout=30,
+        max_backoff=30,
+        pool_size=10,
+        blocking=True,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_backoff = max_backoff
+        # A blocking client waits for a device to respond, whereas a non-blocking
+        # one gives up after a single attempt, so devices sharing a scheduler are
+        # not held up by one that is down
+        self.blocking = blocking
+        self.stats = {}
+
+        # Connections to each device are kept alive and reused between polls
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # Returns the delay (seconds) before a retry, doubling with each failed attempt
+    def backoff(self, attempt):
+        # Full jitter stops many AQMs that failed together from retrying together
+        return random.uniform(0, min(self.max_backoff, 2**attempt))
+
+    # Retrieves a WoT resource, retrying with back-off until it responds. Unless
+    # blocking, a failed request raises WoTUnavailable instead, and the device is
+    # skipped without a request until its back-off has passed
+    def get(self, url, description, blocking=None):
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        stats = self.stats.setdefault(url, LatencyStats())
+        attempt = 0
+
+        if blocking is None:
+            blocking = self.blocking
+
+        if not blocking and time.monotonic() < stats.retry_at:
+            raise WoTUnavailable(f"Skipped {description} from {url}")
+
+        while True:
+            start = time.perf_counter()
+            try:
+                req = self.session.get(
+                    url,
+                    headers=headers,
+                    timeout=(self.connect_timeout, self.read_timeout),
+                )
+                break
+            except Exception:
+                stats.failures += 1
+
+                if not blocking:
+                    delay = self.backoff(stats.skips)
+                    stats.skips += 1
+                    stats.retry_at = time.monotonic() + delay
+                    print(
+                        f"Unable to get {description} from WoT interface. Will retry in {delay:.1f}s."
+                    )
+                    raise WoTUnavailable(f"Unable to get {description} from {url}")
+
+                delay = self.backoff(attempt)
+                attempt += 1
+                print(
+                    f"Unable to get {description} from WoT interface. Will retry in {delay:.1f}s."
+                )
+                time.sleep(delay)
+
+        stats.record(time.perf_counter() - start)
+        stats.skips = 0
+        return req
+
+    # Summarises the latency of each device
+    def summary(self):
+        return "\n".join(
+            f"{url}: {stats.requests} requests, {stats.failures} failures, "
+            f"mean {stats.mean() * 1000:.1f}ms, max {stats.max * 1000:.1f}ms"
+            for url, stats in self.stats.items()
+        )
@@ -3,10 +3,10 @@ import os
 import time
 from datetime import datetime
 from scripts.contract_scripts import get_account, generate_hash
+from scripts.wot_client import WoTClient
 import numpy as np
 
 import dotenv
-import requests
 from solid.auth import Auth
 from solid.solid_api import SolidAPI
 from timeit import default_timer as timer
@@ -35,6 +35,7 @@ class SolidPodUpdaterCSV:
         self.wot_url = wot_url
         self.wot_port = wot_port
         self.retry_time = retry_time
+        self.wot_client = WoTClient()
         self.hash_time = hash_time
 
         auth = Auth()
@@ -43,21 +44,9 @@ class SolidPodUpdaterCSV:
 
     # Retrieve AQM properties
     def request_header_from_wot_interface(self):
-        headers = {"Content-Type": "application/json; charset=utf-8"}
-
-        while True:
-            try:
-                req = requests.get(
-                    f"{self.wot_url}:{self.wot_port}/properties",
-                    headers=headers,
-                    timeout=None,
-                )
-                break
-            except Exception:
-                print(
-                    f"Unable to get header from WoT interface. Will retry in {self.retry_time}s."
-                )
-                time.sleep(self.retry_time)
+        req = self.wot_client.get(
+            f"{self.wot_url}:{self.wot_port}/properties", "header"
+        )
 
         results = req.json()
 
@@ -76,21 +65,7 @@ class SolidPodUpdaterCSV:
 
     # Retrieves AQM data
     def request_data_from_wot_interface(self):
-        headers = {"Content-Type": "application/json; charset=utf-8"}
-
-        while True:
-            try:
-                req = requests.get(
-                    f"{self.wot_url}:{self.wot_port}/properties",
-                    headers=headers,
-                    timeout=None,
-                )
-                break
-            except Exception:
-                print(
-                    f"Unable to get data from WoT interface. Will retry in {self.retry_time}s."
-                )
-                time.sleep(self.retry_time)
+        req = self.wot_client.get(f"{self.wot_url}:{self.wot_port}/properties", "data")
 
         results = req.json()
 
@@ -278,3 +253,4 @@ def test_performance():
     performance_log = updater.start(performance_log)
     print(performance_log)
     print(f"Average time for one cycle: {np.mean(performance_log)}")
+    print(updater.wot_client.summary())
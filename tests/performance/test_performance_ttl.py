@@ -3,10 +3,10 @@ import os
 import time
 from datetime import datetime
 from scripts.contract_scripts import get_account, generate_hash
+from scripts.wot_client import WoTClient
 import numpy as np
 
 import dotenv
-import requests
 import urllib
 from rdflib import BNode, Graph, Literal, URIRef
 from rdflib.namespace import SOSA
@@ -37,6 +37,7 @@ class SolidPodUpdaterTTL:
         self.wot_url = wot_url
         self.wot_port = wot_port
         self.retry_time = retry_time
+        self.wot_client = WoTClient()
 
         auth = Auth()
         self.api = SolidAPI(auth)
@@ -44,21 +45,9 @@ class SolidPodUpdaterTTL:
 
     # Retrieves AQM properties
     def request_header_from_wot_interface(self):
-        headers = {"Content-Type": "application/json; charset=utf-8"}
-
-        while True:
-            try:
-                req = requests.get(
-                    f"{self.wot_url}:{self.wot_port}/properties",
-                    headers=headers,
-                    timeout=None,
-                )
-                break
-            except Exception:
-                print(
-                    f"Unable to get header from WoT interface. Will retry in {self.retry_time}s."
-                )
-                time.sleep(self.retry_time)
+        req = self.wot_client.get(
+            f"{self.wot_url}:{self.wot_port}/properties", "header"
+        )
 
         results = req.json()
 
@@ -77,21 +66,7 @@ class SolidPodUpdaterTTL:
 
     # Retrieves AQM data
     def request_data_from_wot_interface(self):
-        headers = {"Content-Type": "application/json; charset=utf-8"}
-
-        while True:
-            try:
-                req = requests.get(
-                    f"{self.wot_url}:{self.wot_port}/properties",
-                    headers=headers,
-                    timeout=None,
-                )
-                break
-            except Exception:
-                print(
-                    f"Unable to get data from WoT interface. Will retry in {self.retry_time}s."
-                )
-                time.sleep(self.retry_time)
+        req = self.wot_client.get(f"{self.wot_url}:{self.wot_port}/properties", "data")
 
         results = req.json()
 
@@ -276,3 +251,4 @@ def test_performance():
     performance_log = updater.start(performance_log)
     print(performance_log)
     print(f"Average time for one cycle: {np.mean(performance_log)}")
+    print(updater.wot_client.summary())
@@ -0,0 +1,84 @@
+from datetime import datetime
+from scripts.turtle_serializer import TurtleTemplate
+import tracemalloc
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import SOSA
+from timeit import repeat
+
+HEADERS = [
+    "o3",
+    "no2",
+    "pm25",
+    "pm10",
+    "humidity",
+    "temperature",
+    "latitude",
+    "longitude",
+]
+
+DATA = [
+    7.21602550234155,
+    0.3994960553201695,
+    12.5,
+    20.25,
+    55.0,
+    18.4,
+    51.5072,
+    -0.1276,
+]
+
+
+# The rdflib serializer the template replaced
+def generate_turtle_rdf(datetime, list_of_headers, list_of_data):
+    g = Graph()
+    aqm = URIRef("")
+    nodes = [BNode() for _ in list_of_headers]
+    g.add((aqm, SOSA.resultTime, Literal(datetime)))
+
+    for node, sensor_name, sensor_data in zip(nodes, list_of_headers, list_of_data):
+        g.add((node, SOSA.Sensor, Literal(sensor_name)))
+        g.add((node, SOSA.hasSimpleResult, Literal(sensor_data)))
+
+    return g.serialize(format="turtle")
+
+
+# Times a serializer over many readings, returning the time per reading in seconds
+def time_per_reading(serialize, number=200):
+    times = repeat(serialize, number=number, repeat=5)
+    return min(times) / number
+
+
+# Measures the peak memory allocated while serializing one reading, in bytes
+def peak_allocation(serialize):
+    tracemalloc.start()
+    serialize()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def test_performance():
+    reading_datetime = datetime.now()
+    template = TurtleTemplate(HEADERS)
+
+    def rdflib_serialize():
+        return generate_turtle_rdf(reading_datetime, HEADERS, DATA)
+
+    def template_serialize():
+        return template.reading(reading_datetime, DATA)
+
+    # Warm up both serializers, so imports and plugin loading are not timed
+    rdflib_serialize()
+    template_serialize()
+
+    rdflib_time = time_per_reading(rdflib_serialize)
+    template_time = time_per_reading(template_serialize)
+
+    print(f"rdflib: {rdflib_time * 1e6:.1f}us per reading")
+    print(f"Template: {template_time * 1e6:.1f}us per reading")
+    print(f"Speedup: {rdflib_time / template_time:.0f}x")
+    print(f"rdflib peak allocation: {peak_allocation(rdflib_serialize)} bytes")
+    print(f"Template peak allocation: {peak_allocation(template_serialize)} bytes")
+
+    assert template_time < rdflib_time
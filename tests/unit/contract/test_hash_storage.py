@@ -101,3 +101,29 @@ def test_hash_verification_false():
     expected_value = False
     # Assert
     assert actual_value == expected_value
+
+
+# Checks that several file hashes are verified in a single call, in order
+def test_hashes_verification():
+    # Arrange
+    account = get_account()
+    # Act
+    hash_storage = HashStorage.deploy({"from": account})
+    stored_hash = hashlib.sha256(b"stored").hexdigest()
+    missing_hash = hashlib.sha256(b"missing").hexdigest()
+    hash_storage.store_hash(stored_hash, {"from": account})
+    actual_value = hash_storage.verify_hashes([missing_hash, stored_hash, stored_hash])
+    expected_value = [False, True, True]
+    # Assert
+    assert list(actual_value) == expected_value
+
+
+# Checks that verifying no file hashes returns an empty list
+def test_hashes_verification_empty():
+    # Arrange
+    account = get_account()
+    # Act
+    hash_storage = HashStorage.deploy({"from": account})
+    actual_value = hash_storage.verify_hashes([])
+    # Assert
+    assert list(actual_value) == []
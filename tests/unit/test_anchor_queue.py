@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from scripts.anchor_queue import AnchorQueue
+
+
+# Runs each test in its own folder, so queue files are not shared
+@pytest.fixture(autouse=True)
+def run_in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+# Checks that queued hashes survive a restart
+def test_add():
+    # Arrange
+    queue = AnchorQueue(os.path.join("spill", "anchors.jsonl"))
+
+    # Act
+    queue.add("aa")
+    queue.add("bb")
+
+    # Assert
+    assert len(AnchorQueue(os.path.join("spill", "anchors.jsonl"))) == 2
+
+
+# Checks that hashes are stored in order, and that those left after a failure are
+# kept for the next drain
+def test_drain():
+    # Arrange
+    queue = AnchorQueue(os.path.join("spill", "anchors.jsonl"))
+    for file_hash in ["aa", "bb", "cc"]:
+        queue.add(file_hash)
+
+    stored = []
+
+    def store_hash(file_hash):
+        if file_hash == "bb" and "bb" not in stored:
+            stored.append(file_hash)
+            raise Exception("Chain unreachable")
+        stored.append(file_hash)
+
+    # Act
+    first = queue.drain(store_hash)
+    second = queue.drain(store_hash)
+
+    # Assert
+    assert not first
+    assert second
+    assert stored == ["aa", "bb", "bb", "cc"]
+    assert len(AnchorQueue(os.path.join("spill", "anchors.jsonl"))) == 0
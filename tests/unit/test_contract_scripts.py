@@ -0,0 +1,57 @@
+import hashlib
+import io
+
+from scripts.contract_scripts import HASH_CHUNK_SIZE, generate_hash
+
+DATA = b"date,time,o3\n2022-03-21,11:19:47,1.0\n" * 5000
+DIGEST = hashlib.sha256(DATA).hexdigest()
+
+
+# Checks that contents are hashed in memory, whether given as bytes or a buffer
+def test_generate_hash_bytes():
+    # Act
+    hashes = [
+        generate_hash(DATA),
+        generate_hash(bytearray(DATA)),
+        generate_hash(memoryview(DATA)),
+    ]
+
+    # Assert
+    assert hashes == [DIGEST] * 3
+
+
+# Checks that a file is hashed from its path, in chunks, to the same digest as its
+# contents
+def test_generate_hash_path(tmp_path):
+    # Arrange
+    file = tmp_path / "2022-03-21.csv"
+    file.write_bytes(DATA)
+
+    # Act
+    hashes = [generate_hash(file), generate_hash(str(file))]
+
+    # Assert
+    assert len(DATA) > HASH_CHUNK_SIZE
+    assert hashes == [DIGEST] * 2
+
+
+# Checks that an open file and an iterator of chunks are hashed to the same digest
+# as their contents
+def test_generate_hash_stream():
+    # Arrange
+    chunks = (DATA[i : i + 1000] for i in range(0, len(DATA), 1000))
+
+    # Act
+    hashes = [generate_hash(io.BytesIO(DATA)), generate_hash(chunks)]
+
+    # Assert
+    assert hashes == [DIGEST] * 2
+
+
+# Checks that empty contents are hashed like an empty file
+def test_generate_hash_empty():
+    # Act
+    hashes = [generate_hash(b""), generate_hash(io.BytesIO()), generate_hash([])]
+
+    # Assert
+    assert hashes == [hashlib.sha256().hexdigest()] * 3
@@ -0,0 +1,159 @@
+import os
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.abspath(os.path.join(TEST_DIR, "../"))
+
+import hashlib
+import httpx
+
+from scripts.csv_journal import CSVJournal
+
+
+class MockResponse:
+    def __init__(self, headers, content=b""):
+        self.headers = headers
+        self.content = content
+
+
+# Checks that appended rows are journaled to disk and survive a restart
+def test_append_survives_restart(tmp_path):
+    # Arrange
+    journal = CSVJournal(tmp_path)
+    journal.open_day("2022-03-21.csv", "date,time,o3")
+
+    # Act
+    journal.append("2022-03-21,11:19:47,1.0")
+    restarted_journal = CSVJournal(tmp_path)
+    existed = restarted_journal.open_day("2022-03-21.csv", "date,time,o3")
+
+    # Assert
+    assert existed
+    assert journal.content() == b"date,time,o3\n2022-03-21,11:19:47,1.0"
+    assert restarted_journal.content() == journal.content()
+
+
+# Checks that the running hash matches the hash of the journaled file
+def test_digest(tmp_path):
+    # Arrange
+    journal = CSVJournal(tmp_path)
+    journal.open_day("2022-03-21.csv", "date,time,o3")
+
+    # Act
+    journal.append("2022-03-21,11:19:47,1.0")
+    journal.append("2022-03-21,11:20:47,2.0")
+    restarted_journal = CSVJournal(tmp_path)
+    restarted_journal.open_day("2022-03-21.csv", "date,time,o3")
+
+    # Assert
+    expected_hash = hashlib.sha256(
+        open(journal.journal_path("2022-03-21.csv"), "rb").read()
+    ).hexdigest()
+    assert journal.digest() == expected_hash
+    assert restarted_journal.digest() == expected_hash
+
+
+# Checks that closing a sealed day removes its journal and starts a fresh hash
+def test_close_day(tmp_path):
+    # Arrange
+    journal = CSVJournal(tmp_path)
+    journal.open_day("2022-03-20.csv", "date,time,o3")
+    journal.open_day("2022-03-21.csv", "date,time,o3")
+    journal.record_upload('"1"')
+
+    # Act
+    unsealed_days = journal.unsealed_days("2022-03-21.csv")
+    journal.close_day()
+
+    # Assert
+    assert unsealed_days == ["2022-03-20.csv"]
+    assert os.listdir(tmp_path) == ["2022-03-20.csv"]
+    assert journal.file_name is None
+    assert journal.digest() == hashlib.sha256().hexdigest()
+
+
+# Checks that a matching ETag reconciles the journal without downloading the file
+def test_reconcile_matching_etag(tmp_path, mocker):
+    # Arrange
+    journal = CSVJournal(tmp_path)
+    journal.open_day("2022-03-21.csv", "date,time,o3")
+    journal.append("2022-03-21,11:19:47,1.0")
+    journal.record_upload('"1"')
+    api = mocker.Mock()
+    api.head.return_value = MockResponse({"ETag": '"1"'})
+
+    restarted_journal = CSVJournal(tmp_path)
+    restarted_journal.open_day("2022-03-21.csv", "date,time,o3")
+
+    # Act
+    source = restarted_journal.reconcile(api, "http://pod.example.com/2022-03-21.csv")
+
+    # Assert
+    assert source == "journal"
+    api.get.assert_not_called()
+
+
+# Checks that the journal adopts the Solid Pod file when it holds unseen rows
+def test_reconcile_pod_ahead(tmp_path, mocker):
+    # Arrange
+    pod_data = b"date,time,o3\n2022-03-21,11:19:47,1.0\n2022-03-21,11:20:47,2.0"
+    journal = CSVJournal(tmp_path)
+    journal.open_day("2022-03-21.csv", "date,time,o3")
+    journal.append("2022-03-21,11:19:47,1.0")
+    api = mocker.Mock()
+    api.head.return_value = MockResponse({"ETag": '"2"'})
+    api.get.return_value = MockResponse({}, pod_data)
+
+    # Act
+    source = journal.reconcile(api, "http://pod.example.com/2022-03-21.csv")
+
+    # Assert
+    assert source == "pod"
+    assert journal.content() == pod_data
+    assert CSVJournal(tmp_path).open_day("2022-03-21.csv", "date,time,o3")
+    assert open(journal.journal_path("2022-03-21.csv"), "rb").read() == pod_data
+
+
+# Checks that rows journaled after a restart are kept when the journal adopts the
+# Solid Pod file
+def test_reconcile_pod_ahead_after_restart(tmp_path, mocker):
+    # Arrange
+    pod_data = b"date,time,o3\n2022-03-21,11:19:47,1.0\n2022-03-21,11:20:47,2.0"
+    journal = CSVJournal(tmp_path)
+    journal.open_day("2022-03-21.csv", "date,time,o3")
+    journal.append("2022-03-21,11:19:47,1.0")
+    api = mocker.Mock()
+    api.head.return_value = MockResponse({"ETag": '"2"'})
+    api.get.return_value = MockResponse({}, pod_data)
+
+    restarted_journal = CSVJournal(tmp_path)
+    restarted_journal.open_day("2022-03-21.csv", "date,time,o3")
+    restarted_journal.append("2022-03-21,11:21:47,3.0")
+
+    # Act
+    source = restarted_journal.reconcile(api, "http://pod.example.com/2022-03-21.csv")
+
+    # Assert
+    assert source == "pod"
+    assert restarted_journal.content() == pod_data + b"\n2022-03-21,11:21:47,3.0"
+    assert restarted_journal.digest() == (
+        hashlib.sha256(restarted_journal.content()).hexdigest()
+    )
+
+
+# Checks that a journal whose file is missing from the Solid Pod is kept
+def test_reconcile_missing_file(tmp_path, mocker):
+    # Arrange
+    journal = CSVJournal(tmp_path)
+    journal.open_day("2022-03-21.csv", "date,time,o3")
+    request = httpx.Request("HEAD", "http://pod.example.com/2022-03-21.csv")
+    api = mocker.Mock()
+    api.head.side_effect = httpx.HTTPStatusError(
+        "Not Found", request=request, response=httpx.Response(404, request=request)
+    )
+
+    # Act
+    source = journal.reconcile(api, "http://pod.example.com/2022-03-21.csv")
+
+    # Assert
+    assert source == "journal"
+    api.get.assert_not_called()
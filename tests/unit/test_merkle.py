@@ -0,0 +1,44 @@
+import hashlib
+
+from scripts.merkle import build_levels, hash_leaf, merkle_proof, proof_root
+
+FILE_HASHES = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(9)]
+
+
+# Checks that every file in batches of any size can be proven against the root
+def test_proof_root():
+    for size in range(1, len(FILE_HASHES) + 1):
+        # Arrange
+        levels = build_levels(FILE_HASHES[:size])
+        root = levels[-1][0]
+
+        for index, file_hash in enumerate(FILE_HASHES[:size]):
+            # Act
+            proof = merkle_proof(levels, index)
+
+            # Assert
+            assert proof_root(file_hash, proof) == root
+
+
+# Checks that a single file is its own root, hashed as a leaf
+def test_single_file():
+    # Act
+    levels = build_levels(FILE_HASHES[:1])
+
+    # Assert
+    assert levels[-1][0] == hash_leaf(FILE_HASHES[0])
+    assert merkle_proof(levels, 0) == []
+
+
+# Checks that a proof does not hold for another file or another position
+def test_invalid_proof():
+    # Arrange
+    levels = build_levels(FILE_HASHES)
+    root = levels[-1][0]
+    proof = merkle_proof(levels, 2)
+
+    # Assert
+    assert proof_root(FILE_HASHES[3], proof) != root
+    assert proof_root(FILE_HASHES[2], merkle_proof(levels, 3)) != root
+    # An inner node cannot be passed off as a file hash
+    assert proof_root(levels[1][1], merkle_proof(levels[1:], 1)) != root
@@ -0,0 +1,117 @@
+import hashlib
+
+from scripts.migrate_layout import LayoutMigrator
+
+AQM_FOLDER_URL = "http://pod.example.com/aqm_folder/aqm_name/"
+
+
+class MockResponse:
+    def __init__(self, content):
+        self.content = content
+        self.headers = {"Content-Type": "text/csv"}
+
+
+class MockItem:
+    def __init__(self, url):
+        self.url = url
+        self.name = url.rstrip("/").rsplit("/", 1)[-1]
+
+
+class MockFolder:
+    def __init__(self, files, folders):
+        self.files = files
+        self.folders = folders
+
+
+# A Solid Pod holding files in memory, whose copies can be made to differ
+class MockAPI:
+    def __init__(self, files, corrupt=()):
+        self.files = dict(files)
+        self.containers = {AQM_FOLDER_URL}
+        self.corrupt = corrupt
+
+    def read_folder(self, url):
+        children = {
+            url
+            + key[len(url) :].split("/")[0]
+            + ("/" if "/" in key[len(url) :] else "")
+            for key in self.files
+            if key.startswith(url)
+        }
+        return MockFolder(
+            [MockItem(child) for child in children if not child.endswith("/")],
+            [MockItem(child) for child in children if child.endswith("/")],
+        )
+
+    def item_exists(self, url):
+        return url in self.containers
+
+    def create_folder(self, url):
+        self.containers.add(url)
+
+    def put_file(self, url, content, content_type):
+        if url.rsplit("/", 1)[-1] in self.corrupt:
+            content += b"\n"
+        self.files[url] = content
+        return MockResponse(content)
+
+    def get(self, url):
+        return MockResponse(self.files[url])
+
+    def delete(self, url):
+        del self.files[url]
+
+    def delete_folder(self, url):
+        self.containers.discard(url)
+
+
+# Checks that files move into their partitions with the same bytes, and so the
+# same hashes
+def test_migrate():
+    # Arrange
+    files = {
+        AQM_FOLDER_URL + "2022-07-08.csv": b"date,time\n2022-07-08,11:19:47",
+        AQM_FOLDER_URL + "2022-07-09_1.csv": b"date,time\n2022-07-09,00:00:00",
+        AQM_FOLDER_URL + "2022-07-09/00-00-00.csv": b"2022-07-09,00:00:00",
+        AQM_FOLDER_URL + "2022-07-09/manifest.csv": b"segment,rows",
+        AQM_FOLDER_URL + "notes.txt": b"notes",
+    }
+    hashes = {
+        url.rsplit("/", 1)[-1]: hashlib.sha256(content).hexdigest()
+        for url, content in files.items()
+    }
+    api = MockAPI(files)
+    migrator = LayoutMigrator(api)
+
+    # Act
+    migrator.migrate(AQM_FOLDER_URL)
+
+    # Assert
+    assert sorted(api.files) == [
+        AQM_FOLDER_URL + "2022/07/08/2022-07-08.csv",
+        AQM_FOLDER_URL + "2022/07/09/2022-07-09/00-00-00.csv",
+        AQM_FOLDER_URL + "2022/07/09/2022-07-09/manifest.csv",
+        AQM_FOLDER_URL + "2022/07/09/2022-07-09_1.csv",
+        AQM_FOLDER_URL + "notes.txt",
+    ]
+    for url, content in api.files.items():
+        assert hashlib.sha256(content).hexdigest() == hashes[url.rsplit("/", 1)[-1]]
+    assert AQM_FOLDER_URL + "2022-07-09/" not in api.containers
+    assert (migrator.moved, migrator.kept) == (4, 0)
+
+
+# Checks that a file is kept in place if its copy does not hash the same
+def test_migrate_mismatch(capsys):
+    # Arrange
+    api = MockAPI(
+        {AQM_FOLDER_URL + "2022-07-08.csv": b"date,time"}, corrupt=["2022-07-08.csv"]
+    )
+    migrator = LayoutMigrator(api)
+
+    # Act
+    migrator.migrate(AQM_FOLDER_URL)
+
+    # Assert
+    assert AQM_FOLDER_URL + "2022-07-08.csv" in api.files
+    assert (migrator.moved, migrator.kept) == (0, 1)
+    assert "does not match" in capsys.readouterr().out
@@ -0,0 +1,103 @@
+import httpx
+import pytest
+from solid.auth import Auth
+from solid.solid_api import SolidAPI
+
+from scripts.pod_cache import PodCache
+
+
+class MockResponse:
+    def __init__(self):
+        self.headers = {"ETag": '"1"'}
+
+
+# Returns an HTTP error with a status code
+def http_error(status_code):
+    request = httpx.Request("PUT", "http://pod.example.com/aqm/2022-03-21.csv")
+    return httpx.HTTPStatusError(
+        "Error", request=request, response=httpx.Response(status_code, request=request)
+    )
+
+
+# Checks that a known container is only checked once
+def test_ensure_container(mocker):
+    # Arrange
+    exists = mocker.patch.object(SolidAPI, "item_exists", return_value=False)
+    create_folder = mocker.patch.object(SolidAPI, "create_folder")
+    cache = PodCache(SolidAPI(Auth()))
+
+    # Act
+    first = cache.ensure_container("http://pod.example.com/aqm/")
+    second = cache.ensure_container("http://pod.example.com/aqm/")
+
+    # Assert
+    assert first
+    assert not second
+    exists.assert_called_once()
+    create_folder.assert_called_once_with("http://pod.example.com/aqm/")
+
+
+# Checks that repeated uploads make a single request each and record the ETag
+def test_put_file(mocker):
+    # Arrange
+    exists = mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockResponse())
+    cache = PodCache(SolidAPI(Auth()))
+    file_url = "http://pod.example.com/aqm/2022-03-21.csv"
+
+    # Act
+    for _ in range(3):
+        cache.put_file(file_url, b"date,time", "text/csv")
+
+    # Assert
+    exists.assert_called_once_with("http://pod.example.com/aqm/")
+    assert put.call_count == 3
+    assert cache.resources[file_url] == '"1"'
+    assert cache.exists(file_url)
+
+
+# Checks that a 404 makes the next upload check the container again
+def test_put_file_not_found(mocker):
+    # Arrange
+    exists = mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    mocker.patch.object(
+        SolidAPI, "put_file", side_effect=[MockResponse(), http_error(404)]
+    )
+    cache = PodCache(SolidAPI(Auth()))
+    file_url = "http://pod.example.com/aqm/2022-03-21.csv"
+    cache.put_file(file_url, b"date,time", "text/csv")
+
+    # Act
+    with pytest.raises(httpx.HTTPStatusError):
+        cache.put_file(file_url, b"date,time", "text/csv")
+
+    # Assert
+    assert file_url not in cache.resources
+    assert "http://pod.example.com/aqm/" not in cache.containers
+    assert exists.call_count == 1
+
+
+# Checks that missing parents are created, down from the nearest one that exists
+def test_ensure_path(mocker):
+    # Arrange
+    exists = mocker.patch.object(
+        SolidAPI,
+        "item_exists",
+        side_effect=lambda url: url == "http://pod.example.com/aqm/",
+    )
+    create_folder = mocker.patch.object(SolidAPI, "create_folder")
+    cache = PodCache(SolidAPI(Auth()))
+
+    # Act
+    created = cache.ensure_path("http://pod.example.com/aqm/2022/07/08/")
+    known = cache.ensure_path("http://pod.example.com/aqm/2022/07/08/")
+
+    # Assert
+    assert created
+    assert not known
+    assert exists.call_count == 4
+    assert [call.args[0] for call in create_folder.call_args_list] == [
+        "http://pod.example.com/aqm/2022/",
+        "http://pod.example.com/aqm/2022/07/",
+        "http://pod.example.com/aqm/2022/07/08/",
+    ]
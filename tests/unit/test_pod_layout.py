@@ -0,0 +1,105 @@
+from datetime import datetime
+
+from scripts.pod_layout import layout_url, list_partitions, partition_url
+from scripts.time_index import parse_bound, parse_range
+
+AQM_FOLDER_URL = "http://pod.example.com/aqm_folder/aqm_name/"
+
+
+class MockItem:
+    def __init__(self, name):
+        self.name = name
+
+
+class MockFolder:
+    def __init__(self, files, folders):
+        self.files = [MockItem(name) for name in files]
+        self.folders = [MockItem(name) for name in folders]
+
+
+class MockAPI:
+    def __init__(self, folders):
+        self.folders = folders
+        self.read = []
+
+    def read_folder(self, url):
+        self.read.append(url[len(AQM_FOLDER_URL) :])
+        return self.folders[url[len(AQM_FOLDER_URL) :]]
+
+
+# A dated AQM folder holding two years, with a file not yet migrated
+def dated_folder():
+    return MockAPI(
+        {
+            "": MockFolder(["2021-12-31.csv", "manifest.csv"], ["2022", "2023", "x"]),
+            "2022/": MockFolder([], ["07", "08"]),
+            "2022/07/": MockFolder([], ["08", "09"]),
+            "2022/07/08/": MockFolder(["2022-07-08.csv"], ["2022-07-08"]),
+            "2022/07/09/": MockFolder(["2022-07-09.csv"], []),
+            "2022/08/": MockFolder([], ["01"]),
+            "2022/08/01/": MockFolder(["2022-08-01.csv"], []),
+            "2023/": MockFolder([], ["01"]),
+            "2023/01/": MockFolder([], ["01"]),
+            "2023/01/01/": MockFolder(["2023-01-01.csv"], []),
+        }
+    )
+
+
+# Checks that files named after a date are stored in their day's partition
+def test_layout_url():
+    # Act / Assert
+    assert layout_url(AQM_FOLDER_URL, "2022-07-08.csv", "flat") == (
+        AQM_FOLDER_URL + "2022-07-08.csv"
+    )
+    assert layout_url(AQM_FOLDER_URL, "2022-07-08 11:19:47.ttl", "dated") == (
+        AQM_FOLDER_URL + "2022/07/08/2022-07-08 11:19:47.ttl"
+    )
+    assert layout_url(AQM_FOLDER_URL, "2022-07-08_1/", "dated") == (
+        AQM_FOLDER_URL + "2022/07/08/2022-07-08_1/"
+    )
+    assert partition_url(AQM_FOLDER_URL, "manifest.csv", "dated") == AQM_FOLDER_URL
+
+
+# Checks that every partition is listed when no period is given
+def test_list_partitions():
+    # Arrange
+    api = dated_folder()
+
+    # Act
+    file_names = list_partitions(api, AQM_FOLDER_URL)
+
+    # Assert
+    assert sorted(file_names) == [
+        "2021-12-31.csv",
+        "2022/07/08/2022-07-08.csv",
+        "2022/07/09/2022-07-09.csv",
+        "2022/08/01/2022-08-01.csv",
+        "2023/01/01/2023-01-01.csv",
+        "manifest.csv",
+    ]
+
+
+# Checks that only the partitions a period overlaps are read
+def test_list_partitions_period():
+    # Arrange
+    api = dated_folder()
+
+    # Act
+    day = list_partitions(api, AQM_FOLDER_URL, *parse_bound("2022-07-08T11"))
+    day_reads = api.read
+    api.read = []
+    days = list_partitions(
+        api, AQM_FOLDER_URL, *parse_range("2022-07-09", "2022-08-01")
+    )
+
+    # Assert
+    assert day == ["2021-12-31.csv", "manifest.csv", "2022/07/08/2022-07-08.csv"]
+    assert day_reads == ["", "2022/", "2022/07/", "2022/07/08/"]
+    assert sorted(days) == [
+        "2021-12-31.csv",
+        "2022/07/09/2022-07-09.csv",
+        "2022/08/01/2022-08-01.csv",
+        "manifest.csv",
+    ]
+    assert "2023/" not in api.read
+    assert "2022/07/08/" not in api.read
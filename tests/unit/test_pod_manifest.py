@@ -0,0 +1,211 @@
+import hashlib
+import json
+
+import httpx
+
+from scripts.merkle import build_levels, merkle_proof
+from scripts.pod_manifest import (
+    PodManifest,
+    encode_manifest,
+    listed_sizes,
+    parse_manifest,
+    plan_audit,
+)
+
+FOLDER_URL = "http://pod.example.com/aqm_folder/aqm_name/2022/03/21/"
+LISTING = """
+@prefix ldp: <http://www.w3.org/ns/ldp#>.
+@prefix stat: <http://www.w3.org/ns/posix/stat#>.
+
+<> a ldp:BasicContainer; ldp:contains <2022-03-21.csv>, <2022-03-21%2011%3A19%3A47.ttl>.
+<2022-03-21.csv> stat:size 9.
+<2022-03-21%2011%3A19%3A47.ttl> stat:size 12.
+"""
+
+
+class MockResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+# A Solid Pod holding text files in memory
+class MockAPI:
+    def __init__(self, files):
+        self.files = dict(files)
+        self.gets = []
+
+    def get(self, url, options=None):
+        self.gets.append(url)
+        if url not in self.files:
+            request = httpx.Request("GET", url)
+            raise httpx.HTTPStatusError(
+                "Not found", request=request, response=httpx.Response(404)
+            )
+        return MockResponse(self.files[url])
+
+    def put_file(self, url, content, content_type):
+        self.files[url] = content.decode()
+
+
+# Returns a manifest row
+def row(file, size, sha256, anchor, proof=""):
+    return {
+        "file": file,
+        "size": str(size),
+        "sha256": sha256,
+        "anchor": anchor,
+        "proof": proof,
+    }
+
+
+# Checks that sealed files are written to the manifest of their folder, with
+# the root and proof of a Merkle batch merged in once it is anchored
+def test_save():
+    # Arrange
+    api = MockAPI({})
+    manifest = PodManifest(api, "hashes.csv")
+    levels = build_levels(["aa" * 32, "bb" * 32])
+
+    # Act
+    manifest.add(FOLDER_URL + "2022-03-21.csv", "aa" * 32, 9, "aa" * 32, [])
+    first = manifest.save()
+    manifest.add(FOLDER_URL + "2022-03-21%2011%3A19%3A47.ttl", "bb" * 32, 12)
+    manifest.add(
+        FOLDER_URL + "2022-03-21%2011%3A19%3A47.ttl",
+        anchor=levels[-1][0],
+        proof=merkle_proof(levels, 1),
+    )
+    second = manifest.save()
+
+    # Assert
+    assert first and second
+    assert api.gets == [FOLDER_URL + "hashes.csv"]
+    assert parse_manifest(api.files[FOLDER_URL + "hashes.csv"]) == {
+        "2022-03-21.csv": row("2022-03-21.csv", 9, "aa" * 32, "aa" * 32),
+        "2022-03-21 11:19:47.ttl": row(
+            "2022-03-21 11:19:47.ttl",
+            12,
+            "bb" * 32,
+            levels[-1][0],
+            json.dumps(merkle_proof(levels, 1)),
+        ),
+    }
+
+
+# Checks that the manifest of each folder is only downloaded once, however the
+# files sealed in them alternate
+def test_save_folders():
+    # Arrange
+    api = MockAPI({})
+    manifest = PodManifest(api, "hashes.csv")
+    next_folder_url = FOLDER_URL.replace("/21/", "/22/")
+
+    # Act
+    for folder_url in [FOLDER_URL, next_folder_url, FOLDER_URL, next_folder_url]:
+        manifest.add(folder_url + "2022-03-21.csv", "aa" * 32, 9, "aa" * 32, [])
+        manifest.save()
+
+    # Assert
+    assert api.gets == [FOLDER_URL + "hashes.csv", next_folder_url + "hashes.csv"]
+    assert list(parse_manifest(api.files[next_folder_url + "hashes.csv"])) == [
+        "2022-03-21.csv"
+    ]
+
+
+# Checks that changes are kept until the manifest can be written
+def test_save_failure(mocker):
+    # Arrange
+    api = MockAPI({})
+    put = mocker.patch.object(api, "put_file", side_effect=Exception)
+    manifest = PodManifest(api, "hashes.csv")
+    manifest.add(FOLDER_URL + "2022-03-21.csv", "aa" * 32, 9, "aa" * 32, [])
+
+    # Act
+    saved = manifest.save()
+
+    # Assert
+    assert not saved
+    assert put.call_count == 1
+    assert FOLDER_URL in manifest.changes
+
+
+# Checks that file sizes are read from a folder listing
+def test_listed_sizes():
+    # Arrange
+    api = MockAPI({FOLDER_URL: LISTING})
+
+    # Act
+    sizes = listed_sizes(api, FOLDER_URL)
+
+    # Assert
+    assert sizes == {"2022-03-21.csv": 9, "2022-03-21 11:19:47.ttl": 12}
+
+
+# Checks that only files the manifest vouches for are left out of the downloads
+def test_plan_audit():
+    # Arrange
+    csv_hash = hashlib.sha256(b"date,time").hexdigest()
+    rows = {
+        "2022-03-21.csv": row("2022-03-21.csv", 9, csv_hash, csv_hash),
+        # The listed size disagrees with the manifest
+        "2022-03-21 11:19:47.ttl": row("2022-03-21 11:19:47.ttl", 13, "bb", "bb"),
+    }
+    api = MockAPI(
+        {FOLDER_URL: LISTING, FOLDER_URL + "hashes.csv": encode_manifest(rows).decode()}
+    )
+    files = [
+        "2022/03/21/2022-03-21.csv",
+        "2022/03/21/2022-03-21%2011%3A19%3A47.ttl",
+        "2022/03/22/2022-03-22.csv",
+    ]
+
+    # Act
+    anchors, downloads = plan_audit(
+        api, "http://pod.example.com/aqm_folder/aqm_name/", files, "hashes.csv", 0
+    )
+    _, sampled = plan_audit(
+        api, "http://pod.example.com/aqm_folder/aqm_name/", files, "hashes.csv", 1
+    )
+
+    # Assert
+    assert anchors == {"2022/03/21/2022-03-21.csv": csv_hash}
+    assert downloads == files[1:]
+    assert sorted(sampled) == sorted(files)
+
+
+# Checks that a manifest row is only trusted if its proof leads to its anchor
+def test_plan_audit_proof():
+    # Arrange
+    levels = build_levels(["aa" * 32, "bb" * 32])
+    rows = {
+        "2022-03-21.csv": row(
+            "2022-03-21.csv",
+            9,
+            "cc" * 32,
+            levels[-1][0],
+            json.dumps(merkle_proof(levels, 0)),
+        ),
+        "2022-03-21 11:19:47.ttl": row(
+            "2022-03-21 11:19:47.ttl",
+            12,
+            "bb" * 32,
+            levels[-1][0],
+            json.dumps(merkle_proof(levels, 1)),
+        ),
+    }
+    api = MockAPI(
+        {FOLDER_URL: LISTING, FOLDER_URL + "hashes.csv": encode_manifest(rows).decode()}
+    )
+
+    # Act
+    anchors, downloads = plan_audit(
+        api,
+        FOLDER_URL,
+        ["2022-03-21.csv", "2022-03-21%2011%3A19%3A47.ttl"],
+        "hashes.csv",
+        0,
+    )
+
+    # Assert
+    assert anchors == {"2022-03-21%2011%3A19%3A47.ttl": levels[-1][0]}
+    assert downloads == ["2022-03-21.csv"]
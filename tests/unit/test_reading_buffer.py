@@ -0,0 +1,50 @@
+import os
+
+from scripts.reading_buffer import ReadingBuffer
+
+
+# Checks that the buffer is full once enough readings are added
+def test_is_full():
+    # Arrange
+    buffer = ReadingBuffer(max_readings=2, max_age=0)
+
+    # Act
+    started = buffer.add("2022-03-21,11:19:47,1.0")
+    full_after_one = buffer.is_full()
+    buffer.add("2022-03-21,11:20:47,2.0")
+
+    # Assert
+    assert started
+    assert not full_after_one
+    assert buffer.is_full()
+
+
+# Checks that readings spilled to disk are restored after a restart
+def test_spilled_readings_restored(tmp_path):
+    # Arrange
+    spill_file = os.path.join(tmp_path, "spill", "aqm.jsonl")
+    buffer = ReadingBuffer(max_readings=10, max_age=0, spill_file=spill_file)
+    buffer.add("2022-03-21,11:19:47,1.0")
+    buffer.add("2022-03-21,11:20:47,2.0")
+
+    # Act
+    restored = ReadingBuffer(max_readings=10, max_age=0, spill_file=spill_file)
+
+    # Assert
+    assert restored.readings == ["2022-03-21,11:19:47,1.0", "2022-03-21,11:20:47,2.0"]
+
+
+# Checks that only the flushed readings are removed from the buffer and spill file
+def test_clear(tmp_path):
+    # Arrange
+    spill_file = os.path.join(tmp_path, "aqm.jsonl")
+    buffer = ReadingBuffer(max_readings=10, max_age=0, spill_file=spill_file)
+    buffer.add("2022-03-21,11:19:47,1.0")
+    buffer.add("2022-03-21,11:20:47,2.0")
+
+    # Act
+    buffer.clear(1)
+
+    # Assert
+    assert buffer.readings == ["2022-03-21,11:20:47,2.0"]
+    assert ReadingBuffer(10, 0, spill_file).readings == ["2022-03-21,11:20:47,2.0"]
@@ -0,0 +1,152 @@
+import hashlib
+
+import pytest
+from brownie.network.contract import ContractCall
+
+from scripts.rpc_batch import batch_call, rpc_endpoint, rpc_request_kwargs
+
+ENDPOINT = "http://127.0.0.1:8545"
+ADDRESS = "0x0000000000000000000000000000000000000001"
+VERIFY_HASH_ABI = {
+    "inputs": [{"name": "hash_to_verify", "type": "bytes32"}],
+    "name": "verify_hash",
+    "outputs": [{"name": "", "type": "bool"}],
+    "stateMutability": "view",
+    "type": "function",
+}
+TRUE = "0x" + "0" * 63 + "1"
+FALSE = "0x" + "0" * 64
+
+
+class MockResponse:
+    def __init__(self, items):
+        self.items = items
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.items
+
+
+# A provider connected to a node at a URL
+class MockProvider:
+    def __init__(self, endpoint_uri):
+        self.endpoint_uri = endpoint_uri
+
+    def get_request_kwargs(self):
+        return {"headers": {"Authorization": "Bearer key"}, "timeout": 10}
+
+
+# Answers every call of a batch, in reverse order, as True for even ids
+def answer_batch(endpoint, json, **kwargs):
+    return MockResponse(
+        [
+            {
+                "jsonrpc": "2.0",
+                "id": call["id"],
+                "result": FALSE if call["id"] % 2 else TRUE,
+            }
+            for call in reversed(json)
+        ]
+    )
+
+
+# Checks that calls are packed into batch requests, with results in the order of
+# the arguments whatever order the node answers in
+def test_batch_call(mocker):
+    # Arrange
+    post = mocker.patch("requests.post", side_effect=answer_batch)
+    verify_hash = ContractCall(ADDRESS, VERIFY_HASH_ABI, "verify_hash", None)
+    hashes = [hashlib.sha256(bytes([i])).hexdigest() for i in range(5)]
+
+    # Act
+    results = batch_call(
+        ENDPOINT, verify_hash, [(hash,) for hash in hashes], batch_size=2
+    )
+
+    # Assert
+    assert results == [True, False, True, False, True]
+    assert post.call_count == 3
+    first_batch = post.call_args_list[0].kwargs["json"]
+    assert [call["method"] for call in first_batch] == ["eth_call", "eth_call"]
+    assert first_batch[1]["params"][0] == {
+        "to": ADDRESS,
+        "data": verify_hash.encode_input(hashes[1]),
+    }
+
+
+# Checks that a failed call in a batch is reported rather than read as False
+def test_batch_call_error(mocker):
+    # Arrange
+    mocker.patch(
+        "requests.post",
+        return_value=MockResponse(
+            [{"jsonrpc": "2.0", "id": 0, "error": {"code": -32000}}]
+        ),
+    )
+    verify_hash = ContractCall(ADDRESS, VERIFY_HASH_ABI, "verify_hash", None)
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        batch_call(ENDPOINT, verify_hash, [(hashlib.sha256().hexdigest(),)])
+
+
+# Checks that a node answering a batch with a single error is reported
+def test_batch_call_unsupported(mocker):
+    # Arrange
+    mocker.patch(
+        "requests.post",
+        return_value=MockResponse({"jsonrpc": "2.0", "error": {"code": -32600}}),
+    )
+    verify_hash = ContractCall(ADDRESS, VERIFY_HASH_ABI, "verify_hash", None)
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        batch_call(ENDPOINT, verify_hash, [(hashlib.sha256().hexdigest(),)])
+
+
+# Checks that batch requests are sent with the options of the provider
+def test_batch_call_request_kwargs(mocker):
+    # Arrange
+    post = mocker.patch("requests.post", side_effect=answer_batch)
+    verify_hash = ContractCall(ADDRESS, VERIFY_HASH_ABI, "verify_hash", None)
+
+    # Act
+    batch_call(
+        ENDPOINT,
+        verify_hash,
+        [(hashlib.sha256().hexdigest(),)],
+        request_kwargs=MockProvider(ENDPOINT).get_request_kwargs(),
+    )
+
+    # Assert
+    assert post.call_args.kwargs["headers"] == {"Authorization": "Bearer key"}
+    assert post.call_args.kwargs["timeout"] == 10
+
+
+# Checks that batch requests are sent to nodes reached over HTTP, with the options
+# of the provider
+def test_rpc_endpoint(mocker):
+    # Arrange
+    web3 = mocker.patch("scripts.rpc_batch.web3")
+    web3.provider = MockProvider("https://goerli.example.com/v3/key")
+
+    # Act / Assert
+    assert rpc_endpoint() == "https://goerli.example.com/v3/key"
+    assert rpc_request_kwargs()["headers"] == {"Authorization": "Bearer key"}
+
+
+# Checks that nodes reached over a WebSocket or IPC are not sent batch requests
+def test_rpc_endpoint_not_http(mocker):
+    # Arrange
+    web3 = mocker.patch("scripts.rpc_batch.web3")
+    endpoints = []
+
+    # Act
+    for endpoint_uri in ["wss://goerli.example.com/ws/v3/key", "geth.ipc", None]:
+        web3.provider = MockProvider(endpoint_uri)
+        endpoints.append(rpc_endpoint())
+
+    # Assert
+    assert endpoints == [None, None, None]
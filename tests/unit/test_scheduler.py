@@ -0,0 +1,151 @@
+import os
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.abspath(os.path.join(TEST_DIR, "../"))
+
+import freezegun
+from datetime import datetime, timedelta
+
+from scripts.scheduler import CancelJob, DeadlineScheduler
+
+
+# Checks that a repeating job keeps to its deadlines when a run is slow
+def test_every_compensates_for_drift(mocker):
+    with freezegun.freeze_time("2022-03-21 11:19:47") as frozen_date_time:
+        # Arrange
+        scheduler = DeadlineScheduler()
+
+        # The job takes 15 seconds to run
+        job = mocker.Mock(
+            side_effect=lambda: frozen_date_time.tick(timedelta(seconds=15))
+        )
+        scheduler.every(60, job)
+
+        # Act
+        scheduler.run_pending()
+
+        # Assert
+        job.assert_called_once()
+        assert scheduler.next_deadline() == datetime(2022, 3, 21, 11, 20, 47)
+
+
+# Checks that runs missed entirely are skipped rather than run back to back
+def test_every_skips_missed_runs(mocker):
+    with freezegun.freeze_time("2022-03-21 11:19:47") as frozen_date_time:
+        # Arrange
+        scheduler = DeadlineScheduler()
+
+        # The job takes two and a half intervals to run
+        job = mocker.Mock(
+            side_effect=lambda: frozen_date_time.tick(timedelta(seconds=150))
+        )
+        scheduler.every(60, job)
+
+        # Act
+        scheduler.run_pending()
+
+        # Assert
+        job.assert_called_once()
+        assert scheduler.next_deadline() == datetime(2022, 3, 21, 11, 22, 47)
+
+
+# Checks that setting the wall clock back, e.g. when daylight saving time ends,
+# does not hold up repeating jobs or retries
+def test_every_ignores_wall_clock(mocker):
+    with freezegun.freeze_time("2022-10-30 01:59:00") as frozen_date_time:
+        # Arrange
+        monotonic = mocker.patch("time.monotonic", return_value=1000.0)
+        scheduler = DeadlineScheduler()
+        job = mocker.Mock()
+        scheduler.every(60, job)
+        scheduler.after(45, mocker.Mock())
+
+        # Act
+        scheduler.run_pending()
+        frozen_date_time.move_to("2022-10-30 01:00:30")
+        monotonic.return_value = 1030.0
+        delay = scheduler.next_delay()
+        # The clock freezegun fakes is restored before it stops
+        mocker.stopall()
+
+    # Assert
+    job.assert_called_once()
+    assert delay == 15
+
+
+# Checks that daily jobs run at the next occurrence of their time
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_daily_at(mocker):
+    # Arrange
+    scheduler = DeadlineScheduler()
+
+    # Act
+    later_today = scheduler.daily_at("23:59:59", mocker.Mock())
+    tomorrow = scheduler.daily_at("00:00:00", mocker.Mock())
+
+    # Assert
+    assert later_today.deadline == datetime(2022, 3, 21, 23, 59, 59)
+    assert tomorrow.deadline == datetime(2022, 3, 22, 0, 0, 0)
+
+
+# Checks that one-off and cancelled jobs are not rescheduled
+def test_after_and_cancel(mocker):
+    with freezegun.freeze_time("2022-03-21 11:19:47") as frozen_date_time:
+        # Arrange
+        scheduler = DeadlineScheduler()
+        retry = mocker.Mock()
+        cancelled = mocker.Mock()
+        once = mocker.Mock(return_value=CancelJob)
+        scheduler.after(30, retry)
+        scheduler.cancel(scheduler.after(30, cancelled))
+        scheduler.every(60, once)
+
+        # Act
+        frozen_date_time.tick(timedelta(seconds=30))
+        scheduler.run_pending()
+
+        # Assert
+        retry.assert_called_once()
+        cancelled.assert_not_called()
+        once.assert_called_once()
+        assert scheduler.next_deadline() is None
+
+
+# Checks that a failing job is reported without stopping the other jobs, and runs
+# again if it repeats
+def test_failing_job(mocker):
+    with freezegun.freeze_time("2022-03-21 11:19:47"):
+        # Arrange
+        scheduler = DeadlineScheduler()
+        failing = mocker.Mock(side_effect=Exception, __name__="poll")
+        other = mocker.Mock()
+        failing_job = scheduler.every(60, failing)
+        scheduler.every(60, other)
+
+        # Act
+        scheduler.run_pending()
+
+        # Assert
+        failing.assert_called_once()
+        other.assert_called_once()
+        assert any(job is failing_job for _, _, job in scheduler.jobs)
+
+
+# Checks that the scheduler sleeps until the next deadline instead of busy waiting
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_run_sleeps_until_deadline(mocker):
+    # Arrange
+    sleep = mocker.patch("time.sleep", side_effect=InterruptedError)
+    scheduler = DeadlineScheduler()
+    job = mocker.Mock()
+    scheduler.every(60, job)
+
+    # Act
+    try:
+        scheduler.run()
+    except InterruptedError:
+        pass
+
+    # Assert
+    job.assert_called_once()
+    sleep.assert_called_once_with(60.0)
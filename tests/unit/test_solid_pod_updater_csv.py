@@ -4,18 +4,28 @@ TEST_DIR = os.path.dirname(os.path.abspath(__file__))
 SRC_DIR = os.path.abspath(os.path.join(TEST_DIR, "../"))
 
 import freezegun
+import hashlib
+import pytest
 from solid.auth import Auth
 from solid.solid_api import SolidAPI
 from datetime import datetime, date
-import schedule
-from schedule import every
 
 from scripts.solid_pod_updater_csv import SolidPodUpdaterCSV
+from scripts.thing_schema import SchemaChanged
+from scripts.wot_client import WoTUnavailable
+
+
+# Runs each test in its own directory, as the updater journals CSV files locally
+@pytest.fixture(autouse=True)
+def run_in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
 
 
 class MockRequest:
     def __init__(self):
         self.text = ""
+        self.content = b""
+        self.headers = {"ETag": '"1"'}
 
     def json(self):
         return {
@@ -30,6 +40,32 @@ class MockRequest:
         }
 
 
+class MockThingDescription:
+    def json(self):
+        return {
+            "properties": {
+                name: {"type": "number"}
+                for name in [
+                    "o3",
+                    "no2",
+                    "pm25",
+                    "pm10",
+                    "humidity",
+                    "temperature",
+                    "latitude",
+                    "longitude",
+                ]
+            }
+        }
+
+
+# Serves the Thing Description and the properties of a mock AQM
+def mock_wot(url, **kwargs):
+    if url.endswith("/properties"):
+        return MockRequest()
+    return MockThingDescription()
+
+
 # Checks that environment variables are assigned correctly
 def test_attributes_set_correctly(mocker):
     # Arrange
@@ -114,7 +150,7 @@ def test_login(mocker):
 def test_request_header_from_wot_interface(mocker):
     # Arrange
     mocker.patch.object(Auth, "login")
-    request = mocker.patch("requests.get", return_value=MockRequest())
+    request = mocker.patch("requests.Session.get", side_effect=mock_wot)
 
     pod_provider = "http://example.com/"
     pod_username = "username"
@@ -151,9 +187,9 @@ def test_request_header_from_wot_interface(mocker):
     )
 
     request.assert_called_once_with(
-        f"{wot_url}:{wot_port}/properties",
+        f"{wot_url}:{wot_port}/",
         headers={"Content-Type": "application/json; charset=utf-8"},
-        timeout=None,
+        timeout=(5, 30),
     )
 
 
@@ -204,7 +240,7 @@ def test_error_request_header_from_wot_interface(mocker):
 def test_request_data_from_wot_interface(mocker):
     # Arrange
     mocker.patch.object(Auth, "login")
-    request = mocker.patch("requests.get", return_value=MockRequest())
+    request = mocker.patch("requests.Session.get", side_effect=mock_wot)
 
     pod_provider = "http://example.com/"
     pod_username = "username"
@@ -238,10 +274,10 @@ def test_request_data_from_wot_interface(mocker):
     # Assert
     assert data == "2022-03-21,11:19:47,1.0,2.0,3.0,4.0,5.0,6.0,7.0,8.0"
 
-    request.assert_called_once_with(
+    request.assert_called_with(
         f"{wot_url}:{wot_port}/properties",
         headers={"Content-Type": "application/json; charset=utf-8"},
-        timeout=None,
+        timeout=(5, 30),
     )
 
 
@@ -294,12 +330,10 @@ def test_request_loop(mocker):
     mocker.patch.object(Auth, "login")
     exists = mocker.patch.object(SolidAPI, "item_exists", return_value=True)
     create_folder = mocker.patch.object(SolidAPI, "create_folder", return_value=True)
-    put = mocker.patch.object(SolidAPI, "put_file", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
     get = mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
-    request = mocker.patch("requests.get", return_value=MockRequest())
-    mocker.patch.object(
-        SolidPodUpdaterCSV, "set_schedule", side_effect=InterruptedError
-    )
+    request = mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch("time.sleep", side_effect=InterruptedError)
 
     # Act
     pod_provider = "http://example.com/"
@@ -338,7 +372,8 @@ def test_request_loop(mocker):
     exists.assert_called()
     create_folder.assert_not_called()
     put.assert_called()
-    get.assert_called()
+    # The day's CSV file is never downloaded
+    get.assert_not_called()
 
 
 # Checks that a folder is created in the Solid Pod and data is correctly retrieved and stored there
@@ -348,12 +383,10 @@ def test_request_loop_no_files_yet_exist(mocker):
     mocker.patch.object(Auth, "login")
     exists = mocker.patch.object(SolidAPI, "item_exists", return_value=False)
     create_folder = mocker.patch.object(SolidAPI, "create_folder", return_value=True)
-    put = mocker.patch.object(SolidAPI, "put_file", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
     get = mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
-    request = mocker.patch("requests.get", return_value=MockRequest())
-    mocker.patch.object(
-        SolidPodUpdaterCSV, "set_schedule", side_effect=InterruptedError
-    )
+    request = mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch("time.sleep", side_effect=InterruptedError)
 
     pod_provider = "http://example.com/"
     pod_username = "username"
@@ -392,7 +425,8 @@ def test_request_loop_no_files_yet_exist(mocker):
     exists.assert_called()
     create_folder.assert_called()
     put.assert_called()
-    get.assert_called()
+    # The day's CSV file is never downloaded
+    get.assert_not_called()
 
 
 # Checks exception handling if unable to check if Solid Pod folder exists
@@ -481,18 +515,11 @@ def test_error_csv_exists(mocker):
         csv_unavailable.assert_called_once()
 
 
-# Checks that the file hashing schedule is set correctly
-@freezegun.freeze_time("2022-03-21 11:19:47.949456")
-def test_hash_schedule(mocker):
+# Checks that the day's CSV file is sealed from its running hash at midnight
+def test_roll_over_day_seals_file(mocker):
     # Arrange
     mocker.patch.object(Auth, "login")
-    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
-    mocker.patch.object(SolidAPI, "put_file", return_value=True)
-    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
-    mocker.patch("requests.get", return_value=MockRequest())
-    mocker.patch.object(
-        SolidPodUpdaterCSV, "set_schedule", side_effect=InterruptedError
-    )
+    anchor = mocker.patch.object(SolidPodUpdaterCSV, "anchor_hash")
 
     pod_provider = "http://example.com/"
     pod_username = "username"
@@ -506,7 +533,6 @@ def test_hash_schedule(mocker):
     retry_time = 30
     hash_time = "23:59:59"
 
-    # Act
     updater = SolidPodUpdaterCSV(
         pod_provider=pod_provider,
         pod_username=pod_username,
@@ -521,41 +547,35 @@ def test_hash_schedule(mocker):
         hash_time=hash_time,
     )
 
-    try:
-        updater.start()
-    except InterruptedError:
-        pass
-
-    current_date = date.today()
-
-    # Remove milliseconds as max precision of scheduler is seconds
-    hash_time = datetime.strptime(updater.hash_time, "%H:%M:%S").time()
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    csv_header = "date,time,o3"
+    expected_data = b"date,time,o3\n2022-03-21,23:59:30,1.0"
 
-    scheduled_job_date_time = datetime.combine(current_date, hash_time)
+    # Act
+    with freezegun.freeze_time("2022-03-21 23:59:30") as frozen_date_time:
+        updater.roll_over_day(aqm_folder_url, csv_header)
+        updater.journal.append("2022-03-21,23:59:30,1.0")
+        anchor.assert_not_called()
+        frozen_date_time.move_to("2022-03-22 00:00:00")
+        updater.roll_over_day(aqm_folder_url, csv_header)
 
     # Assert
-    assert every().day.at(updater.hash_time).do(updater.hash_file)
-    assert (
-        every().day.at(updater.hash_time).do(updater.hash_file).next_run
-        == scheduled_job_date_time
-    )
+    anchor.assert_called_once_with(hashlib.sha256(expected_data).hexdigest())
+    assert updater.journal.file_name == "2022-03-22.csv"
+    assert updater.journal.content() == csv_header.encode()
+    assert os.listdir("journal") == ["2022-03-22.csv"]
 
-    schedule.clear()
 
-
-# Checks that the file hashing is executed at the user set time
-@freezegun.freeze_time("2022-03-21 11:19:47.949456")
-def test_hash_execution(mocker):
+# Checks that a day left unsealed by a restart is uploaded and sealed
+@freezegun.freeze_time("2022-03-22 00:05:00")
+def test_unsealed_day_after_restart(mocker):
     # Arrange
     mocker.patch.object(Auth, "login")
-    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
-    mocker.patch.object(SolidAPI, "put_file", return_value=True)
+    mocker.patch.object(SolidAPI, "head", return_value=MockRequest())
     mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
-    mocker.patch("requests.get", return_value=MockRequest())
-    mocker.patch.object(
-        SolidPodUpdaterCSV, "set_schedule", side_effect=InterruptedError
-    )
-    hash = mocker.patch.object(SolidPodUpdaterCSV, "hash_file")
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    anchor = mocker.patch.object(SolidPodUpdaterCSV, "anchor_hash")
 
     pod_provider = "http://example.com/"
     pod_username = "username"
@@ -569,7 +589,6 @@ def test_hash_execution(mocker):
     retry_time = 30
     hash_time = "23:59:59"
 
-    # Act
     updater = SolidPodUpdaterCSV(
         pod_provider=pod_provider,
         pod_username=pod_username,
@@ -584,12 +603,673 @@ def test_hash_execution(mocker):
         hash_time=hash_time,
     )
 
-    schedule.every().day.at(hash_time).do(hash)
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    unsealed_data = b"date,time,o3\n2022-03-21,23:59:30,1.0"
+    os.makedirs("journal")
+    open("journal/2022-03-21.csv", "wb").write(unsealed_data)
+
+    # Act
+    updater.roll_over_day(aqm_folder_url, "date,time,o3")
+
+    # Assert
+    put.assert_any_call(f"{aqm_folder_url}2022-03-21.csv", unsealed_data, "text/csv")
+    anchor.assert_called_once_with(hashlib.sha256(unsealed_data).hexdigest())
+    assert os.listdir("journal") == ["2022-03-22.csv"]
+
+
+# Checks that a day whose last upload failed keeps its journal, and is only
+# sealed once it is uploaded
+def test_roll_over_day_pod_unreachable(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", side_effect=Exception)
+    anchor = mocker.patch.object(SolidPodUpdaterCSV, "anchor_hash")
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    csv_header = "date,time,o3"
+    expected_data = b"date,time,o3\n2022-03-21,23:59:30,1.0"
+    mocker.patch.object(
+        updater,
+        "request_data_from_wot_interface",
+        return_value="2022-03-21,23:59:30,1.0",
+    )
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 23:59:30") as frozen_date_time:
+        updater.poll(aqm_folder_url, csv_header)
+        frozen_date_time.move_to("2022-03-22 00:00:00")
+        updater.roll_over_day(aqm_folder_url, csv_header)
+        kept = sorted(os.listdir("journal"))
+        anchor.assert_not_called()
+
+        put.side_effect = None
+        put.return_value = MockRequest()
+        retry = updater.pending_seals["2022-03-21.csv"]
+        retry.func(*retry.args)
+
+    # Assert
+    assert kept == ["2022-03-21.csv", "2022-03-22.csv"]
+    put.assert_called_with(aqm_folder_url + "2022-03-21.csv", expected_data, "text/csv")
+    anchor.assert_called_once_with(hashlib.sha256(expected_data).hexdigest())
+    assert os.listdir("journal") == ["2022-03-22.csv"]
+    assert updater.pending_uploads == {}
+
+
+# Checks that a restart while the Solid Pod is unreachable keeps polling into the
+# journal, and reconciles it with the Solid Pod file before uploading it
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_resume_journal_pod_unreachable(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    head = mocker.patch.object(SolidAPI, "head", side_effect=Exception)
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    sleep = mocker.patch("time.sleep")
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    os.makedirs("journal")
+    open("journal/2022-03-21.csv", "wb").write(b"date,time,o3\n2022-03-21,11:18:47,1.0")
+    mocker.patch.object(
+        updater,
+        "request_data_from_wot_interface",
+        side_effect=["2022-03-21,11:19:47,2.0", "2022-03-21,11:20:47,3.0"],
+    )
+
+    # Act
+    updater.poll(aqm_folder_url, "date,time,o3")
+    uploads = put.call_count
+
+    head.side_effect = None
+    head.return_value = MockRequest()
+    updater.poll(aqm_folder_url, "date,time,o3")
+
+    # Assert
+    sleep.assert_not_called()
+    assert uploads == 0
+    assert updater.reconcile_job is None
+    put.assert_called_once_with(
+        aqm_folder_url + "2022-03-21.csv",
+        b"date,time,o3\n2022-03-21,11:18:47,1.0"
+        b"\n2022-03-21,11:19:47,2.0\n2022-03-21,11:20:47,3.0",
+        "text/csv",
+    )
+
+
+# Checks that an unknown storage mode is rejected
+def test_invalid_storage_mode(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+
+    with pytest.raises(ValueError):
+        # Act
+        SolidPodUpdaterCSV(
+            pod_provider="http://example.com/",
+            pod_username="username",
+            pod_password="password",
+            pod_endpoint="http://pod.example.com/",
+            aqm_folder="aqm_folder",
+            aqm_name="aqm_name",
+            polling_frequency=60,
+            wot_url="http://127.0.0.1",
+            wot_port=8080,
+            retry_time=30,
+            hash_time="23:59:59",
+            storage_mode="compressed",
+        )
+
+
+# Checks that only the new AQM data is uploaded in segmented storage mode
+def test_write_segment(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    exists = mocker.patch.object(SolidAPI, "item_exists", return_value=False)
+    create_folder = mocker.patch.object(SolidAPI, "create_folder", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+        storage_mode="segmented",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    # The AQM folder was created when the updater started
+    updater.pod_cache.containers.add(aqm_folder_url)
+    first_reading = "2022-03-21,11:19:47,1.0,2.0"
+    second_reading = "2022-03-21,11:20:47,1.0,2.0"
+
+    # Act
+    first_url = updater.write_segment(aqm_folder_url, first_reading)
+    second_url = updater.write_segment(aqm_folder_url, second_reading)
+
+    # Assert
+    assert first_url == f"{aqm_folder_url}2022-03-21/11-19-47.csv"
+    assert second_url == f"{aqm_folder_url}2022-03-21/11-20-47.csv"
+    put.assert_any_call(first_url, first_reading.encode(), "text/csv")
+    put.assert_any_call(second_url, second_reading.encode(), "text/csv")
+    # The day's folder is only checked for the first segment
+    exists.assert_called_once_with(f"{aqm_folder_url}2022-03-21/")
+    create_folder.assert_called_once_with(f"{aqm_folder_url}2022-03-21/")
+
+
+# Checks that sealing reassembles the segments into the canonical daily CSV file
+def test_seal_segments(mocker):
+    # Arrange
+    class SegmentMock:
+        def __init__(self, name):
+            self.name = name
+
+    class SegmentFolderMock:
+        def __init__(self):
+            self.files = [
+                SegmentMock("11-20-47.csv"),
+                SegmentMock("manifest.csv"),
+                SegmentMock("11-19-47.csv"),
+            ]
+
+    class SegmentRequest:
+        def __init__(self, url):
+            self.text = f"2022-03-21,{url[-12:-4].replace('-', ':')},1.0"
+
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "read_folder", return_value=SegmentFolderMock())
+    mocker.patch.object(SolidAPI, "get", side_effect=SegmentRequest)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    anchor = mocker.patch.object(SolidPodUpdaterCSV, "anchor_hash")
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+        storage_mode="segmented",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+
+    # Act
+    file_url = updater.seal_segments(aqm_folder_url, "date,time,o3", "2022-03-21")
+
+    # Assert
+    assert file_url == f"{aqm_folder_url}2022-03-21.csv"
+    put.assert_any_call(
+        file_url,
+        b"date,time,o3\n2022-03-21,11:19:47,1.0\n2022-03-21,11:20:47,1.0",
+        "text/csv",
+    )
+    put.assert_any_call(
+        f"{aqm_folder_url}2022-03-21/manifest.csv",
+        b"segment,rows\n11-19-47.csv,1\n11-20-47.csv,1",
+        "text/csv",
+    )
+    anchor.assert_called_once_with(
+        hashlib.sha256(
+            b"date,time,o3\n2022-03-21,11:19:47,1.0\n2022-03-21,11:20:47,1.0"
+        ).hexdigest()
+    )
+
+
+# Checks that a day's segments are sealed once the day is over, including after a
+# restart that missed midnight
+def test_seal_past_days(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    seal = mocker.patch.object(SolidPodUpdaterCSV, "seal_segments")
+
+    def make_updater():
+        return SolidPodUpdaterCSV(
+            pod_provider="http://example.com/",
+            pod_username="username",
+            pod_password="password",
+            pod_endpoint="http://pod.example.com/",
+            aqm_folder="aqm_folder/",
+            aqm_name="aqm_name/",
+            polling_frequency=60,
+            wot_url="http://127.0.0.1",
+            wot_port=8080,
+            retry_time=30,
+            hash_time="23:59:59",
+            storage_mode="segmented",
+        )
+
+    updater = make_updater()
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    updater.write_segment(aqm_folder_url, "2022-03-21,23:59:47,1.0")
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 23:59:59"):
+        updater.seal_past_days(aqm_folder_url, "date,time,o3")
+    sealed_before_midnight = seal.call_count
+
+    # The updater is down at midnight and restarted the next day
+    with freezegun.freeze_time("2022-03-22 08:00:00"):
+        make_updater().seal_past_days(aqm_folder_url, "date,time,o3")
+
+    # Assert
+    assert sealed_before_midnight == 0
+    seal.assert_called_once_with(aqm_folder_url, "date,time,o3", "2022-03-21")
+
+
+# Checks that a failed upload is retried by the scheduler rather than blocking polling
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_upload_retry_scheduled(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", side_effect=Exception)
+    sleep = mocker.patch("time.sleep")
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+    )
+
+    file_url = "http://pod.example.com/aqm_folder/aqm_name/2022-03-21.csv"
+
+    # Act
+    uploaded = updater.upload_file(file_url, b"date,time")
+    updater.upload_file(file_url, b"date,time\n2022-03-21,11:19:47")
+
+    # Assert
+    assert not uploaded
+    sleep.assert_not_called()
+    put.assert_called()
+    # Only the latest failed upload of the file is retried
+    assert len(updater.pending_uploads) == 1
+    assert updater.scheduler.next_deadline() == datetime(2022, 3, 21, 11, 20, 17)
+
+
+# Checks that segmented readings are buffered and written as one segment
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_flush_after_readings(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+        storage_mode="segmented",
+        flush_readings=2,
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    mocker.patch.object(
+        updater,
+        "request_data_from_wot_interface",
+        side_effect=["2022-03-21,11:19:47,1.0", "2022-03-21,11:20:47,2.0"],
+    )
+
+    # Act
+    updater.poll_segment(aqm_folder_url, "date,time,o3")
+    buffered = list(updater.buffer.readings)
+    updater.poll_segment(aqm_folder_url, "date,time,o3")
+
+    # Assert
+    assert buffered == ["2022-03-21,11:19:47,1.0"]
+    put.assert_called_once()
+    assert put.call_args[0][0] == aqm_folder_url + "2022-03-21/11-19-47.csv"
+    assert updater.buffer.readings == []
+
+
+# Checks that a change of the AQM's properties seals the file and starts a new one
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_schema_change_starts_new_file(mocker):
+    # Arrange
+    properties = MockRequest().json()
+
+    class MockProperties:
+        def json(self):
+            return dict(properties)
+
+    class MockChangingThingDescription:
+        def json(self):
+            return {"properties": {name: {"type": "number"} for name in properties}}
+
+    mocker.patch.object(Auth, "login")
+    mocker.patch(
+        "requests.Session.get",
+        side_effect=lambda url, **kwargs: (
+            MockProperties()
+            if url.endswith("/properties")
+            else MockChangingThingDescription()
+        ),
+    )
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    anchor_hash = mocker.patch.object(SolidPodUpdaterCSV, "anchor_hash")
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    csv_header = updater.request_header_from_wot_interface()
+    updater.schedule_polling(aqm_folder_url, csv_header)
+    old_jobs = updater.jobs
+    updater.poll(aqm_folder_url, csv_header)
+
+    # Act
+    properties["co2"] = 9.0
+    updater.poll(aqm_folder_url, csv_header)
+    new_header = updater.jobs[0].args[1]
+    updater.poll(aqm_folder_url, new_header)
+
+    # Assert
+    anchor_hash.assert_called_once()
+    assert all(job.cancelled for job in old_jobs)
+    assert new_header == csv_header + ",co2"
+    assert updater.journal.file_name == "2022-03-21_1.csv"
+    assert updater.journal.content().startswith(new_header.encode())
+    assert updater.load_revision() == ("2022-03-21", 1)
+
+
+# Checks that a change of the AQM's properties found while the AQM stops
+# responding keeps the file and its jobs, and is retried at the next poll
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_schema_change_aqm_unreachable(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    anchor_hash = mocker.patch.object(SolidPodUpdaterCSV, "anchor_hash")
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+        storage_mode="segmented",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    csv_header = "date,time,o3"
+    mocker.patch.object(
+        updater, "request_data_from_wot_interface", side_effect=SchemaChanged
+    )
+    mocker.patch.object(
+        updater,
+        "request_header_from_wot_interface",
+        side_effect=[WoTUnavailable, csv_header + ",co2"],
+    )
+    updater.schedule_polling(aqm_folder_url, csv_header)
+    old_jobs = updater.jobs
+    mocker.patch.object(updater, "seal_segments")
+
+    # Act
+    updater.poll_segment(aqm_folder_url, csv_header)
+    kept = not any(job.cancelled for job in old_jobs)
+    updater.poll_segment(aqm_folder_url, csv_header)
 
     # Assert
-    with freezegun.freeze_time("2022-03-21 11:19:47.949456") as frozen_date_time:
-        schedule.run_pending()
-        hash.assert_not_called()
-        frozen_date_time.move_to(f"2022-03-21 {hash_time}")
-        schedule.run_pending()
-        hash.assert_called_once()
+    assert kept
+    updater.seal_segments.assert_called_once()
+    assert all(job.cancelled for job in old_jobs)
+    assert updater.jobs[0].args[1] == csv_header + ",co2"
+    anchor_hash.assert_not_called()
+
+
+# Checks that once the folders are known, each poll makes a single request to the Pod
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_steady_state_single_request(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    exists = mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    head = mocker.patch.object(SolidAPI, "head")
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+    )
+
+    updater.schedule_jobs()
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    csv_header = updater.jobs[0].args[1]
+    exists.reset_mock()
+
+    # Act
+    for _ in range(3):
+        updater.poll(aqm_folder_url, csv_header)
+
+    # Assert
+    assert put.call_count == 3
+    exists.assert_not_called()
+    head.assert_not_called()
+
+
+# Checks that the next day's CSV file is created shortly before midnight
+@freezegun.freeze_time("2022-03-21 23:55:00")
+def test_prepare_next_day(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "item_exists", return_value=False)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    updater.pod_cache.containers.add(aqm_folder_url)
+
+    # Act
+    updater.prepare_next_day(aqm_folder_url, "date,time,o3")
+
+    # Assert
+    put.assert_called_once_with(
+        f"{aqm_folder_url}2022-03-22.csv", b"date,time,o3", "text/csv"
+    )
+
+
+# Checks that the dated layout stores each day's file in its own partition,
+# creating the partition's folders on the way
+@freezegun.freeze_time("2022-03-21 23:55:00")
+def test_prepare_next_day_dated(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "item_exists", return_value=False)
+    create_folder = mocker.patch.object(SolidAPI, "create_folder")
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+        layout="dated",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    updater.pod_cache.containers.add(aqm_folder_url)
+
+    # Act
+    updater.prepare_next_day(aqm_folder_url, "date,time,o3")
+
+    # Assert
+    put.assert_called_once_with(
+        f"{aqm_folder_url}2022/03/22/2022-03-22.csv", b"date,time,o3", "text/csv"
+    )
+    assert [call.args[0] for call in create_folder.call_args_list] == [
+        f"{aqm_folder_url}2022/",
+        f"{aqm_folder_url}2022/03/",
+        f"{aqm_folder_url}2022/03/22/",
+    ]
+
+
+# Checks that an unknown layout is rejected
+def test_invalid_layout(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        SolidPodUpdaterCSV(
+            pod_provider="http://example.com/",
+            pod_username="username",
+            pod_password="password",
+            pod_endpoint="http://pod.example.com/",
+            aqm_folder="aqm_folder/",
+            aqm_name="aqm_name/",
+            polling_frequency=60,
+            wot_url="http://127.0.0.1",
+            wot_port=8080,
+            retry_time=30,
+            hash_time="23:59:59",
+            layout="monthly",
+        )
+
+
+# Checks that a sealed day is listed with its size and hash in the manifest of
+# its folder
+def test_seal_day_manifest(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidPodUpdaterCSV, "anchor_hash")
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+
+    updater = SolidPodUpdaterCSV(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        hash_time="23:59:59",
+        manifest_name="hashes.csv",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    updater.pod_cache.containers.add(aqm_folder_url)
+    expected_data = b"date,time,o3\n2022-03-21,23:59:30,1.0"
+    updater.journal.open_day("2022-03-21.csv", "date,time,o3")
+    updater.journal.append("2022-03-21,23:59:30,1.0")
+
+    # Act
+    updater.seal_day(aqm_folder_url)
+
+    # Assert
+    file_hash = hashlib.sha256(expected_data).hexdigest()
+    put.assert_called_once_with(
+        aqm_folder_url + "hashes.csv",
+        (
+            "file,size,sha256,anchor,proof\n"
+            f"2022-03-21.csv,{len(expected_data)},{file_hash},{file_hash},\n"
+        ).encode(),
+        "text/csv",
+    )
@@ -0,0 +1,213 @@
+import pytest
+from solid.auth import Auth
+from solid.solid_api import SolidAPI
+
+from scripts.solid_pod_updater_multi import SolidPodUpdaterMulti, parse_aqm_endpoints
+from scripts.wot_client import WoTUnavailable
+
+
+# Runs each test in its own folder, so journals and spilled readings are not shared
+@pytest.fixture(autouse=True)
+def run_in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+class MockRequest:
+    def json(self):
+        return [
+            {"title": "AQM 1", "href": "/things/aqm1"},
+            {"title": "AQM 2", "href": "/things/aqm2"},
+        ]
+
+
+# Checks that every AQM shares one login, Solid session and scheduler
+def test_shared_session(mocker):
+    # Arrange
+    login = mocker.patch.object(Auth, "login")
+
+    updater = SolidPodUpdaterMulti(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        retry_time=30,
+    )
+
+    # Act
+    for aqm_name in ["aqm1/", "aqm2/"]:
+        updater.add_aqm(
+            pod_endpoint="http://pod.example.com/",
+            aqm_folder="aqm_folder/",
+            aqm_name=aqm_name,
+            polling_frequency=60,
+            wot_url="http://127.0.0.1",
+            wot_port=8080,
+            hash_time="23:59:59",
+            journal_folder=f"journal/{aqm_name}",
+        )
+
+    # Assert
+    login.assert_called_once_with("http://example.com/", "username", "password")
+    assert len(updater.updaters) == 2
+    assert all(aqm.api is updater.api for aqm in updater.updaters)
+    assert all(aqm.scheduler is updater.scheduler for aqm in updater.updaters)
+
+
+# Checks that the jobs of every AQM are scheduled before the shared loop runs
+def test_start(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("time.sleep", side_effect=InterruptedError)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    mocker.patch(
+        "scripts.solid_pod_updater_csv.SolidPodUpdaterCSV.request_header_from_wot_interface",
+        return_value="date,time,o3",
+    )
+
+    updater = SolidPodUpdaterMulti(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        retry_time=30,
+    )
+
+    for aqm_name in ["aqm1/", "aqm2/"]:
+        updater.add_aqm(
+            pod_endpoint="http://pod.example.com/",
+            aqm_folder="aqm_folder/",
+            aqm_name=aqm_name,
+            polling_frequency=60,
+            wot_url="http://127.0.0.1",
+            wot_port=8080,
+            hash_time="23:59:59",
+            storage_mode="segmented",
+        )
+
+    run = mocker.patch.object(updater.scheduler, "run")
+
+    # Act
+    updater.start()
+
+    # Assert
+    run.assert_called_once()
+    # A polling, a preparation job and two sealing jobs (at startup and at
+    # midnight) for each AQM
+    assert len(updater.scheduler.jobs) == 8
+
+
+# Checks that an AQM that does not respond is polled again later, without holding
+# up the others
+def test_start_unreachable(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    mocker.patch(
+        "scripts.solid_pod_updater_csv.SolidPodUpdaterCSV.request_header_from_wot_interface",
+        side_effect=[WoTUnavailable(), "date,time,o3"],
+    )
+
+    updater = SolidPodUpdaterMulti(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        retry_time=30,
+    )
+
+    for aqm_name in ["aqm1/", "aqm2/"]:
+        updater.add_aqm(
+            pod_endpoint="http://pod.example.com/",
+            aqm_folder="aqm_folder/",
+            aqm_name=aqm_name,
+            polling_frequency=60,
+            wot_url="http://127.0.0.1",
+            wot_port=8080,
+            hash_time="23:59:59",
+            storage_mode="segmented",
+        )
+
+    mocker.patch.object(updater.scheduler, "run")
+
+    # Act
+    updater.start()
+
+    # Assert
+    funcs = [job.func for _, _, job in updater.scheduler.jobs]
+    # The second AQM is polled, and the first tried again
+    assert funcs.count(updater.updaters[1].poll_segment) == 1
+    assert updater.updaters[0].start_polling in funcs
+    assert updater.updaters[0].poll_segment not in funcs
+
+
+# Checks that a poll of an AQM that does not respond is skipped
+def test_poll_unreachable(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    request = mocker.patch(
+        "requests.Session.get", side_effect=ConnectionError("unreachable")
+    )
+
+    updater = SolidPodUpdaterMulti(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        retry_time=30,
+    )
+    aqm = updater.add_aqm(
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm1/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        hash_time="23:59:59",
+        storage_mode="segmented",
+    )
+    buffer_reading = mocker.patch.object(aqm, "buffer_reading")
+
+    # Act
+    aqm.poll_segment("http://pod.example.com/aqm_folder/aqm1/", "date,time,o3")
+    aqm.poll_segment("http://pod.example.com/aqm_folder/aqm1/", "date,time,o3")
+
+    # Assert
+    buffer_reading.assert_not_called()
+    # The second poll falls within the back-off, so the AQM is not requested
+    request.assert_called_once()
+
+
+# Checks that AQMs are discovered from a WebThings Gateway
+def test_request_things_from_wot_interface(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    request = mocker.patch("requests.Session.get", return_value=MockRequest())
+
+    updater = SolidPodUpdaterMulti(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        retry_time=30,
+    )
+
+    # Act
+    things = updater.request_things_from_wot_interface("http://127.0.0.1", 8080)
+
+    # Assert
+    assert things == [
+        ("aqm1", "http://127.0.0.1", 8080, "/things/aqm1"),
+        ("aqm2", "http://127.0.0.1", 8080, "/things/aqm2"),
+    ]
+    request.assert_called_once_with(
+        "http://127.0.0.1:8080/things",
+        headers={"Content-Type": "application/json; charset=utf-8"},
+        timeout=(5, 30),
+    )
+
+
+# Checks that a list of AQM endpoints is parsed
+def test_parse_aqm_endpoints():
+    # Act
+    aqms = parse_aqm_endpoints("aqm1=http://10.0.0.5:8080, aqm2=http://10.0.0.6:8081")
+
+    # Assert
+    assert aqms == [
+        ("aqm1", "http://10.0.0.5", "8080", ""),
+        ("aqm2", "http://10.0.0.6", "8081", ""),
+    ]
@@ -1,21 +1,40 @@
+import asyncio
 import datetime
+import hashlib
+import json
 import os
+import threading
+import time
 import turtle
 
 TEST_DIR = os.path.dirname(os.path.abspath(__file__))
 SRC_DIR = os.path.abspath(os.path.join(TEST_DIR, "../"))
 
 import freezegun
+import pytest
 from solid.auth import Auth
 from solid.solid_api import SolidAPI
 from datetime import datetime, timedelta
 
+from rdflib import Graph
+
+from scripts.merkle import proof_root
+from scripts.pod_manifest import manifest_anchor, parse_manifest
+from scripts.scheduler import DeadlineScheduler
 from scripts.solid_pod_updater_ttl import SolidPodUpdaterTTL
+from scripts.turtle_serializer import canonical_hash
+
+
+# Runs each test in its own folder, so spilled readings and local files are not shared
+@pytest.fixture(autouse=True)
+def run_in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
 
 
 class MockRequest:
     def __init__(self):
         self.text = ""
+        self.headers = {}
 
     def json(self):
         return {
@@ -30,6 +49,32 @@ class MockRequest:
         }
 
 
+class MockThingDescription:
+    def json(self):
+        return {
+            "properties": {
+                name: {"type": "number"}
+                for name in [
+                    "o3",
+                    "no2",
+                    "pm25",
+                    "pm10",
+                    "humidity",
+                    "temperature",
+                    "latitude",
+                    "longitude",
+                ]
+            }
+        }
+
+
+# Serves the Thing Description and the properties of a mock AQM
+def mock_wot(url, **kwargs):
+    if url.endswith("/properties"):
+        return MockRequest()
+    return MockThingDescription()
+
+
 # Checks that environment variables are assigned
 def test_attributes_set_correctly(mocker):
     # Arrange
@@ -109,7 +154,7 @@ def test_login(mocker):
 def test_request_header_from_wot_interface(mocker):
     # Arrange
     mocker.patch.object(Auth, "login")
-    request = mocker.patch("requests.get", return_value=MockRequest())
+    request = mocker.patch("requests.Session.get", side_effect=mock_wot)
 
     pod_provider = "http://example.com/"
     pod_username = "username"
@@ -142,9 +187,9 @@ def test_request_header_from_wot_interface(mocker):
     assert header == "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude"
 
     request.assert_called_once_with(
-        f"{wot_url}:{wot_port}/properties",
+        f"{wot_url}:{wot_port}/",
         headers={"Content-Type": "application/json; charset=utf-8"},
-        timeout=None,
+        timeout=(5, 30),
     )
 
 
@@ -192,7 +237,7 @@ def test_error_request_header_from_wot_interface(mocker):
 def test_request_data_from_wot_interface(mocker):
     # Arrange
     mocker.patch.object(Auth, "login")
-    request = mocker.patch("requests.get", return_value=MockRequest())
+    request = mocker.patch("requests.Session.get", side_effect=mock_wot)
 
     pod_provider = "http://example.com/"
     pod_username = "username"
@@ -222,12 +267,12 @@ def test_request_data_from_wot_interface(mocker):
     data = updater.request_data_from_wot_interface()
 
     # Assert
-    assert data == "1.0,2.0,3.0,4.0,5.0,6.0,7.0,8.0"
+    assert data == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0]
 
-    request.assert_called_once_with(
+    request.assert_called_with(
         f"{wot_url}:{wot_port}/properties",
         headers={"Content-Type": "application/json; charset=utf-8"},
-        timeout=None,
+        timeout=(5, 30),
     )
 
 
@@ -278,8 +323,8 @@ def test_request_loop(mocker):
     mocker.patch("time.sleep", side_effect=InterruptedError)
     exists = mocker.patch.object(SolidAPI, "item_exists", return_value=True)
     create_folder = mocker.patch.object(SolidAPI, "create_folder", return_value=True)
-    put = mocker.patch.object(SolidAPI, "put_file", return_value=True)
-    request = mocker.patch("requests.get", return_value=MockRequest())
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    request = mocker.patch("requests.Session.get", side_effect=mock_wot)
 
     pod_provider = "http://example.com/"
     pod_username = "username"
@@ -325,8 +370,8 @@ def test_request_loop_no_files_yet_exist(mocker):
     mocker.patch("time.sleep", side_effect=InterruptedError)
     exists = mocker.patch.object(SolidAPI, "item_exists", return_value=False)
     create_folder = mocker.patch.object(SolidAPI, "create_folder", return_value=True)
-    put = mocker.patch.object(SolidAPI, "put_file", return_value=True)
-    request = mocker.patch("requests.get", return_value=MockRequest())
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    request = mocker.patch("requests.Session.get", side_effect=mock_wot)
 
     pod_provider = "http://example.com/"
     pod_username = "username"
@@ -427,26 +472,15 @@ def test_generate_turtle_rdf():
     )
 
     expected_output = [
-        b"@prefix ns1: <http://www.w3.org/ns/ssn/>",
-        b"prefix xsd: <http://www.w3.org/2001/XMLSchema#>",
-        b'ns1:resultTime "2022-03-21T11:19:47.949456"^^xsd:dateTime',
-        b'ns1:Sensor "no2"',
-        b"ns1:hasSimpleResult 2e+00",
-        b'ns1:Sensor "pm10"',
-        b"ns1:hasSimpleResult 4e+00",
-        b'ns1:Sensor "temperature"',
-        b"ns1:hasSimpleResult 6e+00",
-        b'ns1:Sensor "o3"',
-        b"ns1:hasSimpleResult 1e+00",
-        b'ns1:Sensor "latitude"',
-        b"ns1:hasSimpleResult 7e+00",
-        b'ns1:Sensor "longitude"',
-        b"ns1:hasSimpleResult 8e+00",
-        b'ns1:Sensor "humidity"',
-        b"ns1:hasSimpleResult 5e+00",
-        b'ns1:Sensor "pm25"',
-        b"ns1:hasSimpleResult 3e+00",
+        b"@prefix sosa: <http://www.w3.org/ns/ssn/>",
+        b"@prefix xsd: <http://www.w3.org/2001/XMLSchema#>",
+        b'sosa:resultTime "2022-03-21T11:19:47.949456"^^xsd:dateTime',
     ]
+    for sensor_name, sensor_data in zip(headers, data):
+        expected_output.append(
+            f'[] sosa:Sensor "{sensor_name}" ;\n'
+            f"    sosa:hasSimpleResult {sensor_data}e0 .".encode()
+        )
 
     # Assert
     for elem in expected_output:
@@ -461,10 +495,10 @@ def test_hash_execution(mocker):
     mocker.patch("time.sleep", side_effect=InterruptedError)
     mocker.patch.object(SolidAPI, "item_exists", return_value=True)
     mocker.patch.object(SolidAPI, "create_folder", return_value=True)
-    mocker.patch.object(SolidAPI, "put_file", return_value=True)
+    mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
     mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
-    mocker.patch("requests.get", return_value=MockRequest())
-    hash = mocker.patch.object(SolidPodUpdaterTTL, "hash_file")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    hash = mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
 
     pod_provider = "http://example.com/"
     pod_username = "username"
@@ -501,3 +535,1025 @@ def test_hash_execution(mocker):
         hash.assert_called_once()
         frozen_date_time.move_to(datetime.now() + timedelta(seconds=polling_frequency))
         hash.assert_called_once()
+
+
+# Checks that readings are buffered and stored together in a single TTL file
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_flush_after_readings(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        flush_readings=3,
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 11:19:47") as frozen_date_time:
+        for _ in range(3):
+            updater.poll(aqm_folder_url, header)
+            frozen_date_time.tick(60)
+
+    # Assert
+    put.assert_called_once()
+    assert put.call_args[0][0] == aqm_folder_url + "2022-03-21 11:19:47.ttl"
+    assert b'"2022-03-21T11:21:47"^^xsd:dateTime' in put.call_args[0][1]
+    assert updater.buffer.readings == []
+
+
+# Checks that buffered readings are flushed once the flush interval has passed
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_flush_interval(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        flush_readings=10,
+        flush_interval=300,
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    updater.poll(aqm_folder_url, header)
+
+    # Assert
+    put.assert_not_called()
+    assert updater.scheduler.next_deadline() == datetime(2022, 3, 21, 11, 24, 47)
+
+    with freezegun.freeze_time("2022-03-21 11:24:47"):
+        updater.scheduler.run_pending()
+
+    put.assert_called_once()
+    assert updater.buffer.readings == []
+
+
+# Checks that readings spilled before a restart start the flush timer once polling
+# resumes, rather than waiting for the buffer to fill
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_flush_interval_after_restart(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    os.makedirs("spill")
+    with open(os.path.join("spill", "aqm_name-ttl.jsonl"), "w") as spill:
+        spill.write(json.dumps(["2022-03-21T11:00:00", "1.0,2.0"]) + "\n")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        flush_readings=10,
+        flush_interval=300,
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    updater.poll(aqm_folder_url, header)
+
+    # Assert
+    put.assert_not_called()
+    assert len(updater.buffer.readings) == 2
+    assert updater.scheduler.next_deadline() == datetime(2022, 3, 21, 11, 24, 47)
+
+    with freezegun.freeze_time("2022-03-21 11:24:47"):
+        updater.scheduler.run_pending()
+
+    put.assert_called_once()
+    assert updater.buffer.readings == []
+
+
+# Checks that readings which failed to upload are kept and retried
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_flush_retry(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    mocker.patch.object(SolidAPI, "put_file", side_effect=Exception)
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    updater.poll(aqm_folder_url, header)
+
+    # Assert
+    assert len(updater.buffer.readings) == 1
+    assert updater.scheduler.next_deadline() == datetime(2022, 3, 21, 11, 20, 17)
+    assert os.path.exists(os.path.join("spill", "aqm_name-ttl.jsonl"))
+
+
+# Checks the Turtle formatting of several readings
+def test_generate_turtle_rdf_batch():
+    # Arrange
+    headers = ["o3", "no2"]
+    readings = [
+        (datetime(2022, 3, 21, 11, 19, 47), ["1.0", "2.0"]),
+        (datetime(2022, 3, 21, 11, 20, 47), ["3.0", "4.0"]),
+    ]
+
+    # Act
+    turtle_output = SolidPodUpdaterTTL.generate_turtle_rdf_batch(readings, headers)
+
+    # Assert
+    assert turtle_output.count(b"a sosa:Observation") == 2
+    assert b'"2022-03-21T11:19:47"^^xsd:dateTime' in turtle_output
+    assert b'"2022-03-21T11:20:47"^^xsd:dateTime' in turtle_output
+    assert b'sosa:hasSimpleResult "4.0"' in turtle_output
+
+
+# Checks that an unknown engine is rejected
+def test_invalid_engine(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        SolidPodUpdaterTTL(
+            pod_provider="http://example.com/",
+            pod_username="username",
+            pod_password="password",
+            pod_endpoint="http://pod.example.com/",
+            aqm_folder="aqm_folder/",
+            aqm_name="aqm_name/",
+            polling_frequency=60,
+            wot_url="http://127.0.0.1",
+            wot_port=8080,
+            retry_time=30,
+            engine="threads",
+        )
+
+
+# Checks that the pipeline uploads and anchors readings while sampling on schedule
+def test_pipeline(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    request = mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    # A slow transaction must not hold up sampling
+    hash = mocker.patch.object(
+        SolidPodUpdaterTTL,
+        "store_hash",
+        side_effect=lambda file: threading.Event().wait(0.5),
+    )
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=0.01,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        engine="pipeline",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    try:
+        asyncio.run(asyncio.wait_for(updater.run_pipeline(aqm_folder_url, header), 0.3))
+    except asyncio.TimeoutError:
+        pass
+
+    # Assert
+    assert request.call_count > 5
+    assert put.call_count > 5
+    hash.assert_called_once()
+
+
+# Checks that the pipeline creates the folders once the Solid Pod is reachable,
+# without the scheduler it does not run
+def test_pipeline_folders_unreachable(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    # Uploads are left out, so only the folder stage checks the folders
+    mocker.patch.object(SolidPodUpdaterTTL, "put_file", return_value=True)
+    mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+    exists = mocker.patch.object(
+        SolidAPI, "item_exists", side_effect=[Exception, False, False]
+    )
+    create_folder = mocker.patch.object(SolidAPI, "create_folder")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=0.01,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=0.05,
+        engine="pipeline",
+    )
+
+    aqms_folder_url = "http://pod.example.com/aqm_folder/"
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    try:
+        asyncio.run(
+            asyncio.wait_for(
+                updater.run_pipeline(aqm_folder_url, header, aqms_folder_url), 0.3
+            )
+        )
+    except asyncio.TimeoutError:
+        pass
+
+    # Assert
+    assert exists.call_count == 3
+    assert create_folder.call_count == 2
+    assert updater.scheduler.next_deadline() is None
+
+
+# Checks that sampling carries on while uploads are held up
+def test_pipeline_backpressure(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    request = mocker.patch("requests.Session.get", side_effect=mock_wot)
+    # The first upload hangs, so the queue behind it fills up
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(
+        SolidAPI,
+        "put_file",
+        side_effect=lambda *args: threading.Event().wait(0.5),
+    )
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=0.01,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        engine="pipeline",
+        queue_depth=1,
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    try:
+        asyncio.run(asyncio.wait_for(updater.run_pipeline(aqm_folder_url, header), 0.3))
+    except asyncio.TimeoutError:
+        pass
+
+    # Assert
+    assert request.call_count > 5
+    put.assert_called_once()
+    # Readings not yet uploaded are kept in the spill file, to be queued together
+    # once the upload queue has room
+    assert len(updater.buffer.readings) > 5
+    assert updater.upload_queue.full()
+
+
+# Checks that a change of the AQM's properties flushes the readings and polls with
+# a new header
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_schema_change(mocker):
+    # Arrange
+    properties = MockRequest().json()
+
+    class MockProperties:
+        def json(self):
+            return dict(properties)
+
+    class MockChangingThingDescription:
+        def json(self):
+            return {"properties": {name: {"type": "number"} for name in properties}}
+
+    mocker.patch.object(Auth, "login")
+    mocker.patch(
+        "requests.Session.get",
+        side_effect=lambda url, **kwargs: (
+            MockProperties()
+            if url.endswith("/properties")
+            else MockChangingThingDescription()
+        ),
+    )
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        flush_readings=10,
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = updater.request_header_from_wot_interface().split(",")
+    updater.poll(aqm_folder_url, header)
+
+    # Act
+    properties["co2"] = 9.0
+    updater.poll(aqm_folder_url, header)
+
+    # Assert
+    put.assert_called_once()
+    assert b"co2" not in put.call_args[0][1]
+    assert updater.buffer.readings == []
+    assert updater.poll_job.args[1] == header + ["co2"]
+
+
+# Checks that readings within a window are stored in one TTL file, which is only
+# hashed once the window has ended
+def test_window(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    hash = mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        window="hour",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 11:58:47") as frozen_date_time:
+        for _ in range(3):
+            updater.poll(aqm_folder_url, header)
+            frozen_date_time.tick(60)
+
+    # Assert
+    assert [call[0][0] for call in put.call_args_list] == [
+        aqm_folder_url + "2022-03-21T11.ttl",
+        aqm_folder_url + "2022-03-21T11.ttl",
+        aqm_folder_url + "2022-03-21T12.ttl",
+    ]
+    assert put.call_args_list[1][0][1].count(b"a sosa:Observation") == 2
+    assert put.call_args_list[2][0][1].count(b"a sosa:Observation") == 1
+    hash.assert_called_once()
+    assert len(updater.window_buffer.readings) == 1
+
+
+# Checks that a window is sealed when it ends, even without a new reading
+def test_close_window(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    hash = mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        flush_readings=10,
+        window="day",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    with freezegun.freeze_time("2022-03-21 23:59:00"):
+        updater.poll_job = updater.scheduler.every(
+            60, updater.poll, aqm_folder_url, header
+        )
+        updater.poll(aqm_folder_url, header)
+
+    # Act
+    with freezegun.freeze_time("2022-03-22 00:00:00"):
+        updater.close_window(aqm_folder_url)
+
+    # Assert
+    hash.assert_called_once()
+    assert updater.buffer.readings == []
+    assert updater.window_buffer.readings == []
+    assert not os.path.exists("2022-03-21.ttl")
+
+
+# Checks that windows are rejected by the pipeline engine
+def test_window_pipeline(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        SolidPodUpdaterTTL(
+            pod_provider="http://example.com/",
+            pod_username="username",
+            pod_password="password",
+            pod_endpoint="http://pod.example.com/",
+            aqm_folder="aqm_folder/",
+            aqm_name="aqm_name/",
+            polling_frequency=60,
+            wot_url="http://127.0.0.1",
+            wot_port=8080,
+            retry_time=30,
+            engine="pipeline",
+            window="hour",
+        )
+
+
+# Checks that readings are appended to a window with SPARQL updates, and that the
+# canonical hash of the window is stored once it ends
+def test_window_patch(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    patch = mocker.patch.object(SolidAPI, "patch_file", return_value=True)
+    get = mocker.patch.object(SolidAPI, "get")
+    store = mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        window="hour",
+        window_write="patch",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    file_url = aqm_folder_url + "2022-03-21T11.ttl"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    with freezegun.freeze_time("2022-03-21 11:58:47") as frozen_date_time:
+        for _ in range(2):
+            updater.poll(aqm_folder_url, header)
+            frozen_date_time.tick(60)
+
+    # The Solid server holds the same triples, serialized its own way
+    _, turtle_data = updater.build_window_file(
+        aqm_folder_url, updater.window_buffer.readings
+    )
+    get.return_value.content = (
+        Graph()
+        .parse(data=turtle_data, format="turtle", publicID=file_url)
+        .serialize(format="turtle")
+    )
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 12:00:47"):
+        updater.poll(aqm_folder_url, header)
+
+    # Assert
+    assert [call[0][0] for call in patch.call_args_list] == [
+        file_url,
+        file_url,
+        aqm_folder_url + "2022-03-21T12.ttl",
+    ]
+    assert patch.call_args[0][1].count(b"a sosa:Observation") == 1
+    assert patch.call_args[0][2] == "application/sparql-update"
+    put.assert_not_called()
+    get.assert_called_once_with(file_url)
+    store.assert_called_once_with(canonical_hash(turtle_data, file_url))
+
+
+# Checks that a window which does not hold exactly its readings is replaced
+# before its hash is stored
+def test_window_patch_repair(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "patch_file", return_value=True)
+    get = mocker.patch.object(SolidAPI, "get")
+    store = mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        window="hour",
+        window_write="patch",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    file_url = aqm_folder_url + "2022-03-21T11.ttl"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    with freezegun.freeze_time("2022-03-21 11:59:47"):
+        updater.poll(aqm_folder_url, header)
+
+    # The update was applied twice, duplicating its blank nodes
+    _, turtle_data = updater.build_window_file(
+        aqm_folder_url, updater.window_buffer.readings
+    )
+    get.return_value.content = turtle_data + turtle_data.split(b"\n\n", 1)[1]
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 12:00:47"):
+        updater.poll(aqm_folder_url, header)
+
+    # Assert
+    put.assert_called_once_with(file_url, turtle_data, "text/turtle")
+    store.assert_called_once_with(canonical_hash(turtle_data, file_url))
+
+
+# Checks that file hashes are anchored together by a Merkle root, with a proof
+# stored next to each file
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_anchor_batch(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    store = mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        anchor_batch=3,
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 11:19:47") as frozen_date_time:
+        for _ in range(3):
+            updater.poll(aqm_folder_url, header)
+            frozen_date_time.tick(60)
+
+    # Assert
+    store.assert_called_once()
+    root = store.call_args[0][0]
+
+    proofs = [call[0] for call in put.call_args_list if call[0][0].endswith(".json")]
+    assert [proof[0] for proof in proofs] == [
+        aqm_folder_url + "2022-03-21 11:19:47.ttl.proof.json",
+        aqm_folder_url + "2022-03-21 11:20:47.ttl.proof.json",
+        aqm_folder_url + "2022-03-21 11:21:47.ttl.proof.json",
+    ]
+    for _, content, content_type in proofs:
+        proof = json.loads(content)
+        assert proof["root"] == root
+        assert proof_root(proof["file_hash"], proof["proof"]) == root
+        assert content_type == "application/json"
+    assert updater.hash_batch.readings == []
+
+
+# Checks that a batch of file hashes is anchored once the anchor interval has
+# passed, and retried if anchoring fails
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_anchor_interval(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    store = mocker.patch.object(
+        SolidPodUpdaterTTL, "store_hash", side_effect=[Exception, None]
+    )
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        anchor_batch=100,
+        anchor_interval=600,
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    updater.poll(aqm_folder_url, header)
+
+    # Assert
+    store.assert_not_called()
+    assert updater.scheduler.next_deadline() == datetime(2022, 3, 21, 11, 29, 47)
+
+    with freezegun.freeze_time("2022-03-21 11:29:47"):
+        updater.scheduler.run_pending()
+
+    assert store.call_count == 1
+    assert len(updater.hash_batch.readings) == 1
+    assert updater.scheduler.next_deadline() == datetime(2022, 3, 21, 11, 30, 17)
+
+    with freezegun.freeze_time("2022-03-21 11:30:17"):
+        updater.scheduler.run_pending()
+
+    assert store.call_count == 2
+    assert updater.hash_batch.readings == []
+
+
+# Checks that a batch of file hashes spilled before a restart is anchored once the
+# anchor interval has passed, even if no more files are stored
+def test_anchor_interval_after_restart(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    store = mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+    mocker.patch.object(DeadlineScheduler, "run")
+
+    os.makedirs("spill")
+    with open(os.path.join("spill", "aqm_name-anchor.jsonl"), "w") as spill:
+        entry = ["http://pod.example.com/a.ttl", "aa" * 32, "2022-03-21T11:15:00"]
+        spill.write(json.dumps(entry) + "\n")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        anchor_batch=100,
+        anchor_interval=600,
+    )
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 11:19:47"):
+        updater.start()
+        anchor_delay = updater.anchor_job.deadline - time.monotonic()
+
+    # Assert
+    assert anchor_delay == 313
+
+    with freezegun.freeze_time("2022-03-21 11:25:00"):
+        updater.scheduler.cancel(updater.poll_job)
+        updater.scheduler.run_pending()
+
+    store.assert_called_once()
+    assert updater.hash_batch.readings == []
+
+
+# Checks that uploads carry on while the blockchain is unreachable, and that the
+# queued hashes are stored in order once it is back
+@freezegun.freeze_time("2022-03-21 11:19:47")
+def test_anchor_outage(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    store = mocker.patch.object(SolidPodUpdaterTTL, "store_hash", side_effect=Exception)
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 11:19:47") as frozen_date_time:
+        for _ in range(3):
+            updater.poll(aqm_folder_url, header)
+            frozen_date_time.tick(60)
+
+    # Assert
+    assert put.call_count == 3
+    assert updater.buffer.readings == []
+    assert len(updater.pending_anchors) == 3
+    assert os.path.exists(os.path.join("spill", "aqm_name-ttl-anchors.jsonl"))
+    queued = list(updater.pending_anchors.buffer.readings)
+
+    store.side_effect = None
+    with freezegun.freeze_time("2022-03-21 11:22:17"):
+        updater.scheduler.run_pending()
+
+    assert [call[0][0] for call in store.call_args_list[-3:]] == queued
+    assert len(updater.pending_anchors) == 0
+    assert updater.scheduler.next_deadline() is None
+
+
+# Checks that polling starts even if the Solid Pod is unreachable, and that the
+# folders are created once it is back
+def test_folders_unreachable(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    exists = mocker.patch.object(SolidAPI, "item_exists", side_effect=Exception)
+    create_folder = mocker.patch.object(SolidAPI, "create_folder")
+    run = mocker.patch.object(DeadlineScheduler, "run")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+    )
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 11:19:47"):
+        updater.start()
+
+    # Assert
+    run.assert_called_once()
+    assert updater.poll_job is not None
+
+    exists.side_effect = None
+    exists.return_value = False
+    with freezegun.freeze_time("2022-03-21 11:20:17"):
+        retry = next(
+            job
+            for _, _, job in updater.scheduler.jobs
+            if job.func == updater.create_folders
+        )
+        assert updater.create_folders(*retry.args)
+
+    assert create_folder.call_count == 2
+
+
+# Checks that the dated layout stores each TTL file in its day's partition, creating
+# the partition first
+def test_flush_dated(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    # Only the AQM folder exists, not the partitions of the day
+    mocker.patch.object(
+        SolidAPI, "item_exists", side_effect=lambda url: "2022" not in url
+    )
+    create_folder = mocker.patch.object(SolidAPI, "create_folder")
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        layout="dated",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 11:19:47"):
+        updater.poll(aqm_folder_url, header)
+
+    # Assert
+    assert [call[0][0] for call in create_folder.call_args_list] == [
+        aqm_folder_url + "2022/",
+        aqm_folder_url + "2022/03/",
+        aqm_folder_url + "2022/03/21/",
+    ]
+    put.assert_called_once()
+    assert put.call_args[0][0] == (
+        aqm_folder_url + "2022/03/21/2022-03-21 11:19:47.ttl"
+    )
+
+
+# Checks that files anchored in a Merkle batch are listed in the manifest of
+# their folder with the root and their proof
+def test_anchor_batch_manifest(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    store = mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=60,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        anchor_batch=2,
+        manifest_name="hashes.csv",
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 11:19:47") as frozen_date_time:
+        for _ in range(2):
+            updater.poll(aqm_folder_url, header)
+            frozen_date_time.tick(60)
+        # The manifests are written once the interval has passed
+        frozen_date_time.tick(300)
+        updater.scheduler.run_pending()
+
+    # Assert
+    root = store.call_args[0][0]
+    manifests = [call[0] for call in put.call_args_list if "hashes.csv" in call[0][0]]
+    rows = parse_manifest(manifests[-1][1].decode())
+    files = [call[0] for call in put.call_args_list if call[0][0].endswith(".ttl")]
+    assert sorted(rows) == ["2022-03-21 11:19:47.ttl", "2022-03-21 11:20:47.ttl"]
+    for file_url, content, _ in files:
+        row = rows[file_url.rsplit("/", 1)[-1]]
+        assert row["size"] == str(len(content))
+        assert row["sha256"] == hashlib.sha256(content).hexdigest()
+        assert row["anchor"] == root
+        assert manifest_anchor(row) == root
+
+
+# Checks that files sealed within the manifest interval are written to the
+# manifest together, rather than uploading it again for every file
+def test_manifest_interval(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch("requests.Session.get", side_effect=mock_wot)
+    mocker.patch.object(SolidAPI, "item_exists", return_value=True)
+    put = mocker.patch.object(SolidAPI, "put_file", return_value=MockRequest())
+    mocker.patch.object(SolidAPI, "get", return_value=MockRequest())
+    mocker.patch.object(SolidPodUpdaterTTL, "store_hash")
+
+    updater = SolidPodUpdaterTTL(
+        pod_provider="http://example.com/",
+        pod_username="username",
+        pod_password="password",
+        pod_endpoint="http://pod.example.com/",
+        aqm_folder="aqm_folder/",
+        aqm_name="aqm_name/",
+        polling_frequency=10,
+        wot_url="http://127.0.0.1",
+        wot_port=8080,
+        retry_time=30,
+        layout="dated",
+        manifest_name="hashes.csv",
+        manifest_interval=300,
+    )
+
+    aqm_folder_url = "http://pod.example.com/aqm_folder/aqm_name/"
+    header = "o3,no2,pm25,pm10,humidity,temperature,latitude,longitude".split(",")
+
+    # Act
+    with freezegun.freeze_time("2022-03-21 11:19:47") as frozen_date_time:
+        for _ in range(30):
+            updater.poll(aqm_folder_url, header)
+            frozen_date_time.tick(10)
+        updater.scheduler.run_pending()
+
+    # Assert
+    manifests = [call[0] for call in put.call_args_list if "hashes.csv" in call[0][0]]
+    assert len(manifests) == 1
+    assert len(parse_manifest(manifests[0][1].decode())) == 30
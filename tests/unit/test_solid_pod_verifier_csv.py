@@ -3,7 +3,10 @@ import os
 from solid.auth import Auth
 from solid.solid_api import SolidAPI
 from typing import List
+from datetime import datetime
+import io
 from scripts.solid_pod_verifier_csv import SolidPodVerifierCSV
+from scripts.verify_report import VerifyReport
 import pytest
 from brownie import HashStorage
 from scripts.contract_scripts import (
@@ -157,7 +160,7 @@ def test_single_input_files_exist(mocker):
     # Arrange
     mocker.patch.object(Auth, "login")
     mocker.patch.object(SolidAPI, "read_folder", return_value=FolderDataMock())
-    mocker.patch.object(SolidPodVerifierCSV, "verify_file")
+    mocker.patch.object(SolidPodVerifierCSV, "verify_files")
 
     verifier = mock_verifier(mocker)
 
@@ -177,7 +180,7 @@ def test_all_input_files_exist(mocker):
     # Arrange
     mocker.patch.object(Auth, "login")
     mocker.patch.object(SolidAPI, "read_folder", return_value=FolderDataMock())
-    mocker.patch.object(SolidPodVerifierCSV, "verify_file")
+    mocker.patch.object(SolidPodVerifierCSV, "verify_files")
 
     verifier = mock_verifier(mocker)
 
@@ -189,3 +192,153 @@ def test_all_input_files_exist(mocker):
     # Assert
     assert all_results[0] == ["2022-03-21.csv", False]
     assert all_results[1] == ["2022-03-22.csv", True]
+
+
+# Checks that "range" verification type verifies only the CSV files named after a date within the range
+def test_range_input_files_exist(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "read_folder", return_value=FolderDataMock())
+    verify_files = mocker.patch.object(SolidPodVerifierCSV, "verify_files")
+
+    verifier = mock_verifier(mocker)
+
+    # Act
+    verifier.start(
+        verification_type="range",
+        date_to_verify="2022-03-01",
+        end_to_verify="2022-03-21",
+    )
+
+    # Assert
+    verify_files.assert_called_once_with(
+        "http://pod.example.com/aqm_folderaqm_name", ["2022-03-21.csv"]
+    )
+
+
+# Checks output for "range" verification type with no CSV files within the range
+def test_range_input_no_files_exist(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "read_folder", return_value=FolderDataMock())
+    verifier = mock_verifier(mocker)
+
+    # Act
+    table_result = verifier.start(
+        verification_type="range",
+        date_to_verify="2022-04-01",
+        end_to_verify="2022-04-30",
+    )
+
+    # Assert
+    assert table_result == "No CSV files exist between: 2022-04-01 and 2022-04-30"
+
+
+# Checks that the dated layout reads only the partitions holding the files to verify
+def test_single_input_dated(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    list_partitions = mocker.patch(
+        "scripts.solid_pod_verifier_csv.list_partitions",
+        return_value=["2022/03/21/2022-03-21.csv"],
+    )
+    verify_files = mocker.patch.object(SolidPodVerifierCSV, "verify_files")
+
+    verifier = mock_verifier(mocker)
+    verifier.layout = "dated"
+
+    # Act
+    verifier.start(verification_type="single", date_to_verify="2022-03-21")
+
+    # Assert
+    assert list_partitions.call_args.args[2:] == (
+        datetime(2022, 3, 21),
+        datetime(2022, 3, 22),
+    )
+    verify_files.assert_called_once_with(
+        "http://pod.example.com/aqm_folderaqm_name", ["2022/03/21/2022-03-21.csv"]
+    )
+
+
+# Checks that an audit only downloads the files the manifests do not vouch for
+def test_audit(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    plan_audit = mocker.patch(
+        "scripts.solid_pod_verifier_csv.plan_audit",
+        return_value=({"2022-03-21.csv": "aa"}, ["2022-03-22.csv"]),
+    )
+    lookup_hashes = mocker.patch(
+        "scripts.solid_pod_verifier_csv.lookup_hashes",
+        side_effect=lambda hash_storage, hashes, lookup_size: [True] * len(hashes),
+    )
+    verify_concurrently = mocker.patch(
+        "scripts.solid_pod_verifier_csv.verify_concurrently",
+        side_effect=lambda hash_file, check_hashes, files, workers: [False]
+        * len(files),
+    )
+
+    verifier = mock_verifier(mocker)
+    add = mocker.patch.object(verifier.report, "add")
+    verifier.manifest_name = "hashes.csv"
+    verifier.sample = 0.05
+    verifier.lookup_size = 1
+    verifier.report_size = 1
+    verifier.hash_storage = mocker.Mock()
+
+    # Act
+    verifier.verify_files(
+        "http://pod.example.com/aqm_folderaqm_name",
+        ["2022-03-21.csv", "2022-03-22.csv"],
+    )
+
+    # Assert
+    # The folder's manifest is read once, although its files span two chunks
+    plan_audit.assert_called_once()
+    assert lookup_hashes.call_args_list[0].args == (verifier.hash_storage, ["aa"], 1)
+    assert [call.args[2] for call in verify_concurrently.call_args_list] == [
+        [],
+        ["2022-03-22.csv"],
+    ]
+    assert [call.args for call in add.call_args_list] == [
+        ("2022-03-21.csv", True),
+        ("2022-03-22.csv", False),
+    ]
+
+
+# Checks that files are verified in chunks smaller than a lookup, each chunk
+# being written out before the next is verified
+def test_verify_files_streams_chunks(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    output = io.StringIO()
+    written = []
+
+    # Records how many results were written before each chunk is verified
+    def verify_concurrently(hash_file, check_hashes, files, workers):
+        written.append(len(output.getvalue().splitlines()))
+        return [True] * len(files)
+
+    mocker.patch(
+        "scripts.solid_pod_verifier_csv.verify_concurrently",
+        side_effect=verify_concurrently,
+    )
+
+    verifier = mock_verifier(mocker)
+    verifier.report_size = 2
+    verifier.hash_storage = mocker.Mock()
+    verifier.report = VerifyReport("jsonl", output)
+
+    # Act
+    verifier.verify_files(
+        "http://pod.example.com/aqm_folderaqm_name",
+        ["2022-03-21.csv", "2022-03-22.csv", "2022-03-23.csv"],
+    )
+
+    # Assert
+    assert written == [0, 2]
+    assert output.getvalue().splitlines() == [
+        '{"file": "2022-03-21.csv", "valid": true}',
+        '{"file": "2022-03-22.csv", "valid": true}',
+        '{"file": "2022-03-23.csv", "valid": true}',
+    ]
@@ -13,6 +13,7 @@ from scripts.contract_scripts import (
 )
 import os
 import urllib
+from scripts.merkle import build_levels, merkle_proof
 
 # Solid Pod Folder Mocking
 class ItemMock:
@@ -246,7 +247,7 @@ def test_single_input_files_exist(mocker):
     # Arrange
     mocker.patch.object(Auth, "login")
     mocker.patch.object(SolidAPI, "read_folder", return_value=FolderDataMock())
-    mocker.patch.object(SolidPodVerifierTTL, "verify_file")
+    mocker.patch.object(SolidPodVerifierTTL, "verify_files")
 
     verifier = mock_verifier(mocker)
 
@@ -268,7 +269,7 @@ def test_all_input_files_exist(mocker):
     # Arrange
     mocker.patch.object(Auth, "login")
     mocker.patch.object(SolidAPI, "read_folder", return_value=FolderDataMock())
-    mocker.patch.object(SolidPodVerifierTTL, "verify_file")
+    mocker.patch.object(SolidPodVerifierTTL, "verify_files")
 
     verifier = mock_verifier(mocker)
 
@@ -284,3 +285,86 @@ def test_all_input_files_exist(mocker):
     # Assert
     assert all_results[0] == ["2022-03-21 11:19:47.ttl", False]
     assert all_results[1] == ["2022-03-22 11:19:47.ttl", True]
+
+
+# Checks that "range" verification type verifies only the TTL files named after a time within the range
+def test_range_input_files_exist(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "read_folder", return_value=FolderDataMock())
+    verify_files = mocker.patch.object(SolidPodVerifierTTL, "verify_files")
+
+    verifier = mock_verifier(mocker)
+
+    # Act
+    verifier.start(
+        verification_type="range",
+        date_to_verify="2022-03-22",
+        time_to_verify="2022-03-31",
+    )
+
+    # Assert
+    verify_files.assert_called_once_with(
+        "http://pod.example.com/aqm_folderaqm_name", ["2022-03-22 11:19:47.ttl"]
+    )
+
+
+# Checks output for "range" verification type with no TTL files within the range
+def test_range_input_no_files_exist(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    mocker.patch.object(SolidAPI, "read_folder", return_value=FolderDataMock())
+    verifier = mock_verifier(mocker)
+
+    # Act
+    table_result = verifier.start(
+        verification_type="range",
+        date_to_verify="2022-04-01",
+        time_to_verify="2022-04-30",
+    )
+
+    # Assert
+    assert table_result == "No TTL files exist between: 2022-04-01 and 2022-04-30"
+
+
+# Checks that files anchored in a Merkle batch are checked with a single lookup of
+# their batch's root, rather than a call per file
+def test_check_hashes_merkle_batch(mocker):
+    # Arrange
+    mocker.patch.object(Auth, "login")
+    file_urls = [
+        "http://pod.example.com/aqm_folder/aqm_name/2022-03-21 11:19:47.ttl",
+        "http://pod.example.com/aqm_folder/aqm_name/2022-03-21 11:20:47.ttl",
+    ]
+    file_hashes = ["aa" * 32, "bb" * 32]
+    levels = build_levels(file_hashes)
+    root = levels[-1][0]
+    proofs = {
+        file_url: {
+            "file_hash": file_hash,
+            "root": root,
+            "proof": merkle_proof(levels, i),
+        }
+        for i, (file_url, file_hash) in enumerate(zip(file_urls, file_hashes))
+    }
+
+    verifier = mock_verifier(mocker)
+    mocker.patch.object(verifier, "read_proof", side_effect=proofs.get)
+    verifier.hash_storage = mocker.Mock(spec=["verify_hashes"])
+    verifier.hash_storage.verify_hashes.side_effect = lambda hashes: [
+        hash == root for hash in hashes
+    ]
+
+    # Act
+    results = verifier.check_hashes(
+        [
+            (file_url, file_hash, {})
+            for file_url, file_hash in zip(file_urls, file_hashes)
+        ]
+    )
+
+    # Assert
+    assert results == [True, True]
+    assert [
+        call.args[0] for call in verifier.hash_storage.verify_hashes.call_args_list
+    ] == [file_hashes, [root]]
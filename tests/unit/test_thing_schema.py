@@ -0,0 +1,46 @@
+import pytest
+
+from scripts.thing_schema import SchemaChanged, ThingSchema, encode_csv_row
+
+THING_DESCRIPTION = {
+    "title": "AQM",
+    "properties": {
+        "o3": {"type": "number"},
+        "count": {"type": "integer"},
+        "online": {"type": "boolean"},
+        "status": {"type": "string"},
+    },
+}
+
+
+# Checks that properties are decoded into typed values in schema order
+def test_decode():
+    # Arrange
+    schema = ThingSchema.from_thing_description(THING_DESCRIPTION)
+
+    # Act
+    row = schema.decode({"status": "ok", "online": True, "count": 3.0, "o3": 7})
+
+    # Assert
+    assert schema.names == ["o3", "count", "online", "status"]
+    assert row == [7.0, 3, True, "ok"]
+    assert isinstance(row[0], float)
+
+
+# Checks that a changed set of properties is detected
+def test_decode_schema_changed():
+    # Arrange
+    schema = ThingSchema.from_thing_description(THING_DESCRIPTION)
+
+    # Act / Assert
+    with pytest.raises(SchemaChanged):
+        schema.decode({"o3": 1.0, "count": 3, "online": True})
+
+
+# Checks that only fields which need it are quoted in CSV rows
+def test_encode_csv_row():
+    # Act
+    line = encode_csv_row(["2022-03-21", 1.5, None, 'say "hi", twice'])
+
+    # Assert
+    assert line == '2022-03-21,1.5,,"say ""hi"", twice"'
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+
+from scripts.time_index import TimeIndex, name_time, parse_bound, parse_range
+
+
+# Checks that the date and time are read from every kind of file name
+def test_name_time():
+    # Act
+    times = [
+        name_time("2022-07-08.csv"),
+        name_time("2022-07-08_1.csv"),
+        name_time("2022-07-08T11.ttl"),
+        name_time("2022-07-08%2011%3A19%3A47.ttl"),
+        name_time("manifest.csv"),
+        name_time("2022-13-08.csv"),
+    ]
+
+    # Assert
+    assert times == [
+        datetime(2022, 7, 8),
+        datetime(2022, 7, 8),
+        datetime(2022, 7, 8, 11),
+        datetime(2022, 7, 8, 11, 19, 47),
+        None,
+        None,
+    ]
+
+
+# Checks that a date, hour or time covers the whole of itself
+def test_parse_bound():
+    # Act / Assert
+    assert parse_bound("2022-07-08") == (datetime(2022, 7, 8), datetime(2022, 7, 9))
+    assert parse_bound("2022-07-08T11") == (
+        datetime(2022, 7, 8, 11),
+        datetime(2022, 7, 8, 12),
+    )
+    assert parse_bound("2022-07-08 11:19:47") == (
+        datetime(2022, 7, 8, 11, 19, 47),
+        datetime(2022, 7, 8, 11, 19, 48),
+    )
+    with pytest.raises(ValueError):
+        parse_bound("08/07/2022")
+
+
+# Checks that a range includes the whole of its end
+def test_parse_range():
+    # Act
+    start, end = parse_range("2022-07-01", "2022-07-31")
+
+    # Assert
+    assert (start, end) == (datetime(2022, 7, 1), datetime(2022, 8, 1))
+
+
+# Checks that a range in the wrong format is rejected
+def test_parse_range_incorrect_format(capsys):
+    # Act
+    with pytest.raises(SystemExit) as e:
+        parse_range("2022-07-01", "31/07/2022")
+
+    # Assert
+    out, _ = capsys.readouterr()
+    assert out.startswith("Error - Range is not in the format")
+    assert e.value.code == 1
+
+
+# Checks that files are found by the date and time they are named after, in order
+def test_between():
+    # Arrange
+    index = TimeIndex(
+        [
+            "2022-07-09.csv",
+            "2022-07-08_1.csv",
+            "manifest.csv",
+            "2022-07-08.csv",
+            "2022-07-07.csv",
+            "2022-07-08T11.ttl",
+            "2022-07-08%2011%3A19%3A47.ttl",
+        ]
+    )
+
+    # Act
+    day = index.between(*parse_bound("2022-07-08"))
+    hour = index.between(*parse_bound("2022-07-08T11"))
+    time = index.between(*parse_bound("2022-07-08 11:19:47"))
+    days = index.between(*parse_range("2022-07-07", "2022-07-08"))
+
+    # Assert
+    assert day == [
+        "2022-07-08.csv",
+        "2022-07-08_1.csv",
+        "2022-07-08T11.ttl",
+        "2022-07-08%2011%3A19%3A47.ttl",
+    ]
+    assert hour == ["2022-07-08T11.ttl", "2022-07-08%2011%3A19%3A47.ttl"]
+    assert time == ["2022-07-08%2011%3A19%3A47.ttl"]
+    assert days == ["2022-07-07.csv"] + day
@@ -0,0 +1,153 @@
+import math
+from datetime import datetime
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.compare import isomorphic
+from rdflib.namespace import RDF, SOSA
+
+from scripts.turtle_serializer import TurtleTemplate, canonical_hash, encode_literal
+
+FILE_URL = "http://pod.example.com/aqm_folder/aqm_name/2022-03-21T11:19:47.ttl"
+
+HEADERS = ["o3", "no2", "status", "online", "count", "note"]
+
+READINGS = [
+    (
+        datetime(2022, 3, 21, 11, 19, 47, 949456),
+        [7.21602550234155, 1e-07, "ok", True, 3, 'a "quoted"\nline\\'],
+    ),
+    (
+        datetime(2022, 3, 21, 11, 20, 47),
+        [math.nan, -math.inf, None, False, -2, ""],
+    ),
+]
+
+
+# Builds a reading as rdflib would, with relative URIs resolved against the file
+def rdflib_reading(reading_datetime, headers, data):
+    g = Graph()
+    g.add((URIRef(FILE_URL), SOSA.resultTime, Literal(reading_datetime)))
+
+    for sensor_name, sensor_data in zip(headers, data):
+        node = BNode()
+        g.add((node, SOSA.Sensor, Literal(sensor_name)))
+        g.add((node, SOSA.hasSimpleResult, Literal(sensor_data)))
+
+    return g
+
+
+# Builds several readings as rdflib would. Observation URIs contain a colon, so
+# rdflib's parser leaves them as they are rather than resolving them
+def rdflib_batch(readings, headers):
+    g = Graph()
+
+    for reading_datetime, data in readings:
+        observation = URIRef(f"#{reading_datetime.isoformat()}")
+        g.add((observation, RDF.type, SOSA.Observation))
+        g.add((observation, SOSA.resultTime, Literal(reading_datetime)))
+
+        for sensor_name, sensor_data in zip(headers, data):
+            node = BNode()
+            g.add((observation, SOSA.hasResult, node))
+            g.add((node, SOSA.Sensor, Literal(sensor_name)))
+            g.add((node, SOSA.hasSimpleResult, Literal(sensor_data)))
+
+    return g
+
+
+# Checks that a single reading holds the same triples as the rdflib graph
+def test_reading_isomorphic():
+    for reading_datetime, data in READINGS:
+        # Act
+        turtle_data = TurtleTemplate(HEADERS).reading(reading_datetime, data)
+        g = Graph().parse(data=turtle_data, format="turtle", publicID=FILE_URL)
+
+        # Assert
+        assert isomorphic(g, rdflib_reading(reading_datetime, HEADERS, data))
+
+
+# Checks that several readings hold the same triples as the rdflib graph
+def test_batch_isomorphic():
+    # Act
+    turtle_data = TurtleTemplate(HEADERS).batch(READINGS)
+    g = Graph().parse(data=turtle_data, format="turtle", publicID=FILE_URL)
+
+    # Assert
+    assert isomorphic(g, rdflib_batch(READINGS, HEADERS))
+
+
+# Checks that readings without properties are still valid Turtle
+def test_batch_no_properties():
+    # Act
+    turtle_data = TurtleTemplate([]).batch(READINGS)
+    g = Graph().parse(data=turtle_data, format="turtle", publicID=FILE_URL)
+
+    # Assert
+    assert isomorphic(g, rdflib_batch(READINGS, []))
+
+
+# Checks that literals keep their datatype and every digit
+def test_encode_literal():
+    # Assert
+    assert encode_literal(7.21602550234155) == "7.21602550234155e0"
+    assert encode_literal(1e-07) == "1e-07"
+    assert encode_literal(math.inf) == '"INF"^^xsd:double'
+    assert encode_literal(2) == "2"
+    assert encode_literal(True) == "true"
+    assert encode_literal('say "hi"\n') == '"say \\"hi\\"\\n"'
+
+
+# Checks that a template is compiled once for each list of properties
+def test_for_names():
+    # Act
+    template = TurtleTemplate.for_names(("o3", "no2"))
+
+    # Assert
+    assert TurtleTemplate.for_names(("o3", "no2")) is template
+    assert TurtleTemplate.for_names(("o3",)) is not template
+
+
+# Checks that readings are appended with a SPARQL update
+def test_insert_data():
+    # Act
+    update = TurtleTemplate(["o3"]).insert_data(
+        [(datetime(2022, 3, 21, 11, 19, 47), [1.5])]
+    )
+
+    # Assert
+    assert update.startswith(b"PREFIX sosa: <")
+    assert b"INSERT DATA {\n<#2022-03-21T11:19:47> a sosa:Observation ;" in update
+    assert b"sosa:hasSimpleResult 1.5e0 ]" in update
+    assert update.endswith(b"}\n")
+
+
+# Checks that the canonical hash does not depend on how the triples are serialized
+def test_canonical_hash():
+    # Arrange
+    turtle_data = TurtleTemplate(HEADERS).batch(READINGS)
+    # A Solid server may reorder the triples, relabel the blank nodes and resolve
+    # the observation URIs
+    g = Graph().parse(data=turtle_data, format="turtle", publicID=FILE_URL)
+    resolved = Graph()
+    for subject, predicate, obj in g:
+        if isinstance(subject, URIRef) and subject.startswith("#"):
+            subject = URIRef(FILE_URL + subject)
+        resolved.add((subject, predicate, obj))
+
+    # Act
+    file_hash = canonical_hash(turtle_data, FILE_URL)
+
+    # Assert
+    assert canonical_hash(resolved.serialize(format="nt"), FILE_URL) == file_hash
+    # A file moved elsewhere, e.g. into a dated partition, keeps its hash
+    moved_url = FILE_URL.replace("aqm_name/", "aqm_name/2022/03/21/")
+    moved = Graph()
+    for subject, predicate, obj in resolved:
+        if isinstance(subject, URIRef):
+            subject = URIRef(subject.replace(FILE_URL, moved_url))
+        moved.add((subject, predicate, obj))
+    assert canonical_hash(moved.serialize(format="nt"), moved_url) == file_hash
+    assert canonical_hash(turtle_data, moved_url) == file_hash
+    # An update applied twice duplicates its blank nodes
+    duplicated = TurtleTemplate(HEADERS).observations(READINGS[-1:]).encode()
+    assert canonical_hash(turtle_data + duplicated, FILE_URL) != file_hash
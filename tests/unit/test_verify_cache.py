@@ -0,0 +1,64 @@
+from scripts.verify_cache import VerifyCache
+
+FILE_URL = "http://pod.example.com/aqm_folder/aqm_name/2022-03-21.csv"
+
+
+# Checks that a file found to be anchored is requested only if it has changed
+def test_validators(tmp_path):
+    # Arrange
+    cache = VerifyCache(tmp_path / "verify_cache.db")
+
+    # Act
+    cache.store(
+        FILE_URL,
+        {"ETag": '"abc"', "Last-Modified": "Mon, 21 Mar 2022 23:59:59 GMT"},
+        "aa",
+        True,
+    )
+
+    # Assert
+    assert cache.validators(FILE_URL) == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Mon, 21 Mar 2022 23:59:59 GMT",
+    }
+
+
+# Checks that files not found to be anchored, or without validators, are always
+# downloaded
+def test_validators_recheck(tmp_path):
+    # Arrange
+    cache = VerifyCache(tmp_path / "verify_cache.db")
+    other_url = FILE_URL.replace("21", "22")
+
+    # Act
+    cache.store(FILE_URL, {"ETag": '"abc"'}, "aa", False)
+    cache.store(other_url, {}, "bb", True)
+
+    # Assert
+    assert cache.validators(FILE_URL) is None
+    assert cache.validators(other_url) is None
+    assert cache.validators(FILE_URL.replace("21", "23")) is None
+
+
+# Checks that results are kept for the next run, and refreshed when a file is
+# found unchanged
+def test_refresh(tmp_path):
+    # Arrange
+    cache = VerifyCache(tmp_path / "verify_cache.db")
+    cache.store(FILE_URL, {"ETag": '"abc"'}, "aa", True)
+    verified_at = cache.connection.execute("SELECT verified_at FROM files").fetchone()
+    cache.close()
+
+    # Act
+    cache = VerifyCache(tmp_path / "verify_cache.db")
+    cache.refresh(FILE_URL)
+
+    # Assert
+    assert cache.validators(FILE_URL) == {"If-None-Match": '"abc"'}
+    assert cache.connection.execute(
+        "SELECT file_hash, valid FROM files"
+    ).fetchall() == [("aa", 1)]
+    assert (
+        cache.connection.execute("SELECT verified_at FROM files").fetchone()
+        >= verified_at
+    )
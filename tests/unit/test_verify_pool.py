@@ -0,0 +1,221 @@
+import hashlib
+import threading
+import time
+import tracemalloc
+
+import httpx
+import pytest
+from solid.auth import Auth
+from solid.solid_api import SolidAPI
+
+from scripts.verify_pool import (
+    download_hash,
+    lookup_hashes,
+    map_concurrently,
+    verify_concurrently,
+)
+
+
+# Serves a file as a stream of chunks, recording how many have been read
+class ChunkStream(httpx.SyncByteStream):
+    def __init__(self, chunk, count):
+        self.chunk = chunk
+        self.count = count
+        self.read = 0
+
+    def __iter__(self):
+        for _ in range(self.count):
+            self.read += 1
+            yield self.chunk
+
+
+# Returns a Solid API whose requests are answered by a handler
+def mock_api(handler):
+    auth = Auth()
+    auth.client = httpx.Client(transport=httpx.MockTransport(handler))
+    return SolidAPI(auth)
+
+
+# Checks that the hashes of every file are checked at once, in the order of the
+# files, even when later files finish first
+def test_verify_concurrently_order(mocker):
+    # Arrange
+    files = ["2022-03-21.csv", "2022-03-22.csv", "2022-03-23.csv"]
+
+    def hash_file(file):
+        time.sleep(0.03 * (len(files) - files.index(file)))
+        return file
+
+    check_hashes = mocker.Mock(side_effect=lambda hashes: hashes)
+
+    # Act
+    results = verify_concurrently(hash_file, check_hashes, files, workers=3)
+
+    # Assert
+    assert results == files
+    check_hashes.assert_called_once_with(files)
+
+
+# Checks that items are handled at once, but never by more workers than allowed
+def test_map_concurrently_workers():
+    # Arrange
+    lock = threading.Lock()
+    active = [0]
+    most_active = [0]
+
+    def check_file(file):
+        with lock:
+            active[0] += 1
+            most_active[0] = max(most_active[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return True
+
+    # Act
+    results = map_concurrently(check_file, [str(i) for i in range(12)], workers=4)
+
+    # Assert
+    assert results == [True] * 12
+    assert most_active[0] == 4
+
+
+# Checks that the throughput of the verification is reported
+def test_verify_concurrently_throughput(capsys):
+    # Act
+    verify_concurrently(
+        lambda file: True, lambda hashes: hashes, ["2022-03-21.csv", "2022-03-22.csv"]
+    )
+
+    # Assert
+    out, _ = capsys.readouterr()
+    assert out.startswith("Verified 2 files in ")
+    assert out.endswith(" files/s).\n")
+
+
+# Checks that a file is hashed as it is downloaded, without being read into memory
+def test_download_hash():
+    # Arrange
+    chunk = b"date,time,o3\n2022-03-21,11:19:47,1.0\n" * 1000
+    stream = ChunkStream(chunk, 200)
+    api = mock_api(lambda request: httpx.Response(200, stream=stream))
+
+    # Act
+    tracemalloc.start()
+    file_hash, _ = download_hash(api, "http://pod.example.com/aqm/2022-03-21.csv")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Assert
+    assert file_hash == hashlib.sha256(chunk * 200).hexdigest()
+    assert stream.read == 200
+    # Only a few chunks of the 7.2MB file are held at once
+    assert peak < len(chunk) * 20
+
+
+# Checks that a file missing from the Solid Pod is not hashed
+def test_download_hash_missing():
+    # Arrange
+    api = mock_api(lambda request: httpx.Response(404))
+
+    # Act / Assert
+    with pytest.raises(httpx.HTTPStatusError):
+        download_hash(api, "http://pod.example.com/aqm/2022-03-21.csv")
+
+
+# Checks that a file unchanged since it was last hashed is not downloaded again
+def test_download_hash_not_modified():
+    # Arrange
+    stream = ChunkStream(b"date,time,o3\n", 1)
+
+    def handler(request):
+        if request.headers.get("If-None-Match") == '"abc"':
+            return httpx.Response(304, headers={"ETag": '"abc"'})
+        return httpx.Response(200, headers={"ETag": '"abc"'}, stream=stream)
+
+    api = mock_api(handler)
+    file_url = "http://pod.example.com/aqm/2022-03-21.csv"
+
+    # Act
+    changed = download_hash(api, file_url)
+    unchanged = download_hash(api, file_url, {"If-None-Match": '"abc"'})
+
+    # Assert
+    assert changed[0] == hashlib.sha256(b"date,time,o3\n").hexdigest()
+    assert changed[1]["ETag"] == '"abc"'
+    assert unchanged[0] is None
+    assert stream.read == 1
+
+
+# Checks that hashes are looked up in chunks, with results in the order of the
+# hashes
+def test_lookup_hashes(mocker):
+    # Arrange
+    hashes = [hashlib.sha256(bytes([i])).hexdigest() for i in range(5)]
+    hash_storage = mocker.Mock(spec=["verify_hash", "verify_hashes"])
+    hash_storage.verify_hashes.side_effect = lambda chunk: [
+        hashes.index(hash) % 2 == 0 for hash in chunk
+    ]
+
+    # Act
+    results = lookup_hashes(hash_storage, hashes, lookup_size=2)
+
+    # Assert
+    assert results == [True, False, True, False, True]
+    assert hash_storage.verify_hashes.call_args_list == [
+        mocker.call(hashes[0:2]),
+        mocker.call(hashes[2:4]),
+        mocker.call(hashes[4:5]),
+    ]
+    hash_storage.verify_hash.assert_not_called()
+
+
+# Checks that a contract deployed without verify_hashes is checked a hash at a
+# time, with the calls sent together in a batch request
+def test_lookup_hashes_batch_request(mocker):
+    # Arrange
+    hashes = [hashlib.sha256(bytes([i])).hexdigest() for i in range(3)]
+    hash_storage = mocker.Mock(spec=["verify_hash"])
+    mocker.patch(
+        "scripts.verify_pool.rpc_endpoint", return_value="http://127.0.0.1:8545"
+    )
+    mocker.patch(
+        "scripts.verify_pool.rpc_request_kwargs",
+        return_value={"headers": {"Authorization": "Bearer key"}},
+    )
+    batch_call = mocker.patch(
+        "scripts.verify_pool.batch_call", return_value=[True, False, True]
+    )
+
+    # Act
+    results = lookup_hashes(hash_storage, hashes)
+
+    # Assert
+    assert results == [True, False, True]
+    batch_call.assert_called_once_with(
+        "http://127.0.0.1:8545",
+        hash_storage.verify_hash,
+        [(hash,) for hash in hashes],
+        request_kwargs={"headers": {"Authorization": "Bearer key"}},
+    )
+    hash_storage.verify_hash.assert_not_called()
+
+
+# Checks that a contract deployed without verify_hashes is called once per hash
+# when the node does not accept batch requests
+def test_lookup_hashes_single(mocker):
+    # Arrange
+    hashes = [hashlib.sha256(bytes([i])).hexdigest() for i in range(3)]
+    mocker.patch(
+        "scripts.verify_pool.rpc_endpoint", return_value="http://127.0.0.1:8545"
+    )
+    mocker.patch("scripts.verify_pool.batch_call", side_effect=ValueError)
+    hash_storage = mocker.Mock(spec=["verify_hash"])
+    hash_storage.verify_hash.side_effect = [True, False, True]
+
+    # Act
+    results = lookup_hashes(hash_storage, hashes)
+
+    # Assert
+    assert results == [True, False, True]
+    assert hash_storage.verify_hash.call_count == 3
@@ -0,0 +1,108 @@
+import io
+import json
+
+import pytest
+
+from scripts.verify_report import VerifyReport, open_report
+
+
+# Checks that results are written as JSON lines as they come, with a summary last
+def test_jsonl(capsys):
+    # Arrange
+    output = io.StringIO()
+    report = VerifyReport("jsonl", output)
+
+    # Act
+    report.add("2022-03-21.csv", True)
+    written = output.getvalue()
+    report.add("2022-03-22.csv", False)
+    summary = report.finish()
+
+    # Assert
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert written == '{"file": "2022-03-21.csv", "valid": true}\n'
+    assert lines[:2] == [
+        {"file": "2022-03-21.csv", "valid": True},
+        {"file": "2022-03-22.csv", "valid": False},
+    ]
+    assert lines[2] == {"summary": summary}
+    assert (summary["files"], summary["valid"], summary["invalid"]) == (2, 1, 1)
+    out, _ = capsys.readouterr()
+    assert out.startswith("Verified 2 files: 1 valid, 1 invalid in ")
+
+
+# Checks that results are written as CSV rows under a header, with a summary last
+def test_csv():
+    # Arrange
+    output = io.StringIO()
+    report = VerifyReport("csv", output)
+
+    # Act
+    report.add("2022-03-21.csv", True)
+    report.add("2022-03-22.csv", False)
+    report.finish()
+
+    # Assert
+    lines = output.getvalue().splitlines()
+    assert lines[:3] == ["file,valid", "2022-03-21.csv,True", "2022-03-22.csv,False"]
+    assert lines[3].startswith("summary,files=2,valid=1,invalid=1,elapsed=")
+    assert len(lines) == 4
+
+
+# Checks that a table is only written once every file is verified
+def test_table():
+    # Arrange
+    output = io.StringIO()
+    report = VerifyReport("table", output)
+
+    # Act
+    report.add("2022-03-21.csv", True)
+    written = output.getvalue()
+    report.finish()
+
+    # Assert
+    assert written == ""
+    assert "2022-03-21.csv" in output.getvalue()
+    assert "Valid Hash" in output.getvalue()
+
+
+# Checks that an unknown format is rejected
+def test_invalid_format():
+    # Act / Assert
+    with pytest.raises(ValueError):
+        VerifyReport("xml")
+
+
+# Checks that JSON Lines or CSV results alone are written to standard output, with
+# other messages moved to standard error
+def test_open_report(capsys):
+    # Act
+    with open_report("jsonl") as output:
+        report = VerifyReport("jsonl", output)
+        print("Base Pod URL is 'http://pod.example.com/'.")
+        report.add("2022-03-21.csv", True)
+        report.finish()
+
+    # Assert
+    out, err = capsys.readouterr()
+    lines = [json.loads(line) for line in out.splitlines()]
+    assert lines[0] == {"file": "2022-03-21.csv", "valid": True}
+    assert list(lines[1]) == ["summary"]
+    assert err.startswith("Base Pod URL is")
+    assert "Verified 1 files" in err
+
+
+# Checks that results are appended to a report file
+def test_open_report_file(tmp_path, capsys):
+    # Arrange
+    report_file = tmp_path / "report.csv"
+
+    # Act
+    for _ in range(2):
+        with open_report("csv", str(report_file)) as output:
+            VerifyReport("csv", output).add("2022-03-21.csv", True)
+
+    # Assert
+    assert report_file.read_text().count("2022-03-21.csv,True") == 2
+    out, _ = capsys.readouterr()
+    assert out == ""
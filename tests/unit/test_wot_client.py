@@ -0,0 +1,100 @@
+import requests
+
+import pytest
+
+from scripts.wot_client import WoTClient, WoTUnavailable
+
+
+class MockRequest:
+    def json(self):
+        return {"o3": 1.0}
+
+
+# Checks that the back-off delay is jittered, grows and is capped
+def test_backoff(mocker):
+    # Arrange
+    uniform = mocker.patch("random.uniform", side_effect=lambda low, high: high)
+    client = WoTClient(max_backoff=30)
+
+    # Act
+    delays = [client.backoff(attempt) for attempt in range(7)]
+
+    # Assert
+    assert delays == [1, 2, 4, 8, 16, 30, 30]
+    uniform.assert_called_with(0, 30)
+
+
+# Checks that a failed request is retried with a timeout and recorded in the stats
+def test_get_retry(mocker):
+    # Arrange
+    get = mocker.patch(
+        "requests.Session.get",
+        side_effect=[requests.exceptions.ConnectTimeout(), MockRequest()],
+    )
+    sleep = mocker.patch("time.sleep")
+    client = WoTClient(connect_timeout=2, read_timeout=10, max_backoff=30)
+    url = "http://127.0.0.1:8080/properties"
+
+    # Act
+    req = client.get(url, "data")
+
+    # Assert
+    assert req.json() == {"o3": 1.0}
+    assert get.call_count == 2
+    get.assert_called_with(
+        url,
+        headers={"Content-Type": "application/json; charset=utf-8"},
+        timeout=(2, 10),
+    )
+    sleep.assert_called_once()
+    assert 0 <= sleep.call_args[0][0] <= 1
+    assert client.stats[url].requests == 1
+    assert client.stats[url].failures == 1
+
+
+# Checks that a non-blocking client gives up on a device without sleeping, and
+# skips it until its back-off has passed
+def test_get_non_blocking(mocker):
+    # Arrange
+    get = mocker.patch(
+        "requests.Session.get",
+        side_effect=[requests.exceptions.ConnectTimeout(), MockRequest()],
+    )
+    sleep = mocker.patch("time.sleep")
+    mocker.patch("random.uniform", side_effect=lambda low, high: high)
+    monotonic = mocker.patch("time.monotonic", return_value=100.0)
+    client = WoTClient(blocking=False)
+    url = "http://127.0.0.1:8080/properties"
+
+    # Act
+    with pytest.raises(WoTUnavailable):
+        client.get(url, "data")
+    with pytest.raises(WoTUnavailable):
+        client.get(url, "data")
+    monotonic.return_value = 101.0
+    req = client.get(url, "data")
+
+    # Assert
+    assert req.json() == {"o3": 1.0}
+    assert get.call_count == 2
+    sleep.assert_not_called()
+    assert client.stats[url].failures == 1
+    assert client.stats[url].skips == 0
+
+
+# Checks that latency is summarised per device
+def test_summary(mocker):
+    # Arrange
+    mocker.patch("requests.Session.get", return_value=MockRequest())
+    client = WoTClient()
+
+    # Act
+    client.get("http://10.0.0.5:8080/properties", "data")
+    client.get("http://10.0.0.6:8080/properties", "data")
+    client.get("http://10.0.0.6:8080/properties", "data")
+
+    summary = client.summary().split("\n")
+
+    # Assert
+    assert summary[0].startswith("http://10.0.0.5:8080/properties: 1 requests")
+    assert summary[1].startswith("http://10.0.0.6:8080/properties: 2 requests")